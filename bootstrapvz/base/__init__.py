@@ -28,13 +28,41 @@ def validate_manifest(data, validator, error):
         if data['volume']['partitions']['type'] == 'none':
             error('Grub cannot boot from unpartitioned disks', ['system', 'bootloader'])
 
+    # The snapshot cache copies the workspace, the volume must therefore live inside it
+    if 'snapshot_cache' in data['bootstrapper'] and data['volume']['backing'] in ['ebs', 'lvm']:
+        error('Volumes backed by {backing} cannot be cached'.format(backing=data['volume']['backing']),
+              ['bootstrapper', 'snapshot_cache'])
+
+    # Offline images are assembled from a directory tree, nothing that needs a block device can be used
+    if data['volume'].get('assembly', 'devices') == 'offline':
+        if data['volume']['backing'] not in ['raw', 's3']:
+            error('Only raw images can be assembled offline', ['volume', 'backing'])
+        if data['system']['bootloader'] in ['grub', 'extlinux']:
+            error('The {bootloader} bootloader can only be installed onto a device'
+                  .format(bootloader=data['system']['bootloader']), ['system', 'bootloader'])
+        for name, partition in data['volume']['partitions'].items():
+            if name == 'type':
+                continue
+            if partition.get('filesystem') == 'xfs':
+                error('xfs filesystems cannot be created from a directory', ['volume', 'partitions', name, 'filesystem'])
+            if 'format_command' in partition:
+                error('The format command cannot be changed for offline images',
+                      ['volume', 'partitions', name, 'format_command'])
+
     # Check the provided apt.conf(5) options
-    if 'packages' in data:
-        for name, val in data['packages'].get('apt.conf.d', {}).items():
-            from bootstrapvz.common.tools import log_call
+    if 'packages' in data and data['packages'].get('apt.conf.d'):
+        from concurrent.futures import ThreadPoolExecutor
+        from bootstrapvz.common.tools import log_call
 
+        def check_syntax(config):
             status, _, _ = log_call(['apt-config', '-c=/dev/stdin', 'dump'],
-                                    stdin=val + '\n')
+                                    stdin=config + '\n')
+            return status == 0
 
-            if status != 0:
+        # Every snippet ends up in a file of its own, so each of them must be valid on its own
+        snippets = data['packages']['apt.conf.d']
+        with ThreadPoolExecutor(max_workers=len(snippets)) as executor:
+            results = list(executor.map(check_syntax, snippets.values()))
+        for name, valid in zip(snippets.keys(), results):
+            if not valid:
                 error('apt.conf(5) syntax error', ['packages', 'apt.conf.d', name])
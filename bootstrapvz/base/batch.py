@@ -0,0 +1,185 @@
+"""The batch module builds several manifests at once.
+Every build runs in its own process, a build is only started when the host
+has enough block devices and disk space left for it.
+"""
+import logging
+import os
+log = logging.getLogger(__name__)
+
+
+def run(manifests, jobs, setup_logging=None, trace_dir=None, dependencies={}, **kwargs):
+    """Runs the bootstrapping process for several manifests concurrently
+
+    :param list manifests: The manifests to build
+    :param int jobs: The maximum number of builds to run concurrently
+    :param function setup_logging: Called with the manifest in every build process before the build starts
+    :param str trace_dir: The directory to write a timing trace of every build to
+    :param dict dependencies: Maps manifests to the manifest whose build has to finish before they are built
+                              (see bootstrapvz.base.matrix.plan())
+    :param dict kwargs: Passed on to bootstrapvz.base.main.run()
+    :return: The manifests whose build failed
+    :rtype: list
+    """
+    import multiprocessing
+    from multiprocessing.connection import wait
+    from .matrix import get_variant_path
+    # Forking lets the builds inherit the loaded manifests, providers and plugins
+    context = multiprocessing.get_context('fork')
+    capacity = get_host_resources(manifests)
+    pending = [(manifest, get_requirements(manifest)) for manifest in manifests]
+    running = {}
+    failed = []
+    # Plugins may start services that all builds share (e.g. a caching proxy), the builds inherit them
+    call_plugins('start_batch', manifests)
+    try:
+        while pending or running:
+            reserved = {}
+            for _, _, requirements in running.values():
+                for resource, amount in requirements.items():
+                    reserved[resource] = reserved.get(resource, 0) + amount
+            unfinished = set([manifest for manifest, _ in pending] +
+                             [manifest for manifest, _, _ in running.values()])
+            for manifest, requirements in list(pending):
+                if len(running) >= jobs:
+                    break
+                if dependencies.get(manifest) in unfinished:
+                    continue
+                # A build that needs more than the host has is run on its own, so that it at least gets to try
+                if running and not fits(requirements, reserved, capacity):
+                    continue
+                pending.remove((manifest, requirements))
+                for resource, amount in requirements.items():
+                    reserved[resource] = reserved.get(resource, 0) + amount
+                log.info('Starting the build of ' + get_variant_path(manifest))
+                process = context.Process(target=build, args=(manifest, setup_logging, trace_dir, kwargs))
+                process.start()
+                running[process.sentinel] = (manifest, process, requirements)
+
+            for sentinel in wait(list(running.keys())):
+                manifest, process, _ = running.pop(sentinel)
+                process.join()
+                if process.exitcode == 0:
+                    log.info('Successfully built ' + get_variant_path(manifest))
+                else:
+                    log.error('Failed to build ' + get_variant_path(manifest))
+                    failed.append(manifest)
+    finally:
+        call_plugins('stop_batch', manifests)
+    return failed
+
+
+def call_plugins(function, manifests):
+    """Calls ``function`` with the manifest on the plugins of every manifest that have such a function
+
+    :param str function: Name of the function to call
+    :param list manifests: The manifests
+    """
+    for manifest in manifests:
+        for plugin in manifest.modules['plugins']:
+            fn = getattr(plugin, function, None)
+            if callable(fn):
+                fn(manifest)
+
+
+def build(manifest, setup_logging, trace_dir, kwargs):
+    """Runs the bootstrapping process for a single manifest, this is the entry point of the build processes
+
+    :param Manifest manifest: The manifest to build
+    :param function setup_logging: Called with the manifest before the build starts
+    :param str trace_dir: The directory to write a timing trace of the build to
+    :param dict kwargs: Passed on to bootstrapvz.base.main.run()
+    """
+    import sys
+    if setup_logging is not None:
+        setup_logging(manifest)
+    from . import trace
+    from .main import run
+    from .matrix import get_variant_path
+    trace_path = None
+    if trace_dir is not None:
+        trace_path = trace.get_trace_path(trace_dir, get_variant_path(manifest))
+    try:
+        with trace.recording(trace_path):
+            run(manifest, **kwargs)
+    except (Exception, KeyboardInterrupt):
+        # The error has already been logged by run()
+        sys.exit(1)
+
+
+def fits(requirements, reserved, capacity):
+    """Checks whether there are enough resources left for a build
+
+    :param dict requirements: The resources the build needs
+    :param dict reserved: The resources reserved by the running builds
+    :param dict capacity: The resources the host has, resources that are not listed are unlimited
+    :rtype: bool
+    """
+    for resource, amount in requirements.items():
+        if resource in capacity and reserved.get(resource, 0) + amount > capacity[resource]:
+            return False
+    return True
+
+
+def get_requirements(manifest):
+    """Determines the host resources a build needs
+
+    :param Manifest manifest: The manifest of the build
+    :return: The amount of every resource, disk space is keyed by the device the workspace is on
+    :rtype: dict
+    """
+    from .fs import load_volume
+    backing = manifest.volume['backing']
+    requirements = {}
+    if backing in ['raw', 's3']:
+        requirements['loop'] = 1
+    if backing in ['vdi', 'vhd', 'vmdk', 'qcow2']:
+        requirements['nbd'] = 1
+    if backing not in ['ebs', 'lvm']:
+        volume = load_volume(manifest.volume, manifest.system['bootloader'])
+        requirements[get_disk_resource(manifest.bootstrapper['workspace'])] = int(volume.size.bytes)
+    return requirements
+
+
+def get_host_resources(manifests):
+    """Determines the resources that are available on the host
+
+    :param list manifests: The manifests that will be built, used to find the disks their workspaces are on
+    :return: The amount of every resource, resources that are not listed are unlimited
+    :rtype: dict
+    """
+    from bootstrapvz.common.fs.qemuvolume import get_free_nbd_devices
+    capacity = {'nbd': len([path for path in get_free_nbd_devices() if os.path.exists(path)])}
+    # Loop devices are created on demand, unless the kernel module limits their number
+    max_loop_path = '/sys/module/loop/parameters/max_loop'
+    if os.path.isfile(max_loop_path):
+        with open(max_loop_path) as max_loop:
+            num_loop_devices = int(max_loop.read().strip())
+        if num_loop_devices > 0:
+            from bootstrapvz.common.tools import log_check_call
+            capacity['loop'] = num_loop_devices - len(log_check_call(['losetup', '--all']))
+    for manifest in manifests:
+        workspace = get_existing_path(manifest.bootstrapper['workspace'])
+        stat = os.statvfs(workspace)
+        capacity[get_disk_resource(workspace)] = stat.f_bavail * stat.f_frsize
+    return capacity
+
+
+def get_disk_resource(path):
+    """Returns the name of the disk space resource of the device a path is on
+
+    :param str path: The path
+    :rtype: str
+    """
+    return 'disk:{device}'.format(device=os.stat(get_existing_path(path)).st_dev)
+
+
+def get_existing_path(path):
+    """Returns the path or its closest ancestor that exists
+
+    :param str path: The path
+    :rtype: str
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
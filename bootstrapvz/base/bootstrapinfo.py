@@ -62,6 +62,11 @@ class BootstrapInformation(object):
         # Path to optional bootstrapping script for modifying the behaviour of debootstrap
         # (will be used instead of e.g. /usr/share/debootstrap/scripts/jessie)
         self.bootstrap_script = None
+        # Hooks for mmdebstrap, pairs of the hook type (setup, extract, essential or customize)
+        # and the command that is run, the command receives the path to the root as its first argument
+        self.bootstrap_hooks = []
+        # Environment variables for debootstrap (or mmdebstrap), in addition to the environment of bootstrap-vz
+        self.bootstrap_env = {}
 
         # Lists of startup scripts that should be installed and disabled
         self.initd = {'install': {}, 'disable': []}
@@ -119,6 +124,16 @@ class BootstrapInformation(object):
         set_manifest_vars(manifest_vars, additional_vars)
         return manifest_vars
 
+    @property
+    def chroot(self):
+        """Runs commands and file operations inside the bootstrapped system,
+        several operations can be run at once with info.chroot.run_many()
+
+        :rtype: Chroot
+        """
+        from bootstrapvz.common.chroot import Chroot
+        return Chroot(self.root)
+
     def __getstate__(self):
         from bootstrapvz.remote import supported_classes
 
@@ -0,0 +1,205 @@
+"""The checkpoint module persists the state of the bootstrapping process after every phase,
+so that a failed build can be resumed from the last completed phase instead of being rolled back.
+"""
+import logging
+import os
+log = logging.getLogger(__name__)
+
+# Increment this when the contents of the checkpoint change, older checkpoints cannot be resumed then
+CHECKPOINT_VERSION = 1
+
+
+def get_checkpoint_path(checkpoint_dir, manifest):
+    """Returns the path to the checkpoint of a manifest.
+    The name is derived from the manifest data, so that a build can only be resumed with the same manifest.
+
+    :param str checkpoint_dir: The directory checkpoints are stored in
+    :param Manifest manifest: The manifest
+    :return: The path to the checkpoint file
+    :rtype: str
+    """
+    import hashlib
+    import json
+    digest = hashlib.sha1(json.dumps(manifest.data, sort_keys=True).encode('utf-8')).hexdigest()
+    return os.path.join(checkpoint_dir, 'checkpoint-{digest}'.format(digest=digest))
+
+
+def exists(checkpoint_dir, manifest):
+    """Checks whether a checkpoint for the manifest exists
+
+    :param str checkpoint_dir: The directory checkpoints are stored in
+    :param Manifest manifest: The manifest
+    :rtype: bool
+    """
+    return os.path.isfile(get_checkpoint_path(checkpoint_dir, manifest))
+
+
+def get_state(info):
+    """Returns the attributes of the bootstrap information object that can be saved.
+    Attributes that hold on to external resources (e.g. connections to a cloud provider) cannot be pickled
+    and are left out. The manifest is left out as well, it is loaded from the manifest file when resuming.
+
+    :param BootstrapInformation info: The bootstrap information object
+    :return: The attributes that can be saved
+    :rtype: dict
+    """
+    import pickle
+    state = {}
+    for key, value in info.__dict__.items():
+        if key == 'manifest':
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:  # pylint: disable=broad-except
+            log.debug('Unable to save the bootstrap information attribute `{key}\' in the checkpoint'.format(key=key))
+            continue
+        state[key] = value
+    return state
+
+
+def save(checkpoint_dir, info, tasks_completed, phase):
+    """Saves the bootstrap information and the list of completed tasks.
+    The checkpoint is replaced atomically, so that a crash while saving leaves the previous checkpoint intact.
+    Volumes that hold on to external resources (e.g. EBS volumes) cannot be saved,
+    in that case any previous checkpoint is removed, since the build could not be resumed from it.
+
+    :param str checkpoint_dir: The directory to store the checkpoint in
+    :param BootstrapInformation info: The bootstrap information object
+    :param list tasks_completed: The tasks that have been run
+    :param Phase phase: The phase that has just been completed
+    """
+    import pickle
+    import tempfile
+    state = get_state(info)
+    if 'volume' not in state:
+        log.warn('The volume of this build cannot be saved, unable to create a checkpoint')
+        remove(checkpoint_dir, info.manifest)
+        return
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    path = get_checkpoint_path(checkpoint_dir, info.manifest)
+    fd, tmp_path = tempfile.mkstemp(dir=checkpoint_dir, prefix='.checkpoint.')
+    with os.fdopen(fd, 'wb') as stream:
+        pickle.dump({'version': CHECKPOINT_VERSION,
+                     'phase': phase.name,
+                     'tasks_completed': list(tasks_completed),
+                     'info': state,
+                     }, stream)
+    os.rename(tmp_path, path)
+    # Any previous suspension is superseded by the new checkpoint
+    if os.path.exists(path + '.suspended'):
+        os.remove(path + '.suspended')
+    log.debug('Saved checkpoint after the phase `{phase}\' to {path}'.format(phase=phase, path=path))
+
+
+def load(checkpoint_dir, manifest):
+    """Loads the checkpoint of a manifest
+
+    :param str checkpoint_dir: The directory the checkpoint is stored in
+    :param Manifest manifest: The manifest
+    :return: The bootstrap information object and the list of completed tasks
+    :rtype: tuple
+    :raises CheckpointError: When there is no checkpoint or the build was not suspended properly
+    """
+    import pickle
+    from bootstrapvz.common.exceptions import CheckpointError
+    path = get_checkpoint_path(checkpoint_dir, manifest)
+    if not os.path.isfile(path):
+        raise CheckpointError('There is no checkpoint for this manifest in ' + checkpoint_dir)
+    if not os.path.isfile(path + '.suspended'):
+        raise CheckpointError('The build was not suspended, its volume may still be in use. '
+                              'Clean up the volume manually and remove ' + path)
+    with open(path, 'rb') as stream:
+        checkpoint = pickle.load(stream)
+    if checkpoint['version'] != CHECKPOINT_VERSION:
+        raise CheckpointError('The checkpoint at {path} was created by an incompatible version of bootstrap-vz'
+                              .format(path=path))
+    from .bootstrapinfo import BootstrapInformation
+    info = BootstrapInformation.__new__(BootstrapInformation)
+    info.__dict__.update(checkpoint['info'])
+    info.manifest = manifest
+    log.info('Resuming after the phase `{phase}\''.format(phase=checkpoint['phase']))
+    return info, checkpoint['tasks_completed']
+
+
+def remove(checkpoint_dir, manifest):
+    """Removes the checkpoint of a manifest
+
+    :param str checkpoint_dir: The directory the checkpoint is stored in
+    :param Manifest manifest: The manifest
+    """
+    path = get_checkpoint_path(checkpoint_dir, manifest)
+    for filename in [path, path + '.suspended']:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def suspend(checkpoint_dir, info):
+    """Releases the volume without deleting it, so that the build can be resumed later on.
+    The volume is unmounted, its partitions are unmapped and it is detached.
+
+    :param str checkpoint_dir: The directory the checkpoint is stored in
+    :param BootstrapInformation info: The bootstrap information object
+    """
+    volume = info.volume
+    p_map = volume.partition_map
+    if p_map.root.fsm.current == 'mounted':
+        # Unmounting the root partition also unmounts everything mounted inside it
+        p_map.root.unmount()
+    if volume.fsm.can('unlink_dm_node'):
+        volume.unlink_dm_node()
+    if hasattr(p_map, 'fsm') and p_map.fsm.can('unmap'):
+        p_map.unmap(volume)
+    if volume.fsm.can('detach'):
+        volume.detach()
+    open(get_checkpoint_path(checkpoint_dir, info.manifest) + '.suspended', 'w').close()
+
+
+def resume(info):
+    """Brings the volume of a resumed build back into the state it was in when the checkpoint was saved.
+    The state machines are first moved to the states the volume was left in by suspend(),
+    after that the volume is attached and linked, its partitions are mapped and the root partition is mounted.
+
+    :param BootstrapInformation info: The bootstrap information object loaded from the checkpoint
+    """
+    volume = info.volume
+    p_map = volume.partition_map
+    # Folder volumes cannot be detached, there is nothing to attach then
+    attach = hasattr(volume, 'attach') and volume.fsm.current in ['attached', 'linked']
+    link = volume.fsm.current == 'linked'
+    map_partitions = hasattr(p_map, 'fsm') and p_map.fsm.current == 'mapped'
+    mount_dir = getattr(p_map.root, 'mount_dir', None)
+
+    # Reflect what suspend() did in the state machines
+    if attach:
+        volume.fsm.current = 'detached'
+        volume.device_path = None
+    if link:
+        # The device mapper node is created anew, possibly under another name
+        for attr in ['dm_node_name', 'dm_node_path', 'unlinked_device_path']:
+            if hasattr(volume, attr):
+                delattr(volume, attr)
+    if map_partitions:
+        p_map.fsm.current = 'unmapped'
+    for partition in p_map.partitions:
+        if partition.fsm.current == 'mounted':
+            partition.fsm.current = 'formatted'
+        if map_partitions:
+            partition.fsm.current = {'mapped': 'unmapped',
+                                     'formatted': 'unmapped_fmt'}.get(partition.fsm.current, partition.fsm.current)
+            partition.device_path = None
+
+    if attach:
+        volume.attach()
+    if link:
+        volume.link_dm_node(**getattr(volume, 'dm_node_args', {}))
+    if map_partitions:
+        p_map.map(volume)
+    if mount_dir is not None:
+        p_map.root.mount(destination=mount_dir)
+
+    # Plugins may have to bring back resources that do not live in the volume (e.g. servers)
+    for plugin in info.manifest.modules['plugins']:
+        fn = getattr(plugin, 'resume', None)
+        if callable(fn):
+            fn(info)
@@ -27,6 +27,7 @@ def load_volume(data, bootloader):
     from bootstrapvz.common.fs.folder import Folder
     from bootstrapvz.common.fs.logicalvolume import LogicalVolume
     from bootstrapvz.common.fs.qcow2volume import Qcow2Volume
+    from bootstrapvz.common.fs.offlineimage import OfflineImage
     volume_backing = {'raw': LoopbackVolume,
                       's3':  LoopbackVolume,
                       'vdi': VirtualDiskImage,
@@ -37,6 +38,9 @@ def load_volume(data, bootloader):
                       'lvm': LogicalVolume,
                       'qcow2': Qcow2Volume
                       }.get(data['backing'])
+    if data.get('assembly', 'devices') == 'offline':
+        # The image is assembled from a directory tree, no matter what backs it
+        volume_backing = OfflineImage
 
     # Instantiate the partition map
     from bootstrapvz.common.bytes import Bytes
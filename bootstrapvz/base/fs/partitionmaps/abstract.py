@@ -20,9 +20,16 @@ class AbstractPartitionMap(FSMProxy, metaclass=ABCMeta):
         """
         :param str bootloader: Name of the bootloader we will use for bootstrapping
         """
-        # Create the configuration for the state machine
-        cfg = {'initial': 'nonexistent', 'events': self.events, 'callbacks': {}}
-        super(AbstractPartitionMap, self).__init__(cfg)
+        super(AbstractPartitionMap, self).__init__(self._get_fsm_cfg('nonexistent'))
+
+    def _get_fsm_cfg(self, initial):
+        """Creates the configuration for the state machine of the partition map
+
+        :param str initial: The state the partition map is in
+        :return: The state machine configuration
+        :rtype: dict
+        """
+        return {'initial': initial, 'events': self.events, 'callbacks': {}}
 
     def is_blocking(self):
         """Returns whether the partition map is blocking volume detach operations
@@ -47,8 +54,31 @@ class AbstractPartitionMap(FSMProxy, metaclass=ABCMeta):
         """
         self.fsm.create(volume=volume)
 
-    @abstractmethod
     def _before_create(self, event):
+        """Writes the partition table onto the volume
+        The table is encoded as a whole and written at once, no partitioning tool is involved.
+
+        :raises PartitionError: If the volume is too small for the partitions
+        """
+        from bootstrapvz.common import partitiontable
+        volume = event.volume
+        sector_size = self.root.size.sector_size.get_qty_in('B')
+        disk_sectors = partitiontable.get_size(volume.device_path) // sector_size
+        if disk_sectors < self.get_total_size().bytes.get_qty_in('B') // sector_size:
+            msg = 'The volume {path} is too small for the partitions'.format(path=volume.device_path)
+            raise PartitionError(msg)
+        partitiontable.write(volume.device_path, self.get_table(disk_sectors))
+        for partition in self.partitions:
+            partition.create(volume)
+
+    @abstractmethod
+    def get_table(self, disk_sectors):
+        """Encodes the partition table
+
+        :param int disk_sectors: The number of sectors of the volume
+        :return: A list of (offset, data) tuples, the offsets are in bytes
+        :rtype: list
+        """
         pass
 
     def map(self, volume):
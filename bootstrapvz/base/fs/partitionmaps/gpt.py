@@ -1,7 +1,7 @@
 from .abstract import AbstractPartitionMap
 from ..partitions.gpt import GPTPartition
 from ..partitions.gpt_swap import GPTSwapPartition
-from bootstrapvz.common.tools import log_check_call
+from ..exceptions import PartitionError
 
 
 class GPTPartitionMap(AbstractPartitionMap):
@@ -94,14 +94,34 @@ class GPTPartitionMap(AbstractPartitionMap):
 
         super(GPTPartitionMap, self).__init__(bootloader)
 
-    def _before_create(self, event):
-        """Creates the partition map
+    def get_table(self, disk_sectors, disk_guid=None, guids=None):
+        """Encodes the partition table
+
+        :param int disk_sectors: The number of sectors of the volume
+        :param str disk_guid: The GUID of the volume, a random one is used if None
+        :param list guids: The GUIDs of the partitions, random ones are used if None
+        :return: A list of (offset, data) tuples, the offsets are in bytes
+        :rtype: list
         """
-        volume = event.volume
-        # Disk alignment still plays a role in virtualized environment,
-        # but I honestly have no clue as to what best practice is here, so we choose 'none'
-        log_check_call(['parted', '--script', '--align', 'none', volume.device_path,
-                        '--', 'mklabel', 'gpt'])
-        # Create the partitions
-        for partition in self.partitions:
-            partition.create(volume)
+        import uuid
+        from bootstrapvz.common import partitiontable
+        if disk_guid is None:
+            disk_guid = str(uuid.uuid4())
+        if guids is None:
+            guids = [str(uuid.uuid4()) for _ in self.partitions]
+        entries = []
+        for partition, guid in zip(self.partitions, guids):
+            type_guid = partitiontable.gpt_types['swap' if partition.filesystem == 'swap' else 'linux']
+            attributes = 0
+            for flag in partition.flags:
+                if flag == 'bios_grub':
+                    type_guid = partitiontable.gpt_types['bios_grub']
+                elif flag in partitiontable.gpt_attributes:
+                    attributes |= partitiontable.gpt_attributes[flag]
+                else:
+                    raise PartitionError('The flag {flag} cannot be set on GPT partitions'.format(flag=flag))
+            first, last = partition.get_extent()
+            entries.append(partitiontable.gpt_entry(type_guid, guid, first, last, attributes,
+                                                    getattr(partition, 'name', '')))
+        sector_size = self.root.size.sector_size.get_qty_in('B')
+        return partitiontable.gpt(entries, disk_sectors, disk_guid, sector_size)
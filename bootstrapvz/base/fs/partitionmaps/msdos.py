@@ -2,7 +2,6 @@ from .abstract import AbstractPartitionMap
 from ..exceptions import PartitionError
 from ..partitions.msdos import MSDOSPartition
 from ..partitions.msdos_swap import MSDOSSwapPartition
-from bootstrapvz.common.tools import log_check_call
 
 
 class MSDOSPartitionMap(AbstractPartitionMap):
@@ -83,12 +82,28 @@ class MSDOSPartitionMap(AbstractPartitionMap):
 
         super(MSDOSPartitionMap, self).__init__(bootloader)
 
-    def _before_create(self, event):
-        volume = event.volume
-        # Disk alignment still plays a role in virtualized environment,
-        # but I honestly have no clue as to what best practice is here, so we choose 'none'
-        log_check_call(['parted', '--script', '--align', 'none', volume.device_path,
-                        '--', 'mklabel', 'msdos'])
-        # Create the partitions
+    def get_table(self, disk_sectors, signature=None):
+        """Encodes the partition table
+
+        :param int disk_sectors: The number of sectors of the volume
+        :param int signature: The disk signature, a random one is used if None
+        :return: A list of (offset, data) tuples, the offsets are in bytes
+        :rtype: list
+        """
+        import os
+        import struct
+        from bootstrapvz.common import partitiontable
+        if signature is None:
+            [signature] = struct.unpack('<I', os.urandom(4))
+        entries = []
         for partition in self.partitions:
-            partition.create(volume)
+            type_id = partitiontable.msdos_types['swap' if partition.filesystem == 'swap' else 'linux']
+            status = 0
+            for flag in partition.flags:
+                if flag != 'boot':
+                    raise PartitionError('The flag {flag} cannot be set on MS-DOS partitions'.format(flag=flag))
+                status = partitiontable.msdos_bootable
+            first, last = partition.get_extent()
+            entries.append(partitiontable.msdos_entry(status, type_id, first, last - first + 1))
+        sector_size = self.root.size.sector_size.get_qty_in('B')
+        return [(0, partitiontable.msdos(entries, signature, sector_size))]
@@ -33,12 +33,21 @@ class AbstractPartition(FSMProxy, metaclass=ABCMeta):
         self.pad_end = Sectors(0, size.sector_size)
         # Path to the partition
         self.device_path    = None
+        # UUID the filesystem is created with, it is read from the partition if None
+        self.uuid           = None
         # Dictionary with mount points as keys and Mount objects as values
         self.mounts         = {}
 
-        # Create the configuration for our state machine
-        cfg = {'initial': 'nonexistent', 'events': self.events, 'callbacks': {}}
-        super(AbstractPartition, self).__init__(cfg)
+        super(AbstractPartition, self).__init__(self._get_fsm_cfg('nonexistent'))
+
+    def _get_fsm_cfg(self, initial):
+        """Creates the configuration for the state machine of the partition
+
+        :param str initial: The state the partition is in
+        :return: The state machine configuration
+        :rtype: dict
+        """
+        return {'initial': initial, 'events': self.events, 'callbacks': {}}
 
     def get_uuid(self):
         """Gets the UUID of the partition
@@ -46,6 +55,8 @@ class AbstractPartition(FSMProxy, metaclass=ABCMeta):
         :return: The UUID of the partition
         :rtype: str
         """
+        if getattr(self, 'uuid', None) is not None:
+            return self.uuid
         [uuid] = log_check_call(['blkid', '-s', 'UUID', '-o', 'value', self.device_path])
         return uuid
 
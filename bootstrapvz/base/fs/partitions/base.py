@@ -30,7 +30,7 @@ class BasePartition(AbstractPartition):
         # By saving the previous partition we have a linked list
         # that partitions can go backwards in to find the first partition.
         self.previous = previous
-        # List of flags that parted should put on the partition
+        # List of flags that should be set on the partition in the partition table
         self.flags = []
         # Path to symlink in /dev/disk/by-uuid (manually maintained by this class)
         self.disk_by_uuid_path = None
@@ -65,6 +65,19 @@ class BasePartition(AbstractPartition):
             return Sectors(0, self.size.sector_size)
         return self.previous.get_end()
 
+    def get_extent(self):
+        """Gets the sectors this partition occupies in the partition table
+
+        :return: The first and the last sector of this partition, the last sector is included
+        :rtype: tuple
+        """
+        sector_size = self.size.sector_size.get_qty_in('B')
+        first = (self.get_start() + self.pad_start).bytes.get_qty_in('B') // sector_size
+        # Like parted, the partition ends at the sector its size points to.
+        # The partition maps leave a gap of one sector between partitions for this.
+        last = (self.get_end() - self.pad_end).bytes.get_qty_in('B') // sector_size
+        return first, last
+
     def map(self, device_path):
         """Maps the partition to a device_path
 
@@ -93,33 +106,6 @@ class BasePartition(AbstractPartition):
             os.remove(self.disk_by_uuid_path)
         self.disk_by_uuid_path = None
 
-    def _before_create(self, e):
-        """Creates the partition
-        """
-        from bootstrapvz.common.tools import log_check_call
-        # The create command is fairly simple:
-        # - fs_type is the partition filesystem, as defined by parted:
-        #   fs-type can be one of "fat16", "fat32", "ext2", "HFS", "linux-swap",
-        #   "NTFS", "reiserfs", or "ufs".
-        # - start and end are just Bytes objects coerced into strings
-        if self.filesystem == 'swap':
-            fs_type = 'linux-swap'
-        else:
-            fs_type = 'ext2'
-        create_command = ('mkpart primary {fs_type} {start} {end}'
-                          .format(fs_type=fs_type,
-                                  start=str(self.get_start() + self.pad_start),
-                                  end=str(self.get_end() - self.pad_end)))
-        # Create the partition
-        log_check_call(['parted', '--script', '--align', 'none', e.volume.device_path,
-                        '--', create_command])
-
-        # Set any flags on the partition
-        for flag in self.flags:
-            log_check_call(['parted', '--script', e.volume.device_path,
-                            '--', ('set {idx} {flag} on'
-                                   .format(idx=str(self.get_index()), flag=flag))])
-
     def _before_map(self, e):
         # Set the device path
         self.device_path = e.device_path
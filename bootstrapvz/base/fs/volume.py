@@ -29,7 +29,15 @@ class Volume(FSMProxy, metaclass=ABCMeta):
         self.partition_map = partition_map
         # The size of the volume as reported by the partition map
         self.size = self.partition_map.get_total_size()
+        super(Volume, self).__init__(self._get_fsm_cfg('nonexistent'))
 
+    def _get_fsm_cfg(self, initial):
+        """Creates the configuration for the state machine of the volume
+
+        :param str initial: The state the volume is in
+        :return: The state machine configuration
+        :rtype: dict
+        """
         # Before detaching, check that nothing would block the detachment
         callbacks = {'onbeforedetach': self._check_blocking}
         if isinstance(self.partition_map, NoPartitions):
@@ -43,8 +51,7 @@ class Volume(FSMProxy, metaclass=ABCMeta):
             callbacks['onunlink_dm_node'] = set_dev_path
 
         # Create the configuration for our finite state machine
-        cfg = {'initial': 'nonexistent', 'events': self.events, 'callbacks': callbacks}
-        super(Volume, self).__init__(cfg)
+        return {'initial': initial, 'events': self.events, 'callbacks': callbacks}
 
     def _after_create(self, e):
         if isinstance(self.partition_map, NoPartitions):
@@ -97,6 +104,12 @@ class Volume(FSMProxy, metaclass=ABCMeta):
         # The number of sectors that should be mapped
         sectors = getattr(e, 'sectors', int(self.size) - start_sector)
 
+        # Remember the arguments, so that the node can be linked again when a build is resumed
+        self.dm_node_args = {'logical_start_sector': logical_start_sector,
+                             'start_sector': start_sector,
+                             'sectors': sectors,
+                             }
+
         # This is the table we send to dmsetup, so that it may create a device mapping for us.
         table = ('{log_start_sec} {sectors} linear {major}:{minor} {start_sec}'
                  .format(log_start_sec=logical_start_sector,
@@ -105,20 +118,22 @@ class Volume(FSMProxy, metaclass=ABCMeta):
                          minor=device_partition['minor'],
                          start_sec=start_sector))
 
-        # Figure out the device letter and path
-        for letter in string.ascii_lowercase:
-            dev_name = 'vd' + letter
-            dev_path = os.path.join('/dev/mapper', dev_name)
-            if not os.path.exists(dev_path):
-                self.dm_node_name = dev_name
-                self.dm_node_path = dev_path
-                break
-
-        if not hasattr(self, 'dm_node_name'):
-            raise VolumeError('Unable to find a free block device path for mounting the bootstrap volume')
-
-        # Create the device mapping
-        log_check_call(['dmsetup', 'create', self.dm_node_name], table)
+        from bootstrapvz.common.fs import device_allocation
+        with device_allocation():
+            # Figure out the device letter and path
+            for letter in string.ascii_lowercase:
+                dev_name = 'vd' + letter
+                dev_path = os.path.join('/dev/mapper', dev_name)
+                if not os.path.exists(dev_path):
+                    self.dm_node_name = dev_name
+                    self.dm_node_path = dev_path
+                    break
+
+            if not hasattr(self, 'dm_node_name'):
+                raise VolumeError('Unable to find a free block device path for mounting the bootstrap volume')
+
+            # Create the device mapping
+            log_check_call(['dmsetup', 'create', self.dm_node_name], table)
         # Update the device_path but remember the old one for when we unlink the volume again
         self.unlinked_device_path = self.device_path
         self.device_path = self.dm_node_path
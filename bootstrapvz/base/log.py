@@ -18,6 +18,8 @@ def get_console_handler(debug, colorize):
     if colorize:
         # We want to colorize the output to the console, so we add a formatter
         console_handler.setFormatter(ColorFormatter())
+    else:
+        console_handler.setFormatter(SourceFormatter())
     # Set the log level depending on the debug argument
     if debug:
         console_handler.setLevel(logging.DEBUG)
@@ -81,6 +83,20 @@ class SourceFormatter(logging.Formatter):
         return super(SourceFormatter, self).format(record)
 
 
+class SourceFilter(logging.Filter):
+    """Tags log records with a source, so that the output of concurrent builds can be told apart
+    """
+
+    def __init__(self, source):
+        super(SourceFilter, self).__init__()
+        self.source = source
+
+    def filter(self, record):
+        if not hasattr(record, 'extra'):
+            record.extra = {'source': self.source}
+        return True
+
+
 class ColorFormatter(SourceFormatter):
     """Colorizes log messages depending on the loglevel
     """
@@ -18,15 +18,55 @@ def main():
     # Set up logging
     setup_loggers(opts)
 
+    from . import matrix
+    if opts['--batch']:
+        # Load all manifests up front, so that invalid manifests are reported before anything is built
+        manifests = [manifest for path in opts['MANIFEST'] for manifest in matrix.load(path)]
+
+        def setup_build_loggers(manifest):
+            # Replace the loggers inherited from the batch process
+            import logging
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            variant_path = matrix.get_variant_path(manifest)
+            source, _ = os.path.splitext(os.path.basename(variant_path))
+            setup_loggers(dict(opts, MANIFEST=variant_path), source=source)
+
+        from . import batch
+        failed = batch.run(manifests,
+                           jobs=int(opts['--jobs']),
+                           setup_logging=setup_build_loggers,
+                           trace_dir=opts['--trace'],
+                           dependencies=matrix.plan(manifests),
+                           debug=opts['--debug'],
+                           dry_run=opts['--dry-run'],
+                           checkpoint_dir=opts['--checkpoint-dir'])
+        if failed:
+            raise Exception('The builds of {manifests} failed'
+                            .format(manifests=', '.join(map(matrix.get_variant_path, failed))))
+        return
+
     # Load the manifest
-    from .manifest import Manifest
-    manifest = Manifest(path=opts['MANIFEST'])
+    manifests = matrix.load(opts['MANIFEST'])
+    if len(manifests) > 1:
+        raise Exception('The matrix of {path} expands into {num} manifests, use --batch to build them.'
+                        .format(path=opts['MANIFEST'], num=len(manifests)))
+    manifest = manifests[0]
 
     # Everything has been set up, begin the bootstrapping process
-    run(manifest,
-        debug=opts['--debug'],
-        pause_on_error=opts['--pause-on-error'],
-        dry_run=opts['--dry-run'])
+    from . import trace
+    trace_path = None
+    if opts['--trace'] is not None:
+        trace_path = trace.get_trace_path(opts['--trace'], manifest.path)
+    with trace.recording(trace_path):
+        run(manifest,
+            debug=opts['--debug'],
+            pause_on_error=opts['--pause-on-error'],
+            dry_run=opts['--dry-run'],
+            jobs=int(opts['--jobs']),
+            checkpoint_dir=opts['--checkpoint-dir'],
+            resume=opts['--resume'])
 
 
 def get_opts():
@@ -35,13 +75,21 @@ def get_opts():
     import docopt
     usage = """bootstrap-vz
 
-Usage: bootstrap-vz [options] MANIFEST
+Usage: bootstrap-vz [options] MANIFEST...
 
 Options:
   --log <path>       Log to given directory [default: /var/log/bootstrap-vz]
                      If <path> is `-' file logging will be disabled.
   --pause-on-error   Pause on error, before rollback
   --dry-run          Don't actually run the tasks
+  --jobs <n>         Run up to <n> independent tasks concurrently [default: 1]
+                     With --batch, run up to <n> builds concurrently instead.
+  --batch            Build all the given manifests
+  --trace <path>     Write the timing of every phase, task and command to the given directory
+  --checkpoint-dir <path>
+                     Save the build state to the given directory after every phase.
+                     Instead of rolling back on error, the volume is kept for --resume.
+  --resume           Resume a failed build from its last checkpoint
   --color=auto|always|never
                      Colorize the console output [default: auto]
   --debug            Print debugging information
@@ -50,21 +98,33 @@ Options:
     opts = docopt.docopt(usage)
     if opts['--color'] not in ('auto', 'always', 'never'):
         raise docopt.DocoptExit('Value of --color must be one of auto, always or never.')
+    if not opts['--jobs'].isdigit() or int(opts['--jobs']) < 1:
+        raise docopt.DocoptExit('Value of --jobs must be a positive integer.')
+    if opts['--resume'] and opts['--checkpoint-dir'] is None:
+        raise docopt.DocoptExit('--resume requires --checkpoint-dir.')
+    if opts['--batch']:
+        if opts['--resume'] or opts['--pause-on-error']:
+            raise docopt.DocoptExit('--resume and --pause-on-error cannot be combined with --batch.')
+    elif len(opts['MANIFEST']) > 1:
+        raise docopt.DocoptExit('Use --batch to build more than one manifest.')
+    else:
+        opts['MANIFEST'] = opts['MANIFEST'][0]
     return opts
 
 
-def setup_loggers(opts):
+def setup_loggers(opts, source=None):
     """Sets up the file and console loggers
 
     :params dict opts: Dictionary of options from the commandline
+    :params str source: Tags the console output with this source (e.g. the manifest in batch mode)
     """
     import logging
     root = logging.getLogger()
     root.setLevel(logging.NOTSET)
 
     from . import log
-    # Log to file unless --log is a single dash
-    if opts['--log'] != '-':
+    # Log to file unless --log is a single dash, in batch mode every build logs to its own file
+    if opts['--log'] != '-' and (source is not None or not opts.get('--batch', False)):
         import os.path
         log_filename = log.get_log_filename(opts['MANIFEST'])
         logpath = os.path.join(opts['--log'], log_filename)
@@ -80,16 +140,21 @@ def setup_loggers(opts):
         import os
         colorize = os.isatty(2)
     console_handler = log.get_console_handler(debug=opts['--debug'], colorize=colorize)
+    if source is not None:
+        console_handler.addFilter(log.SourceFilter(source))
     root.addHandler(console_handler)
 
 
-def run(manifest, debug=False, pause_on_error=False, dry_run=False):
+def run(manifest, debug=False, pause_on_error=False, dry_run=False, jobs=1, checkpoint_dir=None, resume=False):
     """Runs the bootstrapping process
 
     :params Manifest manifest: The manifest to run the bootstrapping process for
     :params bool debug: Whether to turn debugging mode on
     :params bool pause_on_error: Whether to pause on error, before rollback
     :params bool dry_run: Don't actually run the tasks
+    :params int jobs: The maximum number of tasks to run concurrently
+    :params str checkpoint_dir: Directory to save the build state in after every phase
+    :params bool resume: Whether to resume the build from the checkpoint in checkpoint_dir
     """
     import logging
 
@@ -102,21 +167,47 @@ def run(manifest, debug=False, pause_on_error=False, dry_run=False):
     tasklist = TaskList(tasks)
     # 'resolve_tasks' is the name of the function to call on the provider and plugins
 
-    # Create the bootstrap information object that'll be used throughout the bootstrapping process
-    from .bootstrapinfo import BootstrapInformation
-    bootstrap_info = BootstrapInformation(manifest=manifest, debug=debug)
+    from . import checkpoint
+    if resume:
+        # Pick up the bootstrap information object where the failed build left it
+        bootstrap_info, tasklist.tasks_completed = checkpoint.load(checkpoint_dir, manifest)
+        if not dry_run:
+            checkpoint.resume(bootstrap_info)
+    else:
+        # Create the bootstrap information object that'll be used throughout the bootstrapping process
+        from .bootstrapinfo import BootstrapInformation
+        bootstrap_info = BootstrapInformation(manifest=manifest, debug=debug)
+
+    checkpointing = checkpoint_dir is not None and not dry_run
+    # Snapshots are only restored into fresh builds
+    from . import snapshotcache
+    snapshots = None if dry_run or resume else snapshotcache.from_manifest(manifest)
+
+    def phase_completed(phase):
+        if snapshots is not None:
+            snapshots.store(bootstrap_info, phase)
+        if checkpointing:
+            checkpoint.save(checkpoint_dir, bootstrap_info, tasklist.tasks_completed, phase)
 
     try:
         # Run all the tasks the tasklist has gathered
-        tasklist.run(info=bootstrap_info, dry_run=dry_run)
+        tasklist.run(info=bootstrap_info, dry_run=dry_run, jobs=jobs,
+                     checkpoint=phase_completed, snapshots=snapshots)
         # We're done! :-)
         log.info('Successfully completed bootstrapping')
+        if checkpointing:
+            checkpoint.remove(checkpoint_dir, manifest)
     except (Exception, KeyboardInterrupt) as e:
         # When an error occurs, log it and begin rollback
         log.exception(e)
         if pause_on_error:
             # The --pause-on-error is useful when the user wants to inspect the volume before rollback
             input('Press Enter to commence rollback')
+        if checkpointing and checkpoint.exists(checkpoint_dir, manifest):
+            # Keep the volume around, so that the build can be resumed from the last checkpoint
+            log.error('Suspending the build, run again with --resume to continue from the last completed phase')
+            checkpoint.suspend(checkpoint_dir, bootstrap_info)
+            raise
         log.error('Rolling back')
 
         # Create a useful little function for the provider and plugins to use,
@@ -3,7 +3,7 @@ to determine which tasks should be added to the tasklist, what arguments various
 invocations should have etc..
 """
 from bootstrapvz.common.exceptions import ManifestError
-from bootstrapvz.common.tools import load_data, rel_path
+from bootstrapvz.common.tools import load_data
 import logging
 log = logging.getLogger(__name__)
 
@@ -16,19 +16,19 @@ class Manifest(object):
     to enforce it, instead we just rely on tasks behaving properly.
     """
 
-    def __init__(self, path=None, data=None):
+    def __init__(self, path=None, data=None, matrix_values=None):
         """Initializer: Given a path we load, validate and parse the manifest.
         To create the manifest from dynamic data instead of the contents of a file,
         provide a properly constructed dict as the data argument.
 
         :param str path: The path to the manifest (ignored, when `data' is provided)
         :param str data: The manifest data, if it is not None, it will be used instead of the contents of `path'
+        :param dict matrix_values: The values the manifest was given when its matrix was expanded
         """
         if path is None and data is None:
             raise ManifestError('`path\' or `data\' must be provided')
         self.path = path
-
-        self.metaschema = load_data(rel_path(__file__, 'metaschema.json'))
+        self.matrix_values = matrix_values
 
         self.load_data(data)
         self.load_modules()
@@ -60,6 +60,8 @@ class Manifest(object):
         import importlib
         self.modules = {'provider': importlib.import_module(provider_modname),
                         'plugins': [],
+                        # The plugins keyed by the name they have in the manifest
+                        'plugins_by_name': {},
                         }
         # Run through all the plugins mentioned in the manifest and load them
         from pkg_resources import iter_entry_points
@@ -82,6 +84,7 @@ class Manifest(object):
                         raise ImportError(msg)
                     plugin = entry_points[0].load()
                 self.modules['plugins'].append(plugin)
+                self.modules['plugins_by_name'][plugin_name] = plugin
 
     def validate(self):
         """Validates the manifest using the provider and plugin validation functions.
@@ -118,19 +121,29 @@ class Manifest(object):
         """This convenience function is passed around to all the validation functions
         so that they may run a json-schema validation by giving it the data and a path to the schema.
 
+        The schema is only loaded once, all errors in the data are reported at once.
+
         :param dict data: Data to validate (normally the manifest data)
         :param str schema_path: Path to the json-schema to use for validation
         """
         import jsonschema
-
-        schema = load_data(schema_path)
+        from . import schema
 
         try:
-            jsonschema.validate(schema, self.metaschema)
-            jsonschema.validate(data, schema)
+            validator = schema.get_validator(schema_path, schema.get_cache_dir())
         except jsonschema.ValidationError as e:
             self.validation_error(e.message, e.path)
 
+        errors = schema.get_errors(validator, data)
+        if errors:
+            message = errors[0].message
+            if len(errors) > 1:
+                message += '\n  Further errors:'
+                for error in errors[1:]:
+                    message += ('\n    {path}: {message}'
+                                .format(path='.'.join(map(str, error.absolute_path)) or '(root)', message=error.message))
+            self.validation_error(message, list(errors[0].absolute_path))
+
     def validation_error(self, message, data_path=None):
         """This function is passed to all validation functions so that they may
         raise a validation error because a custom validation of the manifest failed.
@@ -144,12 +157,12 @@ class Manifest(object):
     def __getstate__(self):
         return {'__class__': self.__module__ + '.' + self.__class__.__name__,
                 'path': self.path,
-                'metaschema': self.metaschema,
+                'matrix_values': self.matrix_values,
                 'data': self.data}
 
     def __setstate__(self, state):
         self.path = state['path']
-        self.metaschema = state['metaschema']
+        self.matrix_values = state.get('matrix_values')
         self.load_data(state['data'])
         self.load_modules()
         self.validate()
@@ -0,0 +1,97 @@
+"""The matrix module expands manifests with a matrix section into one manifest for every combination
+of the values in the matrix and plans which builds can share the first phases of another build.
+"""
+import logging
+import os
+log = logging.getLogger(__name__)
+
+
+def load(path):
+    """Loads a manifest and expands its matrix
+
+    :param str path: The path to the manifest
+    :return: A manifest for every combination of the values in the matrix,
+             or just the manifest if it does not have a matrix
+    :rtype: list
+    """
+    from bootstrapvz.common.tools import load_data
+    from .manifest import Manifest
+    data = load_data(path)
+    if 'matrix' not in data:
+        return [Manifest(path=path, data=data)]
+    return [Manifest(path=path, data=variant_data, matrix_values=values)
+            for values, variant_data in expand(data)]
+
+
+def expand(data):
+    """Expands the matrix section of manifest data
+
+    :param dict data: The manifest data, the matrix maps paths to settings (e.g. system.release) to lists of values
+    :return: Pairs of the matrix values of every combination and the manifest data of that combination
+    :rtype: list
+    """
+    import copy
+    import itertools
+    keys = list(data['matrix'].keys())
+    combinations = []
+    for values in itertools.product(*[data['matrix'][key] for key in keys]):
+        variant_data = copy.deepcopy(data)
+        del variant_data['matrix']
+        for key, value in zip(keys, values):
+            path = key.split('.')
+            section = variant_data
+            for name in path[:-1]:
+                section = section.setdefault(name, {})
+            section[path[-1]] = value
+        combinations.append((dict(zip(keys, values)), variant_data))
+    return combinations
+
+
+def get_variant_path(manifest):
+    """Returns the path to the manifest with the matrix values appended to the name.
+    It distinguishes the logfiles and traces of builds of the same manifest.
+
+    :param Manifest manifest: The manifest
+    :rtype: str
+    """
+    if not manifest.matrix_values:
+        return manifest.path
+    name, extension = os.path.splitext(manifest.path)
+    values = '-'.join(str(value) for value in manifest.matrix_values.values())
+    return '{name}-{values}{extension}'.format(name=name, values=values, extension=extension)
+
+
+def plan(manifests):
+    """Finds the builds that can start from a snapshot taken by another build.
+    Two builds share their first phases when their snapshot keys for a phase are the same
+    (see bootstrapvz.base.snapshotcache.get_keys()), that build is then started once the other has finished.
+
+    :param list manifests: The manifests that will be built
+    :return: The manifests that should wait for another build, mapped to that build
+    :rtype: dict
+    """
+    from . import snapshotcache
+    from .tasklist import create_list, get_all_tasks, load_tasks
+    leaders = []
+    dependencies = {}
+    for manifest in manifests:
+        snapshots = snapshotcache.from_manifest(manifest)
+        if snapshots is None:
+            continue
+        tasks = load_tasks('resolve_tasks', manifest)
+        all_tasks = set(get_all_tasks([manifest.modules['provider']] + manifest.modules['plugins']))
+        keys = snapshotcache.get_keys(manifest, create_list(tasks, all_tasks), snapshots.phases)
+        shared = None
+        for leader, leader_keys in leaders:
+            for phase, key in keys.items():
+                if leader_keys.get(phase) == key and (shared is None or phase.pos() > shared[1].pos()):
+                    shared = (leader, phase)
+        if shared is None:
+            leaders.append((manifest, keys))
+        else:
+            leader, phase = shared
+            log.debug('{manifest} shares the phases up to {phase} with {leader}'
+                      .format(manifest=get_variant_path(manifest), phase=phase.name,
+                              leader=get_variant_path(leader)))
+            dependencies[manifest] = leader
+    return dependencies
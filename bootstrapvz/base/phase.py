@@ -39,6 +39,9 @@ class Phase(object):
     def __le__(self, other):
         return self.pos() <= other.pos()
 
+    def __hash__(self):
+        return hash(self.name)
+
     def __cmp__(self, other):
         return self.version - other.version
 
@@ -0,0 +1,16 @@
+def format_vars(value, manifest_vars, memo):
+    """Formats a string that may contain manifest vars references.
+    Tasks add the same names and targets over and over, so the results are memoised.
+
+    :param str value: The string to format
+    :param dict manifest_vars: The manifest variables
+    :param dict memo: The formatted strings, keyed by the string that was formatted
+    :return: The formatted string
+    :rtype: str
+    """
+    if '{' not in value and '}' not in value:
+        return value
+    formatted = memo.get(value)
+    if formatted is None:
+        formatted = memo[value] = value.format(**manifest_vars)
+    return formatted
@@ -47,12 +47,17 @@ class PackageList(object):
         """
         self.manifest_vars = manifest_vars
         self.source_lists = source_lists
+        # The names and targets with the manifest vars references formatted
+        self.formatted = {}
         # The default_target is the release we are bootstrapping
         self.default_target = '{system.release}'.format(**self.manifest_vars)
         # The list of packages that should be installed, this is not a set.
         # We want to preserve the order in which the packages were added so that local
         # packages may be installed in the correct order.
+        # Packages should only be added through add(), add_many() and add_local(), which keep the index below current.
         self.install = []
+        # The remote packages in the install list, indexed by their name
+        self.remote_packages = {}
         # A function that filters the install list and only returns remote packages
         self.remote = lambda: [x for x in self.install if isinstance(x, self.Remote)]
 
@@ -65,13 +70,14 @@ class PackageList(object):
         :raises PackageError: When a package of the same name but with a different target has already been added.
         :raises PackageError: When the specified target release could not be found.
         """
+        from . import format_vars
         from .exceptions import PackageError
-        name = name.format(**self.manifest_vars)
+        name = format_vars(name, self.manifest_vars, self.formatted)
         if target is not None:
-            target = target.format(**self.manifest_vars)
+            target = format_vars(target, self.manifest_vars, self.formatted)
         # Check if the package has already been added.
         # If so, make sure it's the same target and raise a PackageError otherwise
-        package = next((pkg for pkg in self.remote() if pkg.name == name), None)
+        package = self.remote_packages.get(name)
         if package is not None:
             # It's the same target if the target names match or one of the targets is None
             # and the other is the default target.
@@ -96,12 +102,27 @@ class PackageList(object):
         # This allows us to preserve the semantics of the default target when calling apt-get install
         # Why? Try installing nfs-client/wheezy, you can't. It's a virtual package for which you cannot define
         # a target release. Only `apt-get install nfs-client` works.
-        self.install.append(self.Remote(name, target))
+        package = self.Remote(name, target)
+        self.install.append(package)
+        self.remote_packages[name] = package
+
+    def add_many(self, names, target=None):
+        """Adds several packages with the same target to the install list
+
+        :param list names: The names of the packages to install, may contain manifest vars references
+        :param str target: The name of the target release for the packages, may contain manifest vars references
+
+        :raises PackageError: When one of the packages has already been added with a different target.
+        :raises PackageError: When the specified target release could not be found.
+        """
+        for name in names:
+            self.add(name, target)
 
     def add_local(self, package_path):
         """Adds a local package to the installation list
 
         :param str package_path: Path to the local package, may contain manifest vars references
         """
-        package_path = package_path.format(**self.manifest_vars)
+        from . import format_vars
+        package_path = format_vars(package_path, self.manifest_vars, self.formatted)
         self.install.append(self.Local(package_path))
@@ -11,8 +11,12 @@ class SourceLists(object):
         # A dictionary with the name of the file in sources.list.d as the key
         # That values are lists of Source objects
         self.sources = {}
+        # The distributions of all sources, so that targets can be looked up without going through the sources
+        self.distributions = set()
         # Save the manifest variables, we need the later on
         self.manifest_vars = manifest_vars
+        # The names, lines and targets with the manifest vars references formatted
+        self.formatted = {}
 
     def add(self, name, line):
         """Adds a source to the apt sources list
@@ -20,11 +24,14 @@ class SourceLists(object):
         :param str name: Name of the file in sources.list.d, may contain manifest vars references
         :param str line: The line for the source file, may contain manifest vars references
         """
-        name = name.format(**self.manifest_vars)
-        line = line.format(**self.manifest_vars)
+        from . import format_vars
+        name = format_vars(name, self.manifest_vars, self.formatted)
+        line = format_vars(line, self.manifest_vars, self.formatted)
         if name not in self.sources:
             self.sources[name] = []
-        self.sources[name].append(Source(line))
+        source = Source(line)
+        self.sources[name].append(source)
+        self.distributions.add(source.distribution)
 
     def target_exists(self, target):
         """Checks whether the target exists in the sources list
@@ -34,12 +41,8 @@ class SourceLists(object):
         :return: Whether the target exists
         :rtype: bool
         """
-        target = target.format(**self.manifest_vars)
-        # Run through all the sources and return True if the target exists
-        for lines in self.sources.values():
-            if target in (source.distribution for source in lines):
-                return True
-        return False
+        from . import format_vars
+        return format_vars(target, self.manifest_vars, self.formatted) in self.distributions
 
 
 class Source(object):
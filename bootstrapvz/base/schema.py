@@ -0,0 +1,132 @@
+"""The schema module compiles the json-schemas that manifests are validated with.
+Every schema is loaded and checked against the metaschema only once per process.
+The parsed schemas are also stored in the user cache directory, keyed by the hash of the schema file,
+so that other processes can skip parsing and checking schemas that have not changed.
+"""
+import logging
+import os
+import threading
+log = logging.getLogger(__name__)
+
+# Increment this when the layout of the cached schemas changes, older entries will then be ignored
+SCHEMA_CACHE_VERSION = 1
+
+# The compiled validators, keyed by the path to the schema
+validators = {}
+# Guards the validators, manifests may be validated concurrently
+lock = threading.Lock()
+# The metaschema, loaded when it is first needed
+metaschema = None
+
+
+def get_cache_dir():
+    """Returns the directory in the user cache directory that parsed schemas are stored in
+
+    :rtype: str
+    """
+    cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'bootstrap-vz', 'schemas')
+
+
+def get_metaschema():
+    """Returns the metaschema that all schemas must adhere to
+
+    :rtype: dict
+    """
+    global metaschema
+    if metaschema is None:
+        from bootstrapvz.common.tools import load_data, rel_path
+        metaschema = load_data(rel_path(__file__, 'metaschema.json'))
+    return metaschema
+
+
+def get_validator(schema_path, cache_dir=None):
+    """Returns the validator for a schema, the schema is only loaded when it has changed since it was last loaded
+
+    :param str schema_path: Path to the json-schema
+    :param str cache_dir: The directory to store parsed schemas in (see get_cache_dir()), None disables storing
+    :return: The validator
+    :rtype: jsonschema.IValidator
+    :raises jsonschema.ValidationError: When the schema does not adhere to the metaschema
+    """
+    schema_path = os.path.realpath(schema_path)
+    stat = os.stat(schema_path)
+    with lock:
+        entry = validators.get(schema_path)
+        if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry['validator']
+
+    import jsonschema.validators
+    schema = load_schema(schema_path, cache_dir)
+    validator = jsonschema.validators.validator_for(schema)(schema)
+    with lock:
+        validators[schema_path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'validator': validator}
+    return validator
+
+
+def load_schema(schema_path, cache_dir=None):
+    """Loads a schema and checks it against the metaschema, unless a checked copy of it has been stored
+
+    :param str schema_path: Path to the json-schema
+    :param str cache_dir: The directory to store parsed schemas in, None disables storing
+    :return: The schema
+    :rtype: dict
+    :raises jsonschema.ValidationError: When the schema does not adhere to the metaschema
+    """
+    import hashlib
+    import json
+    from bootstrapvz import __version__
+    with open(schema_path, 'rb') as stream:
+        content = stream.read()
+    key = hashlib.sha256()
+    key.update('{version}:{app_version}:'.format(version=SCHEMA_CACHE_VERSION,
+                                                 app_version=__version__).encode('utf-8'))
+    key.update(content)
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, key.hexdigest() + '.json')
+        try:
+            with open(cache_path) as stream:
+                return json.load(stream)
+        except (IOError, OSError, ValueError):
+            # A missing or corrupt entry is simply recreated
+            pass
+
+    import jsonschema
+    from bootstrapvz.common.tools import load_data
+    schema = load_data(schema_path)
+    jsonschema.validate(schema, get_metaschema())
+
+    if cache_path is not None:
+        import tempfile
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.schema.')
+            try:
+                with os.fdopen(fd, 'w') as stream:
+                    json.dump(schema, stream)
+                os.rename(tmp_path, cache_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except (IOError, OSError, TypeError) as e:
+            log.debug('Unable to store the schema {path}: {error}'.format(path=schema_path, error=e))
+    return schema
+
+
+def get_errors(validator, data):
+    """Validates data and returns all errors, the most relevant error comes first
+
+    :param jsonschema.IValidator validator: The validator
+    :param dict data: The data to validate
+    :return: The validation errors
+    :rtype: list
+    """
+    from jsonschema.exceptions import best_match
+    errors = list(validator.iter_errors(data))
+    if not errors:
+        return []
+    first = best_match(errors)
+    # best_match() may descend into the context of an error, skip the error it was found in
+    return [first] + [error for error in errors if first not in error.context and error is not first]
@@ -0,0 +1,278 @@
+"""The snapshotcache module stores the workspace of a build after selected phases in a local cache.
+Snapshots are keyed by the manifest sections and tasks that influence the phases up to and including
+the snapshot phase, so that builds sharing that prefix can restore the snapshot and skip those phases.
+"""
+import logging
+import os
+log = logging.getLogger(__name__)
+
+# Increment this when the layout of the snapshots changes, older snapshots will then be ignored
+CACHE_VERSION = 1
+
+
+def from_manifest(manifest):
+    """Creates the snapshot cache configured in the bootstrapper section of the manifest
+
+    :param Manifest manifest: The manifest
+    :return: The snapshot cache or None if snapshot caching is not enabled
+    :rtype: SnapshotCache
+    """
+    if 'snapshot_cache' not in manifest.bootstrapper:
+        return None
+    from bootstrapvz.common import phases
+    from bootstrapvz.common.bytes import Bytes
+    settings = manifest.bootstrapper['snapshot_cache']
+    path = settings.get('path', os.path.join(manifest.bootstrapper['workspace'], 'snapshots'))
+    snapshot_phases = [getattr(phases, name) for name in settings.get('phases', ['package_installation'])]
+    return SnapshotCache(path, snapshot_phases, Bytes(settings.get('max_size', '20GiB')))
+
+
+class SnapshotCache(object):
+    """The SnapshotCache stores snapshots of the workspace (which contains the volume)
+    together with the bootstrap information, evicting the least recently used snapshots
+    when the cache grows beyond its size limit.
+    """
+
+    def __init__(self, path, phases, max_size=None):
+        """
+        :param str path: The directory the snapshots are stored in
+        :param list phases: The phases after which a snapshot should be stored
+        :param Bytes max_size: The maximum size of the cache, no snapshots are evicted if None
+        """
+        self.path = path
+        self.phases = phases
+        self.max_size = max_size
+        # The keys of the snapshots for the current build, indexed by phase
+        self.keys = {}
+
+    def restore(self, info, task_list):
+        """Restores the most recent snapshot that matches the tasklist and the manifest of the build.
+        The workspace is copied into the workspace of the build and the volume is attached and mounted again.
+
+        :param BootstrapInformation info: The bootstrap information object, it is updated in place
+        :param list task_list: The sorted list of tasks that will be run
+        :return: The tasks that no longer need to be run
+        :rtype: list
+        """
+        self.keys = get_keys(info.manifest, task_list, self.phases)
+        for phase in sorted(self.phases, key=lambda phase: phase.pos(), reverse=True):
+            entry = self.get_entry_path(self.keys[phase])
+            if os.path.isfile(os.path.join(entry, 'snapshot.json')):
+                break
+        else:
+            log.info('No snapshot has been cached for this build')
+            return []
+
+        import json
+        import pickle
+        from . import checkpoint
+        from bootstrapvz.common.filecopy import copy_dir
+        with open(os.path.join(entry, 'snapshot.json')) as stream:
+            metadata = json.load(stream)
+        with open(os.path.join(entry, 'state.pickle'), 'rb') as stream:
+            state = pickle.load(stream)
+        log.info('Restoring the snapshot taken after the phase `{phase}\''.format(phase=phase))
+        # The build keeps its own identity, only paths into the workspace are carried over
+        for key in ['run_id', 'workspace', 'debug']:
+            state.pop(key, None)
+        state = relocate(state, metadata['workspace'], info.workspace)
+        copy_dir(os.path.join(entry, 'workspace'), info.workspace)
+        # Mark the snapshot as recently used
+        os.utime(os.path.join(entry, 'snapshot.json'), None)
+        info.__dict__.update(state)
+        checkpoint.resume(info)
+        return [task for task in task_list if task.phase.pos() <= phase.pos()]
+
+    def store(self, info, phase):
+        """Stores a snapshot of the workspace if the phase is one of the snapshot phases
+        and no snapshot with the same key exists yet.
+
+        :param BootstrapInformation info: The bootstrap information object
+        :param Phase phase: The phase that has just been completed
+        """
+        key = self.keys.get(phase)
+        if key is None or os.path.isdir(self.get_entry_path(key)):
+            return
+        from bootstrapvz.common.fs.folder import Folder
+        from bootstrapvz.common.fs.offlineimage import OfflineImage
+        if not isinstance(info.volume, Folder) and not hasattr(info.volume, 'image_path'):
+            log.warn('Only volumes that are backed by a file or a folder can be cached')
+            return
+
+        import json
+        import pickle
+        import shutil
+        import tempfile
+        from . import checkpoint
+        from bootstrapvz.common.filecopy import copy_dir
+        from bootstrapvz.common.fs import unmounted
+        log.info('Storing a snapshot of the workspace after the phase `{phase}\''.format(phase=phase))
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        tmp_path = tempfile.mkdtemp(dir=self.path, prefix='.snapshot.')
+        try:
+            # Save the state before unmounting, it is what the volume is brought back to when restoring
+            with open(os.path.join(tmp_path, 'state.pickle'), 'wb') as stream:
+                pickle.dump(checkpoint.get_state(info), stream)
+            if isinstance(info.volume, (Folder, OfflineImage)):
+                # Nothing is mounted, the workspace can be copied as it is
+                copy_dir(info.workspace, os.path.join(tmp_path, 'workspace'))
+            else:
+                with unmounted(info.volume):
+                    copy_dir(info.workspace, os.path.join(tmp_path, 'workspace'))
+            with open(os.path.join(tmp_path, 'snapshot.json'), 'w') as stream:
+                json.dump({'version': CACHE_VERSION,
+                           'phase': phase.name,
+                           'workspace': info.workspace,
+                           'size': get_disk_usage(tmp_path),
+                           }, stream)
+            try:
+                os.rename(tmp_path, self.get_entry_path(key))
+            except OSError:
+                # Another build stored the same snapshot in the meantime
+                log.debug('The snapshot {key} has already been stored'.format(key=key))
+        finally:
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used snapshots until the cache fits within its size limit
+        """
+        if self.max_size is None:
+            return
+        import json
+        entries = []
+        for name in os.listdir(self.path):
+            metadata_path = os.path.join(self.path, name, 'snapshot.json')
+            if name.startswith('.') or not os.path.isfile(metadata_path):
+                continue
+            with open(metadata_path) as stream:
+                metadata = json.load(stream)
+            entries.append((os.path.getmtime(metadata_path), metadata['size'], name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.max_size.get_qty_in('B'):
+            _, size, name = entries.pop(0)
+            log.info('Evicting the snapshot ' + name)
+            self.remove(name)
+            total -= size
+
+    def remove(self, key):
+        """Removes a snapshot from the cache.
+        The snapshot is moved out of the way first, so that concurrent builds never restore a partial snapshot.
+
+        :param str key: The key of the snapshot
+        """
+        import shutil
+        import tempfile
+        tmp_path = tempfile.mkdtemp(dir=self.path, prefix='.evicted.')
+        try:
+            os.rename(self.get_entry_path(key), os.path.join(tmp_path, key))
+        except OSError:
+            # The snapshot has already been removed by another build
+            pass
+        shutil.rmtree(tmp_path)
+
+    def get_entry_path(self, key):
+        """Returns the path to the snapshot with the given key
+
+        :param str key: The key of the snapshot
+        :rtype: str
+        """
+        return os.path.join(self.path, key)
+
+
+def get_keys(manifest, task_list, phases):
+    """Computes the keys of the snapshots taken after the given phases.
+    A key covers the tasks up to and including the phase and every section of the manifest,
+    except for the name of the image and the settings of plugins that only add tasks to later phases.
+
+    :param Manifest manifest: The manifest
+    :param list task_list: The sorted list of tasks that will be run
+    :param list phases: The phases to compute the keys for
+    :return: The keys indexed by phase
+    :rtype: dict
+    """
+    import copy
+    import hashlib
+    import json
+    from bootstrapvz import __version__
+
+    # Find the earliest phase each plugin adds tasks to
+    plugin_phases = {}
+    for name, plugin in manifest.modules['plugins_by_name'].items():
+        taskset = set()
+        resolve_tasks = getattr(plugin, 'resolve_tasks', None)
+        if callable(resolve_tasks):
+            resolve_tasks(taskset, manifest)
+        plugin_phases[name] = min([task.phase.pos() for task in taskset] or [None])
+
+    keys = {}
+    for phase in phases:
+        data = copy.deepcopy(manifest.data)
+        del data['name']
+        del data['bootstrapper']['snapshot_cache']
+        for name, first_phase in plugin_phases.items():
+            if first_phase is None or first_phase > phase.pos():
+                del data['plugins'][name]
+        # Independent tasks may be listed in any order, the order must not change the key
+        tasks = sorted(task.__module__ + '.' + task.__name__ for task in task_list if task.phase.pos() <= phase.pos())
+        description = {'version': [CACHE_VERSION, __version__],
+                       'phase': phase.name,
+                       'manifest': data,
+                       'tasks': tasks,
+                       }
+        description = json.dumps(description, sort_keys=True)
+        keys[phase] = hashlib.sha256(description.encode('utf-8')).hexdigest()
+    return keys
+
+
+def relocate(value, old_path, new_path):
+    """Replaces the path prefix ``old_path`` with ``new_path`` in every string that is reachable from the value.
+    Containers and bootstrap-vz objects are traversed and updated in place.
+
+    :param value: The value to relocate
+    :param str old_path: The path to replace
+    :param str new_path: The path to replace it with
+    :return: The relocated value
+    """
+    seen = set()
+
+    def visit(value):
+        if isinstance(value, str):
+            if value == old_path or value.startswith(old_path + os.sep):
+                return new_path + value[len(old_path):]
+            return value
+        if isinstance(value, tuple):
+            return tuple(map(visit, value))
+        if id(value) in seen:
+            return value
+        seen.add(id(value))
+        if isinstance(value, list):
+            value[:] = list(map(visit, value))
+        elif isinstance(value, (set, dict)):
+            items = list(value.items()) if isinstance(value, dict) else list(value)
+            value.clear()
+            if isinstance(value, dict):
+                value.update((visit(key), visit(item)) for key, item in items)
+            else:
+                value.update(map(visit, items))
+        elif type(value).__module__.startswith('bootstrapvz.') and hasattr(value, '__dict__'):
+            visit(value.__dict__)
+        return value
+    return visit(value)
+
+
+def get_disk_usage(path):
+    """Returns the space a directory occupies on disk, sparse files only count with their allocated blocks
+
+    :param str path: Path to the directory
+    :return: The disk usage in bytes
+    :rtype: int
+    """
+    usage = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            usage += os.lstat(os.path.join(dirpath, filename)).st_blocks * 512
+    return usage
@@ -10,6 +10,10 @@ class Task(object):
     predecessors = []
     # List of tasks that should run after this task has run
     successors = []
+    # Files, relative to the root of the bootstrapped system, that this task only changes through
+    # the file editing functions in bootstrapvz.common.tools.
+    # Files that several tasks of a phase edit are written once, when the phase has been run.
+    edits = []
 
     class __metaclass__(type):
         """Metaclass to control how the class is coerced into a string
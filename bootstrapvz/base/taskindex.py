@@ -0,0 +1,277 @@
+"""The taskindex module contains the TaskIndex class.
+The index records the phase, predecessors and successors of every task,
+so that the tasklist can be sorted without importing every provider and plugin.
+"""
+
+import logging
+import os
+log = logging.getLogger(__name__)
+
+# Increment this when the layout of the index changes, older indices will then be discarded
+INDEX_VERSION = 2
+
+
+def get_index_path():
+    """Returns the path to the task index in the user cache directory
+
+    :return: The path to the index file
+    :rtype: str
+    """
+    cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'bootstrap-vz', 'task-index.json')
+
+
+class TaskReference(object):
+    """Stands in for a task whose module has not been imported.
+    It carries everything that is needed to order the task relative to other tasks,
+    but it cannot be run.
+    """
+
+    def __init__(self, module_name, class_name, phase):
+        self.__module__ = module_name
+        self.__name__ = class_name
+        self.phase = phase
+        self.predecessors = []
+        self.successors = []
+
+    def __repr__(self):
+        return self.__module__ + '.' + self.__name__
+
+    def __str__(self):
+        return repr(self)
+
+
+class TaskIndex(object):
+    """The TaskIndex maps module names to the tasks they contain.
+    Each entry is keyed by the modification time and size of the module file, the files of the modules
+    its tasks inherit from and the phases module. Only modules where one of those files has changed
+    since it was indexed are imported.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the file the index is stored in
+        """
+        self.path = path
+        self.modules = {}
+        self.changed = False
+        try:
+            import json
+            with open(self.path) as stream:
+                index = json.load(stream)
+            if index.get('version') == INDEX_VERSION:
+                self.modules = index['modules']
+        except (IOError, OSError, ValueError, KeyError):
+            # A missing or corrupt index is simply rebuilt
+            pass
+
+    def save(self):
+        """Writes the index to disk if it has changed.
+        The file is replaced atomically, so that concurrent runs never read a partially written index.
+        """
+        if not self.changed:
+            return
+        import json
+        import tempfile
+        # Drop the modules that have been removed since they were indexed
+        modules = {name: entry for name, entry in self.modules.items() if os.path.isfile(entry['path'])}
+        try:
+            index_dir = os.path.dirname(self.path)
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix='.task-index.')
+            with os.fdopen(fd, 'w') as stream:
+                json.dump({'version': INDEX_VERSION, 'modules': modules}, stream)
+            os.rename(tmp_path, self.path)
+            self.changed = False
+        except (IOError, OSError) as e:
+            log.debug('Unable to save the task index to {path}: {error}'.format(path=self.path, error=e))
+
+    def get_tasks(self, module_paths):
+        """Gets all tasks in the given packages.
+        Tasks in modules that have already been imported are returned as classes,
+        all other tasks are returned as TaskReferences.
+
+        :param set module_paths: Pairs of package paths and the corresponding module name prefixes
+        :return: A list of all tasks in the packages
+        :rtype: list
+        """
+        import importlib
+        import sys
+        from bootstrapvz.common.phases import order
+
+        entries = {}
+        for module_path, module_prefix in module_paths:
+            for module_name, filename in find_modules(module_path, module_prefix):
+                entries[module_name] = self.get_entry(module_name, filename)
+
+        def descriptions():
+            for module_name, entry in entries.items():
+                for class_name, description in entry['tasks'].items():
+                    yield module_name, class_name, description
+
+        # Tasks may reference tasks outside of the indexed packages, those modules are imported right away
+        # so that their tasks can refer to indexed tasks as classes rather than references.
+        for _, _, description in descriptions():
+            for name in description['predecessors'] + description['successors']:
+                module_name = name.rsplit('.', 1)[0]
+                if module_name not in entries:
+                    importlib.import_module(module_name)
+
+        tasks = {}
+        for module_name, class_name, description in descriptions():
+            if module_name in sys.modules:
+                task = getattr(sys.modules[module_name], class_name)
+            else:
+                task = TaskReference(module_name, class_name, order[description['phase']])
+            tasks[module_name + '.' + class_name] = task
+
+        def resolve(name):
+            if name in tasks:
+                return tasks[name]
+            module_name, class_name = name.rsplit('.', 1)
+            return getattr(importlib.import_module(module_name), class_name)
+
+        for module_name, class_name, description in descriptions():
+            task = tasks[module_name + '.' + class_name]
+            if isinstance(task, TaskReference):
+                task.predecessors = list(map(resolve, description['predecessors']))
+                task.successors = list(map(resolve, description['successors']))
+        return list(tasks.values())
+
+    def get_entry(self, module_name, filename):
+        """Gets the index entry for a module, the module is imported and indexed if the entry is outdated
+
+        :param str module_name: The name of the module
+        :param str filename: Path to the module file
+        :return: The index entry
+        :rtype: dict
+        """
+        entry = self.modules.get(module_name)
+        if entry is None or entry['path'] != filename \
+           or entry['files'] != get_file_keys(list(entry['files'].keys())):
+            entry = index_module(module_name, filename)
+            self.modules[module_name] = entry
+            self.changed = True
+        if 'error' in entry:
+            # The module is skipped until it changes, whether or not it has been indexed before
+            log.warn('Skipping the tasks in {module}: {error}'.format(module=module_name, error=entry['error']))
+        return entry
+
+
+def index_module(module_name, filename):
+    """Imports a module and describes its tasks
+
+    :param str module_name: The name of the module
+    :param str filename: Path to the module file
+    :return: The index entry, with the error if the module cannot be imported
+    :rtype: dict
+    """
+    import importlib
+    from bootstrapvz.common import phases
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        return {'path': filename,
+                'files': get_file_keys([filename, phases.__file__]),
+                'tasks': {},
+                'error': str(e),
+                }
+    return {'path': filename,
+            'files': get_file_keys(get_dependencies(module, filename)),
+            'tasks': describe_tasks(module),
+            }
+
+
+def get_dependencies(module, filename):
+    """Returns the files a module's index entry depends on: the module itself,
+    the modules its tasks inherit from and the module that defines the order of the phases
+
+    :param module module: The module
+    :param str filename: Path to the module file
+    :return: Paths to the files
+    :rtype: list
+    """
+    import inspect
+    import sys
+    from .task import Task
+    from bootstrapvz.common import phases
+    files = set([filename, phases.__file__])
+    for _, obj in inspect.getmembers(module, inspect.isclass):
+        if obj.__module__ != module.__name__ or not issubclass(obj, Task):
+            continue
+        for base in inspect.getmro(obj)[1:]:
+            base_file = getattr(sys.modules.get(base.__module__), '__file__', None)
+            if base_file is not None and base_file.endswith('.py'):
+                files.add(base_file)
+    return sorted(files)
+
+
+def get_file_keys(paths):
+    """Returns the modification time and size of files, None for files that do not exist anymore
+
+    :param list paths: Paths to the files
+    :return: A mapping of paths to [mtime, size] pairs
+    :rtype: dict
+    """
+    keys = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            keys[path] = [stat.st_mtime, stat.st_size]
+        except OSError:
+            keys[path] = None
+    return keys
+
+
+def find_modules(path, prefix):
+    """Finds all modules in a package without importing them
+
+    :param str path: Path to the package
+    :param str prefix: Name of the package followed by a dot
+    :return: A generator that yields pairs of module names and paths to the module files
+    :rtype: generator
+    """
+    for abs_prefix, dirs, files in os.walk(path):
+        # Only descend into subpackages
+        dirs[:] = sorted(d for d in dirs if os.path.isfile(os.path.join(abs_prefix, d, '__init__.py')))
+        rel_prefix = os.path.relpath(abs_prefix, path)
+        package_prefix = prefix
+        if rel_prefix != '.':
+            package_prefix += rel_prefix.replace(os.sep, '.') + '.'
+        for filename in sorted(files):
+            module_name, extension = os.path.splitext(filename)
+            if extension != '.py':
+                continue
+            if module_name == '__init__':
+                # The package itself, but not the top-level one, that's the prefix
+                if rel_prefix == '.':
+                    continue
+                yield package_prefix[:-1], os.path.join(abs_prefix, filename)
+            else:
+                yield package_prefix + module_name, os.path.join(abs_prefix, filename)
+
+
+def describe_tasks(module):
+    """Describes the tasks defined in a module
+
+    :param module module: The module to inspect
+    :return: A mapping of task class names to their phase and ordering
+    :rtype: dict
+    """
+    import inspect
+    from .task import Task
+
+    def name(task):
+        return task.__module__ + '.' + task.__name__
+
+    tasks = {}
+    for class_name, obj in inspect.getmembers(module, inspect.isclass):
+        # We only want tasks that are defined in the module, and not imported ones
+        if obj.__module__ != module.__name__ or not issubclass(obj, Task) or obj is Task:
+            continue
+        tasks[class_name] = {'phase': obj.phase.pos(),
+                             'predecessors': list(map(name, obj.predecessors)),
+                             'successors': list(map(name, obj.successors)),
+                             }
+    return tasks
@@ -5,6 +5,9 @@ from bootstrapvz.common.exceptions import TaskListError
 import logging
 log = logging.getLogger(__name__)
 
+# The number of validation tasks that are run concurrently, they mostly wait for commands and the filesystem
+VALIDATION_JOBS = 4
+
 
 class TaskList(object):
     """The tasklist class aggregates all tasks that should be run
@@ -15,11 +18,15 @@ class TaskList(object):
         self.tasks = tasks
         self.tasks_completed = []
 
-    def run(self, info, dry_run=False):
+    def run(self, info, dry_run=False, jobs=1, checkpoint=None, snapshots=None):
         """Converts the taskgraph into a list and runs all tasks in that list
+        Tasks that are already in the list of completed tasks (i.e. when resuming a build) are skipped.
 
         :param dict info: The bootstrap information object
         :param bool dry_run: Whether to actually run the tasks or simply step through them
+        :param int jobs: The maximum number of tasks to run concurrently
+        :param function checkpoint: Called with the phase as its argument whenever a phase has been completed
+        :param SnapshotCache snapshots: The cache to restore a snapshot of the workspace from
         """
         # Get a hold of every task we can find, so that we can topologically sort
         # all tasks, rather than just the subset we are going to run.
@@ -31,19 +38,153 @@ class TaskList(object):
         task_list = create_list(self.tasks, all_tasks)
         # Output the tasklist
         log.debug('Tasklist:\n\t' + ('\n\t'.join(map(repr, task_list))))
+        self.run_tasks(task_list, all_tasks, info, dry_run, jobs, checkpoint, snapshots)
 
-        for task in task_list:
-            # Tasks are not required to have a description
-            if hasattr(task, 'description'):
-                log.info(task.description)
-            else:
-                # If there is no description, simply coerce the task into a string and print its name
-                log.info('Running ' + str(task))
+    def run_tasks(self, task_list, all_tasks, info, dry_run=False, jobs=1, checkpoint=None, snapshots=None):
+        """Runs a sorted tasklist phase by phase, skipping the tasks that have already been completed
+
+        :param list task_list: The sorted tasks
+        :param set all_tasks: All known tasks
+        :param dict info: The bootstrap information object
+        :param bool dry_run: Whether to actually run the tasks or simply step through them
+        :param int jobs: The maximum number of tasks to run concurrently
+        :param function checkpoint: Called with the phase as its argument whenever a phase has been completed
+        :param SnapshotCache snapshots: The cache to restore a snapshot of the workspace from
+        """
+        from bootstrapvz.common import phases
+        if snapshots is not None and not self.tasks_completed:
+            # The snapshot cannot tell whether this host is able to run the remaining tasks,
+            # so the manifest and the host are validated before it is restored
+            self.run_phases([task for task in task_list if task.phase is phases.validation],
+                            all_tasks, info, dry_run, jobs, checkpoint)
+            restored = snapshots.restore(info, task_list)
+            self.tasks_completed.extend(task for task in restored if task not in self.tasks_completed)
+        if self.tasks_completed:
+            log.info('Skipping {num} tasks that have already been completed'.format(num=len(self.tasks_completed)))
+            task_list = [task for task in task_list if task not in self.tasks_completed]
+        self.run_phases(task_list, all_tasks, info, dry_run, jobs, checkpoint)
+
+    def run_phases(self, task_list, all_tasks, info, dry_run=False, jobs=1, checkpoint=None):
+        """Runs the phases of a sorted tasklist one after another
+
+        :param list task_list: The sorted tasks
+        :param set all_tasks: All known tasks
+        :param dict info: The bootstrap information object
+        :param bool dry_run: Whether to actually run the tasks or simply step through them
+        :param int jobs: The maximum number of tasks to run concurrently
+        :param function checkpoint: Called with the phase as its argument whenever a phase has been completed
+        """
+        import collections
+        import itertools
+        import os.path
+        from bootstrapvz.common import phases
+        from bootstrapvz.common.tools import batched_edits
+        from . import trace
+        for phase, phase_tasks in itertools.groupby(task_list, key=lambda task: task.phase):
+            phase_tasks = list(phase_tasks)
+            # Batch the edits of files that are shared by several tasks of the phase
+            shared_edits = []
             if not dry_run:
-                # Run the task
-                task.run(info)
-            # Remember which tasks have been run for later use (e.g. when rolling back, because of an error)
-            self.tasks_completed.append(task)
+                edits = collections.Counter(path for task in phase_tasks for path in set(task.edits))
+                shared_edits = [os.path.join(info.root, path) for path, count in edits.items() if count > 1]
+            with trace.span('phase', phase.name), batched_edits(shared_edits):
+                if phase is phases.validation:
+                    # Validation tasks only inspect the manifest and the host,
+                    # all of them are run so that every failure is reported at once
+                    self.run_concurrently(phase_tasks, all_tasks, info, dry_run,
+                                          max(jobs, VALIDATION_JOBS), keep_going=True)
+                elif jobs > 1:
+                    self.run_concurrently(phase_tasks, all_tasks, info, dry_run, jobs)
+                else:
+                    for task in phase_tasks:
+                        run_task(task, info, dry_run)
+                        # Remember which tasks have been run for later use (e.g. when rolling back, because of an error)
+                        self.tasks_completed.append(task)
+            if checkpoint is not None:
+                checkpoint(phase)
+
+    def run_concurrently(self, task_list, all_tasks, info, dry_run=False, jobs=2, keep_going=False):
+        """Runs the tasks in a sorted tasklist on a pool of worker threads.
+        The phases are still run one after another, but inside a phase a task is started
+        as soon as all the tasks it depends on have completed.
+        When a task fails, no further tasks are started and the tasks that are still running
+        are allowed to finish before the error is raised.
+
+        :param list task_list: The tasks to run, as sorted by create_list()
+        :param set all_tasks: All known tasks, used for resolving indirect dependencies
+        :param dict info: The bootstrap information object
+        :param bool dry_run: Whether to actually run the tasks or simply step through them
+        :param int jobs: The maximum number of tasks to run concurrently
+        :param bool keep_going: Whether to keep starting tasks that do not depend on a failed task,
+                                all errors of the phase are then raised together
+        """
+        import itertools
+        from multiprocessing.dummy import Pool as ThreadPool
+        from queue import Queue
+
+        dependencies = get_dependencies(task_list, all_tasks)
+        # Tasks report back through this queue when they are done (successfully or not)
+        finished = Queue()
+        pool = ThreadPool(jobs)
+        done = set()
+        errors = {}
+        try:
+            for _, phase_tasks in itertools.groupby(task_list, key=lambda task: task.phase.pos()):
+                pending = list(phase_tasks)
+                running = 0
+                while pending or running:
+                    if not errors or keep_going:
+                        ready = [task for task in pending if dependencies[task] <= done]
+                        if not ready and not running:
+                            if errors:
+                                # The remaining tasks depend on tasks that failed
+                                break
+                            raise TaskListError('Unable to resolve the dependencies of ' +
+                                                ', '.join(map(str, pending)))
+                        for task in ready:
+                            pending.remove(task)
+                            running += 1
+                            pool.apply_async(run_task, (task, info, dry_run),
+                                             callback=lambda _, task=task: finished.put((task, None)),
+                                             error_callback=lambda e, task=task: finished.put((task, e)))
+                    elif not running:
+                        break
+                    task, task_error = finished.get()
+                    running -= 1
+                    if task_error is None:
+                        done.add(task)
+                    elif keep_going or not errors:
+                        errors[task] = task_error
+                if errors:
+                    from bootstrapvz.common.exceptions import raise_errors
+                    # Report the errors in the order of the tasklist, regardless of when they occurred
+                    raise_errors([errors[task] for task in task_list if task in errors])
+        finally:
+            pool.close()
+            pool.join()
+            # Record the completed tasks in the order of the tasklist, regardless of when they finished.
+            # That way the rollback tasks are resolved the same way they would be in a serial run.
+            self.tasks_completed.extend([task for task in task_list if task in done])
+
+
+def run_task(task, info, dry_run=False):
+    """Runs a single task
+
+    :param Task task: The task to run
+    :param dict info: The bootstrap information object
+    :param bool dry_run: Whether to actually run the task or simply log it
+    """
+    # Tasks are not required to have a description
+    if hasattr(task, 'description'):
+        log.info(task.description)
+    else:
+        # If there is no description, simply coerce the task into a string and print its name
+        log.info('Running ' + str(task))
+    if not dry_run:
+        # Run the task
+        from . import trace
+        with trace.span('task', task.__module__ + '.' + task.__name__, phase=task.phase.name):
+            task.run(info)
 
 
 def load_tasks(function, manifest, *args):
@@ -82,20 +223,31 @@ def create_list(taskset, all_tasks):
         raise TaskListError(msg)
     # Create a graph over all tasks by creating a map of each tasks successors
     graph = {}
+    # Bucket the tasks by phase, so that the phase ordering can be expressed without
+    # adding an edge from every task to every task in the succeeding phases.
+    phase_tasks = [[] for _ in order]
+    phase_index = {phase: i for i, phase in enumerate(order)}
     for task in all_tasks:
         # Do a sanity check first
         check_ordering(task)
-        successors = set()
         # Add all successors mentioned in the task
-        successors.update(task.successors)
-        # Add all tasks that mention this task as a predecessor
-        successors.update([succ for succ in all_tasks if task in succ.predecessors])
-        # Create a list of phases that succeed the phase of this task
-        succeeding_phases = order[order.index(task.phase) + 1:]
-        # Add all tasks that occur in above mentioned succeeding phases
-        successors.update([succ for succ in all_tasks if succ.phase in succeeding_phases])
-        # Map the successors to the task
-        graph[task] = successors
+        graph[task] = set(task.successors)
+        phase_tasks[phase_index[task.phase]].append(task)
+    for task in all_tasks:
+        # Add the task as a successor to all tasks that it mentions as a predecessor
+        for predecessor in task.predecessors:
+            if predecessor in graph:
+                graph[predecessor].add(task)
+    # Every boundary between two phases gets a barrier node, the phase itself.
+    # All tasks in a phase precede the barrier and the barrier precedes all tasks in the next phase
+    # as well as the next barrier (in case the next phase has no tasks).
+    barriers = order[:-1]
+    for phase, tasks, next_tasks in zip(barriers, phase_tasks, phase_tasks[1:]):
+        for task in tasks:
+            graph[task].add(phase)
+        graph[phase] = set(next_tasks)
+    for phase, next_phase in zip(barriers, barriers[1:]):
+        graph[phase].add(next_phase)
 
     # Use the strongly connected components algorithm to check for cycles in our task graph
     components = strongly_connected_components(graph)
@@ -119,9 +271,51 @@ def create_list(taskset, all_tasks):
     return sorted_tasks
 
 
-def get_all_tasks(loaded_modules):
+def get_dependencies(task_list, all_tasks):
+    """Finds the tasks in a tasklist that each task must wait for before it can run.
+    Only dependencies inside the phase of a task are considered, since phases are run one after another.
+    Orderings that go through tasks which are not in the tasklist are resolved as well,
+    i.e. if A runs before B and B runs before C, C depends on A even when B is not in the tasklist.
+
+    :param list task_list: The tasks that are going to be run
+    :param set all_tasks: All known tasks
+    :return: A mapping of each task in the tasklist to the set of tasks in the tasklist it depends on
+    :rtype: dict
+    """
+    # Map each task to the tasks that must run before it, no matter which side declared the ordering
+    preceding = {task: set(task.predecessors) for task in all_tasks}
+    for task in all_tasks:
+        for successor in task.successors:
+            preceding.setdefault(successor, set()).add(task)
+
+    taskset = set(task_list)
+    dependencies = {}
+    for task in task_list:
+        found = set()
+        visited = set()
+        stack = list(preceding.get(task, []))
+        while stack:
+            predecessor = stack.pop()
+            if predecessor in visited or predecessor.phase is not task.phase:
+                continue
+            visited.add(predecessor)
+            if predecessor in taskset:
+                # There is no need to look any further,
+                # the predecessor itself waits for the tasks that precede it.
+                found.add(predecessor)
+            else:
+                stack.extend(preceding.get(predecessor, []))
+        dependencies[task] = found
+    return dependencies
+
+
+def get_all_tasks(loaded_modules, index_path=None):
     """Gets a list of all task classes in the package
+    To avoid importing every provider and plugin, the tasks are looked up in a persistent index.
+    Tasks in modules that have not been imported are represented by TaskReferences.
 
+    :param list loaded_modules: The provider and plugin modules that have been loaded by the manifest
+    :param str index_path: Path to the task index, defaults to a file in the user cache directory
     :return: A list of all tasks in the package
     :rtype: list
     """
@@ -129,6 +323,7 @@ def get_all_tasks(loaded_modules):
     import os.path
     import bootstrapvz
     from bootstrapvz.common.tools import rel_path
+    from .taskindex import TaskIndex, get_index_path
     module_paths = set([(rel_path(bootstrapvz.__file__, 'common/tasks'), 'bootstrapvz.common.tasks.')])
 
     for module in loaded_modules:
@@ -149,47 +344,10 @@ def get_all_tasks(loaded_modules):
         module_prefix = 'bootstrapvz.plugins.{}.'.format(module_name)
         module_paths.add((module_path, module_prefix))
 
-    # Get generators that return all classes in a module
-    generators = []
-    for (module_path, module_prefix) in module_paths:
-        generators.append(get_all_classes(module_path, module_prefix))
-    import itertools
-    classes = itertools.chain(*generators)
-
-    # lambda function to check whether a class is a task (excluding the superclass Task)
-    def is_task(obj):
-        from .task import Task
-        return issubclass(obj, Task) and obj is not Task
-    return list(filter(is_task, classes))  # Only return classes that are tasks
-
-
-def get_all_classes(path=None, prefix='', excludes=[]):
-    """ Given a path to a package, this function retrieves all the classes in it
-
-    :param str path: Path to the package
-    :param str prefix: Name of the package followed by a dot
-    :param list excludes: List of str matching module names that should be ignored
-    :return: A generator that yields classes
-    :rtype: generator
-    :raises Exception: If a module cannot be inspected.
-    """
-    import pkgutil
-    import importlib
-    import inspect
-
-    def walk_error(module_name):
-        if not any([module_name.startswith(excl) for excl in excludes]):
-            raise TaskListError('Unable to inspect module ' + module_name)
-    walker = pkgutil.walk_packages([path], prefix, walk_error)
-    for _, module_name, _ in walker:
-        if any([module_name.startswith(excl) for excl in excludes]):
-            continue
-        module = importlib.import_module(module_name)
-        classes = inspect.getmembers(module, inspect.isclass)
-        for class_name, obj in classes:
-            # We only want classes that are defined in the module, and not imported ones
-            if obj.__module__ == module_name:
-                yield obj
+    index = TaskIndex(index_path or get_index_path())
+    tasks = index.get_tasks(module_paths)
+    index.save()
+    return tasks
 
 
 def check_ordering(task):
@@ -232,6 +390,7 @@ def check_ordering(task):
 
 def strongly_connected_components(graph):
     """Find the strongly connected components in a graph using Tarjan's algorithm.
+    The algorithm is implemented iteratively, so that long chains of tasks cannot exceed the recursion limit.
 
     Source: http://www.logarithmic.net/pfh-files/blog/01208083168/sort.py
 
@@ -244,28 +403,37 @@ def strongly_connected_components(graph):
     stack = []
     low = {}
 
-    def visit(node):
-        if node in low:
-            return
-
+    def push(node):
         num = len(low)
         low[node] = num
-        stack_pos = len(stack)
         stack.append(node)
+        # The work stack replaces the call stack of the recursive version,
+        # each frame holds the node, its number, its position on the stack and the successors left to visit
+        return (node, num, len(stack) - 1, iter(graph[node]))
 
-        for successor in graph[node]:
-            visit(successor)
-            low[node] = min(low[node], low[successor])
-
-        if num == low[node]:
-            component = tuple(stack[stack_pos:])
-            del stack[stack_pos:]
-            result.append(component)
-            for item in component:
-                low[item] = len(graph)
-
-    for node in graph:
-        visit(node)
+    for root in graph:
+        if root in low:
+            continue
+        work = [push(root)]
+        while work:
+            node, num, stack_pos, successors = work[-1]
+            for successor in successors:
+                if successor not in low:
+                    # Visit the successor before continuing with the remaining successors of this node
+                    work.append(push(successor))
+                    break
+                low[node] = min(low[node], low[successor])
+            else:
+                work.pop()
+                if num == low[node]:
+                    component = tuple(stack[stack_pos:])
+                    del stack[stack_pos:]
+                    result.append(component)
+                    for item in component:
+                        low[item] = len(graph)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
 
     return result
 
@@ -0,0 +1,128 @@
+"""The trace module records when phases, tasks and commands run and how long they take.
+The recorded events can be exported as a Chrome trace (load it in chrome://tracing)
+and as JSON lines for comparing builds over time.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+# The events recorded so far, None when tracing is disabled
+events = None
+# Guards the list of events, tasks may run concurrently
+lock = threading.Lock()
+# The time the trace was started, timestamps are relative to it
+start_time = None
+
+
+def enable():
+    """Starts recording events, previously recorded events are discarded
+    """
+    global events, start_time
+    events = []
+    start_time = time.time()
+
+
+def disable():
+    """Stops recording events
+    """
+    global events
+    events = None
+
+
+def get_trace_path(trace_dir, manifest_path):
+    """Returns the path to write the trace of a build to, it is named like the logfile of the build
+
+    :param str trace_dir: The directory to write the trace to
+    :param str manifest_path: The path to the manifest
+    :return: The path to the trace, without an extension
+    :rtype: str
+    """
+    import os.path
+    from .log import get_log_filename
+    name, _ = os.path.splitext(get_log_filename(manifest_path))
+    return os.path.join(trace_dir, name + '.trace')
+
+
+@contextmanager
+def recording(path):
+    """Records events while in the body of the with statement and exports them afterwards
+
+    :param str path: The path to export the trace to (see export()), nothing is recorded if None
+    """
+    if path is None:
+        yield
+        return
+    enable()
+    try:
+        yield
+    finally:
+        export(path)
+        disable()
+
+
+@contextmanager
+def span(category, name, **args):
+    """Records the time spent in the body of the with statement.
+    The context manager yields the arguments of the event, so that the body can add results to them.
+
+    :param str category: The category of the event (e.g. phase, task or command)
+    :param str name: The name of the event
+    :param dict args: Additional information about the event
+    """
+    if events is None:
+        yield args
+        return
+    start = time.time()
+    try:
+        yield args
+    finally:
+        end = time.time()
+        event = {'category': category,
+                 'name': name,
+                 'start': start - start_time,
+                 'end': end - start_time,
+                 'duration': end - start,
+                 'thread': threading.current_thread().name,
+                 'args': args,
+                 }
+        with lock:
+            events.append(event)
+
+
+def export(path):
+    """Writes the recorded events to ``path``.json as a Chrome trace
+    and to ``path``.jsonl with one event per line
+
+    :param str path: The path to write the trace to, without an extension
+    """
+    import json
+    import os
+    with lock:
+        recorded = sorted(events, key=lambda event: event['start'])
+    # Chrome expects numeric thread ids, number the threads in the order they appear
+    threads = {}
+    for event in recorded:
+        threads.setdefault(event['thread'], len(threads))
+    trace_events = [{'name': event['name'],
+                     'cat': event['category'],
+                     'ph': 'X',
+                     'ts': int(event['start'] * 1000000),
+                     'dur': int(event['duration'] * 1000000),
+                     'pid': os.getpid(),
+                     'tid': threads[event['thread']],
+                     'args': event['args'],
+                     } for event in recorded]
+    trace_events.extend({'name': 'thread_name',
+                         'ph': 'M',
+                         'pid': os.getpid(),
+                         'tid': tid,
+                         'args': {'name': name},
+                         } for name, tid in threads.items())
+    trace_dir = os.path.dirname(path)
+    if trace_dir and not os.path.isdir(trace_dir):
+        os.makedirs(trace_dir)
+    with open(path + '.json', 'w') as stream:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, stream)
+    with open(path + '.jsonl', 'w') as stream:
+        for event in recorded:
+            stream.write(json.dumps(event) + '\n')
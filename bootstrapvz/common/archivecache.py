@@ -0,0 +1,134 @@
+"""The archivecache module keeps the packages that builds download in a cache on the host.
+Every build gets its own package archive that is filled from the cache, so that concurrent builds never
+contend for the lock apt holds on its archive. The packages a build downloaded are added to the cache when
+the build is done with them, the cache is then pruned by age and size.
+"""
+import logging
+import os
+log = logging.getLogger(__name__)
+
+
+def from_manifest(manifest):
+    """Creates the package archive cache configured in the bootstrapper section of the manifest
+
+    :param Manifest manifest: The manifest
+    :return: The package archive cache or None if it is not enabled
+    :rtype: ArchiveCache
+    """
+    if 'archive_cache' not in manifest.bootstrapper:
+        return None
+    from bootstrapvz.common.bytes import Bytes
+    settings = manifest.bootstrapper['archive_cache']
+    arch = manifest.system.get('userspace_architecture', manifest.system['architecture'])
+    path = settings.get('path', os.path.join(manifest.bootstrapper['workspace'], 'archives'))
+    max_size = settings.get('max_size', None)
+    return ArchiveCache(os.path.join(path, arch),
+                        None if max_size is None else Bytes(max_size),
+                        settings.get('max_age', None))
+
+
+class ArchiveCache(object):
+    """The ArchiveCache stores the .deb files of one architecture
+    """
+
+    def __init__(self, path, max_size=None, max_age=None):
+        """
+        :param str path: The directory the packages are stored in
+        :param Bytes max_size: The maximum size of the cache, no packages are evicted for their size if None
+        :param int max_age: The number of days after which unused packages are removed, never if None
+        """
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def lock(self, shared=False):
+        """Returns a context manager that locks the cache.
+        Adding and removing packages requires an exclusive lock, a shared lock is enough for copying them.
+
+        :param bool shared: Whether to hold a shared lock
+        """
+        from .tools import file_lock
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        return file_lock(self.path + '.lock', shared=shared)
+
+    def get_packages(self, path):
+        """Returns the names of the package files in a directory
+
+        :param str path: Path to the directory
+        :rtype: list
+        """
+        return sorted(name for name in os.listdir(path)
+                      if name.endswith('.deb') and os.path.isfile(os.path.join(path, name)))
+
+    def seed(self, archive):
+        """Puts all cached packages into a package archive
+
+        :param str archive: Path to the package archive
+        """
+        with self.lock(shared=True):
+            packages = self.get_packages(self.path)
+            for name in packages:
+                cached = os.path.join(self.path, name)
+                link_or_copy(cached, os.path.join(archive, name))
+                # Mark the package as recently used
+                os.utime(cached, None)
+        log.debug('Copied {count} packages from the package cache'.format(count=len(packages)))
+
+    def collect(self, archive):
+        """Adds the packages in a package archive to the cache and prunes the cache
+
+        :param str archive: Path to the package archive
+        """
+        with self.lock():
+            cached = set(self.get_packages(self.path))
+            added = [name for name in self.get_packages(archive) if name not in cached]
+            for name in added:
+                # Packages are added under a temporary name, so that the cache never contains partial packages
+                tmp_path = os.path.join(self.path, '.' + name)
+                try:
+                    link_or_copy(os.path.join(archive, name), tmp_path)
+                    os.rename(tmp_path, os.path.join(self.path, name))
+                except BaseException:
+                    if os.path.isfile(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+            log.debug('Added {count} packages to the package cache'.format(count=len(added)))
+            self.prune()
+
+    def prune(self):
+        """Removes packages that have not been used for longer than the maximum age and then
+        the least recently used packages until the cache fits within its size limit.
+        The exclusive lock of the cache must be held.
+        """
+        import time
+        entries = []
+        for name in self.get_packages(self.path):
+            stat = os.stat(os.path.join(self.path, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, name in entries:
+            expired = self.max_age is not None and mtime < time.time() - self.max_age * 24 * 60 * 60
+            oversized = self.max_size is not None and total > self.max_size.get_qty_in('B')
+            if not expired and not oversized:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+            removed += 1
+        if removed:
+            log.debug('Removed {count} packages from the package cache'.format(count=removed))
+
+
+def link_or_copy(source, destination):
+    """Hard links a file, or copies it if the destination is on a different filesystem
+
+    :param str source: Path to the file
+    :param str destination: Path to the link or copy
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        import shutil
+        shutil.copy2(source, destination)
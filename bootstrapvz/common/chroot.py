@@ -0,0 +1,280 @@
+"""The chroot module runs commands and file operations inside the bootstrapped system.
+A batch of operations is run by a single process that changes its root to the volume,
+instead of spawning chroot(1) for every operation.
+"""
+from abc import ABCMeta
+from abc import abstractmethod
+import os
+import logging
+log = logging.getLogger(__name__)
+
+
+class Operation(object, metaclass=ABCMeta):
+    """Something that is run inside the bootstrapped system
+    """
+
+    @abstractmethod
+    def run(self):
+        """Runs the operation, this happens after the root has been changed
+
+        :return: The exit status and the output written to stdout and stderr
+        :rtype: tuple
+        """
+        pass
+
+
+class Command(Operation):
+    """Runs a command
+    """
+
+    def __init__(self, command, stdin=None):
+        """
+        :param list command: The command to run
+        :param str stdin: Input for the command
+        """
+        self.command = command
+        self.stdin = stdin
+
+    def run(self):
+        import subprocess
+        process = subprocess.Popen(args=self.command,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        stdin = None
+        if self.stdin is not None:
+            stdin = (self.stdin + '\n').encode('utf-8')
+        stdout, stderr = process.communicate(stdin)
+        return process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+
+    def __str__(self):
+        return ' '.join(self.command)
+
+
+class SystemCall(Operation):
+    """An operation that is carried out with system calls, it fails when a system call fails
+    """
+
+    def run(self):
+        try:
+            self.call()
+        except (OSError, KeyError) as e:
+            return 1, '', '{operation}: {error}'.format(operation=self, error=e)
+        return 0, '', ''
+
+    @abstractmethod
+    def call(self):
+        """Carries out the operation, errors are raised as OSError or KeyError
+        """
+        pass
+
+
+class Chmod(SystemCall):
+    """Changes the permissions of a path
+    """
+
+    def __init__(self, path, mode):
+        """
+        :param str path: The path in the bootstrapped system
+        :param mode: The permissions, either as a number or as a string appropriate for chmod(1)
+        """
+        self.path = path
+        self.mode = mode
+
+    def run(self):
+        if isinstance(self.mode, str) and not self.mode.isdigit():
+            # Symbolic modes (e.g. u+x) are left to chmod
+            return Command(['chmod', self.mode, self.path]).run()
+        return super(Chmod, self).run()
+
+    def call(self):
+        mode = self.mode if isinstance(self.mode, int) else int(self.mode, 8)
+        os.chmod(self.path, mode)
+
+    def __str__(self):
+        mode = self.mode if not isinstance(self.mode, int) else '{mode:o}'.format(mode=self.mode)
+        return 'chmod {mode} {path}'.format(mode=mode, path=self.path)
+
+
+class Chown(SystemCall):
+    """Changes the owner and/or the group of a path.
+    Names are looked up in the user and group databases of the bootstrapped system.
+    """
+
+    def __init__(self, path, owner=None, group=None, recursive=False):
+        """
+        :param str path: The path in the bootstrapped system
+        :param str owner: The user name or id, may be followed by a colon and the group (like chown(1))
+        :param str group: The group name or id
+        :param bool recursive: Whether to change the ownership of everything below the path as well
+        """
+        if owner is not None and ':' in str(owner):
+            owner, group = str(owner).split(':', 1)
+        self.path = path
+        self.owner = owner
+        self.group = group
+        self.recursive = recursive
+
+    def call(self):
+        uid, gid = -1, -1
+        if self.owner not in [None, '']:
+            uid = get_id('/etc/passwd', self.owner)
+        if self.group not in [None, '']:
+            gid = get_id('/etc/group', self.group)
+        os.chown(self.path, uid, gid)
+        if self.recursive and os.path.isdir(self.path) and not os.path.islink(self.path):
+            for prefix, dirs, files in os.walk(self.path):
+                for name in dirs + files:
+                    os.lchown(os.path.join(prefix, name), uid, gid)
+
+    def __str__(self):
+        spec = '' if self.owner is None else str(self.owner)
+        if self.group is not None:
+            spec += ':{group}'.format(group=self.group)
+        options = ' -R' if self.recursive else ''
+        return 'chown{options} {spec} {path}'.format(options=options, spec=spec, path=self.path)
+
+
+class Mkdir(SystemCall):
+    """Creates a directory and its parents, it is not an error if the directory already exists
+    """
+
+    def __init__(self, path, mode=0o755):
+        """
+        :param str path: The path in the bootstrapped system
+        :param int mode: The permissions of the created directories (modified by the umask)
+        """
+        self.path = path
+        self.mode = mode
+
+    def call(self):
+        os.makedirs(self.path, self.mode, exist_ok=True)
+
+    def __str__(self):
+        return 'mkdir -p {path}'.format(path=self.path)
+
+
+def get_id(database, name):
+    """Looks up a user or group id in a database file like /etc/passwd or /etc/group
+
+    :param str database: The path to the database
+    :param str name: The name of the user or group, ids are returned as they are
+    :return: The id
+    :rtype: int
+    :raises KeyError: When there is no entry with that name
+    """
+    if str(name).isdigit():
+        return int(name)
+    with open(database) as entries:
+        for entry in entries:
+            fields = entry.rstrip('\n').split(':')
+            if len(fields) > 2 and fields[0] == name:
+                return int(fields[2])
+    raise KeyError('{name} not found in {database}'.format(name=name, database=database))
+
+
+class Chroot(object):
+    """Runs operations inside the bootstrapped system.
+    Every batch of operations is run by one forked process that changes its root to the volume.
+    The process exits when the batch is done, so that it never keeps the volume busy.
+    """
+
+    def __init__(self, root):
+        """
+        :param str root: The path to the root of the bootstrapped system
+        """
+        self.root = root
+
+    def run(self, command, stdin=None):
+        """Runs a single command, raises an error if it fails
+
+        :param list command: The command to run
+        :param str stdin: Input for the command
+        :return: The lines written to stdout
+        :rtype: list
+        """
+        [(_, stdout, _)] = self.run_many([Command(command, stdin)])
+        return stdout
+
+    def run_many(self, operations, check=True):
+        """Runs several operations, their output is logged like the output of tools.log_call()
+
+        :param list operations: The operations to run, lists are run as commands
+        :param bool check: Whether to stop at and raise an error for the first operation that fails
+        :return: The exit status, the lines written to stdout and the lines written to stderr
+                 of every operation that ran
+        :rtype: list
+        :raises CalledProcessError: When an operation fails and ``check`` is set
+        """
+        operations = [operation if isinstance(operation, Operation) else Command(operation)
+                      for operation in operations]
+        if not operations:
+            return []
+        from bootstrapvz.base import trace
+        with trace.span('command', 'chroot', root=self.root, operations=len(operations)) as args:
+            results = self._run_batch(operations, check)
+            args['status'] = results[-1][0]
+
+        output = []
+        for operation, (status, stdout, stderr) in zip(operations, results):
+            log.debug('Executing in {root}: {operation}'.format(root=self.root, operation=operation))
+            if isinstance(operation, Command) and operation.stdin is not None:
+                log.debug('  stdin: ' + operation.stdin)
+            stdout = [line.strip() for line in stdout.splitlines()]
+            stderr = [line.strip() for line in stderr.splitlines()]
+            for line in stdout:
+                log.debug(line)
+            for line in stderr:
+                log.error(line)
+            output.append((status, stdout, stderr))
+
+        status, _, stderr = output[-1]
+        if check and status != 0:
+            from subprocess import CalledProcessError
+            command = 'chroot {root} {operation}'.format(root=self.root, operation=operations[len(output) - 1])
+            e = CalledProcessError(status, command, '\n'.join(stderr))
+            # See tools.log_check_call() for why the args property is set
+            setattr(e, 'args', (status, command, '\n'.join(stderr)))
+            raise e
+        return output
+
+    def _run_batch(self, operations, check):
+        import pickle
+        # Load everything the child needs before forking, imports may need locks held by other threads
+        import subprocess  # noqa
+        import traceback
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Nothing in here may log or raise, the child must always reach os._exit()
+            exit_code = 0
+            try:
+                os.close(read_fd)
+                os.chroot(self.root)
+                os.chdir('/')
+                results = []
+                for operation in operations:
+                    results.append(operation.run())
+                    if check and results[-1][0] != 0:
+                        break
+                payload = pickle.dumps(results)
+            except BaseException:
+                payload = pickle.dumps(traceback.format_exc())
+                exit_code = 1
+            try:
+                with os.fdopen(write_fd, 'wb') as stream:
+                    stream.write(payload)
+            finally:
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as stream:
+            payload = stream.read()
+        _, status = os.waitpid(pid, 0)
+        if status != 0 or not payload:
+            from bootstrapvz.common.exceptions import TaskError
+            msg = 'Unable to run operations in {root}'.format(root=self.root)
+            if payload:
+                msg += ':\n' + pickle.loads(payload)
+            raise TaskError(msg)
+        return pickle.loads(payload)
@@ -30,6 +30,23 @@ class TaskError(Exception):
     pass
 
 
+def raise_errors(errors):
+    """Raises the only error in a list or a TaskError that lists all of the errors
+
+    :param list errors: The errors
+    """
+    if len(errors) == 1:
+        raise errors[0]
+    msg = '{num} errors occurred:'.format(num=len(errors))
+    for error in errors:
+        msg += '\n' + '\n'.join('  ' + line for line in str(error).split('\n'))
+    raise TaskError(msg)
+
+
+class CheckpointError(Exception):
+    pass
+
+
 class UnexpectedNumMatchesError(Exception):
     pass
 
@@ -0,0 +1,197 @@
+"""The filecopy module copies and moves volume images and folders without reading and writing
+more data than necessary. Files are reflinked where the filesystem supports it (e.g. btrfs or xfs),
+otherwise only the regions of the file that contain data are copied, so sparse images stay sparse.
+"""
+import errno
+import logging
+import os
+log = logging.getLogger(__name__)
+
+# The ioctl that makes a file share the data blocks of another file, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+# The amount of data that is copied at once when the kernel cannot copy it by itself
+buffer_size = 8 * 1024 * 1024
+# The errors that mean an operation is not supported by the filesystems or the kernel
+unsupported = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EBADF)
+
+
+def copy_file(source, destination):
+    """Copies a file and its permissions, trying a reflink first,
+    then copy_file_range() and finally a plain copy of the regions that contain data.
+
+    :param str source: Path to the file
+    :param str destination: Path to the copy, it is replaced if it exists
+    :return: The number of bytes that were actually copied, 0 if the copy was reflinked
+    :rtype: int
+    """
+    import shutil
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        if reflink(src.fileno(), dst.fileno()):
+            transferred = 0
+            log.debug('Reflinked {src} to {dst}'.format(src=source, dst=destination))
+        else:
+            transferred = copy_data(src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size)
+            log.debug('Copied {size} bytes from {src} to {dst}'.format(size=transferred, src=source, dst=destination))
+    shutil.copymode(source, destination)
+    return transferred
+
+
+def move_file(source, destination):
+    """Moves a file, it is copied with copy_file() and removed when it is moved to another filesystem
+
+    :param str source: Path to the file
+    :param str destination: Path the file is moved to
+    :return: The number of bytes that were actually copied
+    :rtype: int
+    """
+    import shutil
+    try:
+        os.rename(source, destination)
+        return 0
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    try:
+        transferred = copy_file(source, destination)
+        shutil.copystat(source, destination)
+    except BaseException:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+    os.remove(source)
+    return transferred
+
+
+def splice(source, destination, offset):
+    """Writes the contents of a file into another file at an offset, e.g. a filesystem into a disk image.
+    Only the regions of the file that contain data are written.
+
+    :param str source: Path to the file
+    :param str destination: Path to the file that is written to, it must be zeroed where the file is written
+    :param int offset: The position in the destination to write the file to
+    :return: The number of bytes that were written
+    :rtype: int
+    """
+    transferred = 0
+    with open(source, 'rb') as src, open(destination, 'r+b') as dst:
+        for start, length in get_data_regions(src.fileno(), os.fstat(src.fileno()).st_size):
+            end = start + length
+            while start < end:
+                data = os.pread(src.fileno(), min(buffer_size, end - start), start)
+                if not data:
+                    break
+                write_data(dst.fileno(), data, offset + start)
+                start += len(data)
+                transferred += len(data)
+    log.debug('Wrote {size} bytes from {src} into {dst}'.format(size=transferred, src=source, dst=destination))
+    return transferred
+
+
+def copy_dir(source, destination):
+    """Copies the contents of a directory, preserving ownership, permissions and hard links.
+    The data blocks are shared with the source where the filesystem supports reflinks
+    and holes in sparse files are preserved.
+
+    :param str source: Path to the directory
+    :param str destination: Path to the directory the contents are copied into, it is created if it does not exist
+    """
+    from .tools import log_check_call
+    log_check_call(['cp', '-a', '--reflink=auto', '--sparse=always', '--no-target-directory', source, destination])
+
+
+def reflink(src_fd, dst_fd):
+    """Makes a file share the data blocks of another file
+
+    :param int src_fd: The file descriptor of the file
+    :param int dst_fd: The file descriptor of the copy
+    :return: Whether the filesystem supports reflinks
+    :rtype: bool
+    """
+    import fcntl
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno not in unsupported:
+            raise
+        return False
+
+
+def get_data_regions(fd, size):
+    """Returns the regions of a file that contain data
+
+    :param int fd: The file descriptor of the file
+    :param int size: The size of the file
+    :return: A list of (offset, length) tuples
+    :rtype: list
+    """
+    regions = []
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # There is no more data after the offset, the rest of the file is a hole
+                break
+            if e.errno in unsupported:
+                # The filesystem cannot tell the holes apart, all of the file is treated as data
+                return [(0, size)]
+            raise
+        end = os.lseek(fd, start, os.SEEK_HOLE)
+        regions.append((start, end - start))
+        offset = end
+    return regions
+
+
+def copy_data(src_fd, dst_fd, size):
+    """Copies the regions of a file that contain data, the holes are left unallocated
+
+    :param int src_fd: The file descriptor of the file
+    :param int dst_fd: The file descriptor of the copy
+    :param int size: The size of the file
+    :return: The number of bytes that were copied
+    :rtype: int
+    """
+    use_copy_file_range = hasattr(os, 'copy_file_range')
+    transferred = 0
+    for offset, length in get_data_regions(src_fd, size):
+        end = offset + length
+        while offset < end:
+            count = min(buffer_size, end - offset)
+            if use_copy_file_range:
+                try:
+                    copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+                except OSError as e:
+                    if e.errno not in unsupported:
+                        raise
+                    use_copy_file_range = False
+                    continue
+            else:
+                copied = write_data(dst_fd, os.pread(src_fd, count, offset), offset)
+            if copied == 0:
+                # The file was truncated while it was copied
+                break
+            offset += copied
+            transferred += copied
+    os.ftruncate(dst_fd, size)
+    return transferred
+
+
+def write_data(fd, data, offset):
+    """Writes data to a file, blocks that only contain zeros are skipped so that they remain holes
+
+    :param int fd: The file descriptor of the file
+    :param bytes data: The data to write
+    :param int offset: The position in the file to write the data to
+    :return: The length of the data
+    :rtype: int
+    """
+    block_size = 64 * 1024
+    zeros = bytes(block_size)
+    view = memoryview(data)
+    for position in range(0, len(data), block_size):
+        block = view[position:position + block_size]
+        if block != zeros[:len(block)]:
+            os.pwrite(fd, block, offset + position)
+    return len(data)
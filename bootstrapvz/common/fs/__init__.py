@@ -1,4 +1,5 @@
 from contextlib import contextmanager
+import os
 
 
 def get_partitions():
@@ -17,6 +18,17 @@ def get_partitions():
     return matches
 
 
+def device_allocation():
+    """Returns a context manager that serializes the allocation of block devices
+    (loop and nbd devices, device mapper nodes) between concurrent builds on the same host.
+    A device is only considered allocated once it has been set up, so searching for a free device
+    and setting it up must happen while holding the lock.
+    """
+    import tempfile
+    from ..tools import file_lock
+    return file_lock(os.path.join(tempfile.gettempdir(), 'bootstrap-vz-devices.lock'))
+
+
 @contextmanager
 def unmounted(volume):
     from bootstrapvz.base.fs.partitionmaps.none import NoPartitions
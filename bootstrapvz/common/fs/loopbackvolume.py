@@ -15,7 +15,9 @@ class LoopbackVolume(Volume):
         log_check_call(['truncate', size_opt, self.image_path])
 
     def _before_attach(self, e):
-        [self.loop_device_path] = log_check_call(['losetup', '--show', '--find', '--partscan', self.image_path])
+        from . import device_allocation
+        with device_allocation():
+            [self.loop_device_path] = log_check_call(['losetup', '--show', '--find', '--partscan', self.image_path])
         self.device_path = self.loop_device_path
 
     def _before_detach(self, e):
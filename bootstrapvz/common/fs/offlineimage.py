@@ -0,0 +1,117 @@
+from bootstrapvz.base.fs.volume import Volume
+from ..tools import log_check_call
+import os
+
+
+class OfflineImage(Volume):
+    """A disk image that is assembled from a directory tree once the system has been bootstrapped.
+    The filesystems of the partitions are created from the directories that are their mountpoints,
+    so neither loop devices, device mapper nodes nor mounts are needed.
+    """
+
+    # The system is bootstrapped into a directory and the image is created when it is assembled
+    events = [{'name': 'create', 'src': 'nonexistent', 'dst': 'attached'},
+              {'name': 'assemble', 'src': 'attached', 'dst': 'detached'},
+              {'name': 'delete', 'src': 'attached', 'dst': 'deleted'},
+              {'name': 'delete', 'src': 'detached', 'dst': 'deleted'},
+              ]
+
+    extension = 'raw'
+
+    # The commands that create a filesystem from a directory, valid variables are uuid, root and path
+    format_commands = {'ext2': ['mkfs.ext2', '-F', '-q', '-U', '{uuid}', '-d', '{root}', '{path}'],
+                       'ext3': ['mkfs.ext3', '-F', '-q', '-U', '{uuid}', '-d', '{root}', '{path}'],
+                       'ext4': ['mkfs.ext4', '-F', '-q', '-U', '{uuid}', '-d', '{root}', '{path}'],
+                       'btrfs': ['mkfs.btrfs', '--quiet', '--uuid', '{uuid}', '--rootdir', '{root}', '{path}'],
+                       'swap': ['mkswap', '--uuid', '{uuid}', '{path}'],
+                       }
+
+    def create(self, image_path):
+        self.fsm.create(image_path=image_path)
+
+    def _before_create(self, e):
+        import uuid
+        self.image_path = e.image_path
+        # The UUIDs are known before the filesystems are created, so that they can be written to the fstab
+        for partition in self.partition_map.partitions:
+            if partition.filesystem is not None:
+                partition.uuid = str(uuid.uuid4())
+
+    def assemble(self, root):
+        self.fsm.assemble(root=root)
+
+    def _before_assemble(self, e):
+        """Creates the filesystems of the partitions from the directory tree and writes them into the image.
+        The contents of the mountpoints are moved out of the tree.
+        """
+        import shutil
+        import tempfile
+        from bootstrapvz.base.fs.partitionmaps.none import NoPartitions
+        from ..filecopy import splice
+        staging = tempfile.mkdtemp(dir=os.path.dirname(self.image_path), prefix='partitions.')
+        try:
+            trees = self.split_tree(e.root, staging)
+            if isinstance(self.partition_map, NoPartitions):
+                self.make_filesystem(self.partition_map.root, e.root, self.image_path)
+                return
+            log_check_call(['truncate', '--size=' + str(self.size.bytes.get_qty_in('B')), self.image_path])
+            # The partition table is written into the image file just like it would be onto a device
+            self.device_path = self.image_path
+            try:
+                self.partition_map.create(self)
+            finally:
+                self.device_path = None
+            for idx, partition in enumerate(self.partition_map.partitions):
+                if partition.filesystem is None:
+                    continue
+                path = os.path.join(staging, 'partition{idx}'.format(idx=idx))
+                self.make_filesystem(partition, trees.get(partition, e.root), path)
+                offset = (partition.get_start() + partition.pad_start).bytes.get_qty_in('B')
+                splice(path, self.image_path, offset)
+                os.remove(path)
+        finally:
+            shutil.rmtree(staging)
+
+    def split_tree(self, root, staging):
+        """Moves the contents of the mountpoints of the partitions out of the directory tree
+
+        :param str root: Path to the directory tree
+        :param str staging: Path to the directory the contents are moved to
+        :return: The directories with the contents of the partitions, keyed by partition
+        :rtype: dict
+        """
+        import shutil
+        trees = {}
+        partitions = [partition for partition in self.partition_map.partitions
+                      if partition is not self.partition_map.root and partition.filesystem not in (None, 'swap')]
+        # Nested mountpoints are moved out first, so that they do not end up in the partition they are nested in
+        for idx, partition in sorted(enumerate(partitions), key=lambda item: len(item[1].name), reverse=True):
+            mountpoint = os.path.join(root, partition.name)
+            tree = os.path.join(staging, 'tree{idx}'.format(idx=idx))
+            os.rename(mountpoint, tree)
+            os.mkdir(mountpoint)
+            shutil.copystat(tree, mountpoint)
+            trees[partition] = tree
+        return trees
+
+    def make_filesystem(self, partition, root, path):
+        """Creates the filesystem of a partition from a directory
+
+        :param AbstractPartition partition: The partition
+        :param str root: Path to the directory with the contents of the partition
+        :param str path: Path to the file the filesystem is created in
+        """
+        log_check_call(['truncate', '--size=' + str(partition.size.bytes.get_qty_in('B')), path])
+        variables = {'uuid': partition.uuid,
+                     'root': root,
+                     'path': path,
+                     }
+        log_check_call([part.format(**variables) for part in self.format_commands[partition.filesystem]])
+        if partition.filesystem in ('ext2', 'ext3', 'ext4'):
+            # Disable the time based filesystem check
+            log_check_call(['tune2fs', '-i', '0', path])
+
+    def _before_delete(self, e):
+        if os.path.exists(self.image_path):
+            os.remove(self.image_path)
+        del self.image_path
@@ -45,8 +45,10 @@ class QEMUVolume(LoopbackVolume):
 
     def _before_attach(self, e):
         self._check_nbd_module()
-        self.loop_device_path = self._find_free_nbd_device()
-        log_check_call(['qemu-nbd', '-f', self.qemu_format, '--connect', self.loop_device_path, self.image_path])
+        from . import device_allocation
+        with device_allocation():
+            self.loop_device_path = self._find_free_nbd_device()
+            log_check_call(['qemu-nbd', '-f', self.qemu_format, '--connect', self.loop_device_path, self.image_path])
         self.device_path = self.loop_device_path
 
     def _before_detach(self, e):
@@ -70,19 +72,21 @@ class QEMUVolume(LoopbackVolume):
         with open(param_path) as param_file:
             return param_file.read().strip()
 
-    # From http://lists.gnu.org/archive/html/qemu-devel/2011-11/msg02201.html
-    # Apparently it's not in the current qemu-nbd shipped with wheezy
-    def _is_nbd_used(self, device_name):
-        return device_name in get_partitions()
-
     def _find_free_nbd_device(self):
-        import os.path
-        for i in range(0, 15):
-            device_name = 'nbd' + str(i)
-            if not self._is_nbd_used(device_name):
-                return os.path.join('/dev', device_name)
-        raise VolumeError('Unable to find free nbd device.')
+        free_devices = get_free_nbd_devices()
+        if not free_devices:
+            raise VolumeError('Unable to find free nbd device.')
+        return free_devices[0]
+
+
+# From http://lists.gnu.org/archive/html/qemu-devel/2011-11/msg02201.html
+# Apparently it's not in the current qemu-nbd shipped with wheezy
+def get_free_nbd_devices():
+    """Returns the nbd devices that are not connected to an image
 
-    def __setstate__(self, state):
-        for key in state:
-            self.__dict__[key] = state[key]
+    :return: Paths to the free nbd devices
+    :rtype: list
+    """
+    import os.path
+    partitions = get_partitions()
+    return [os.path.join('/dev', 'nbd' + str(i)) for i in range(0, 15) if 'nbd' + str(i) not in partitions]
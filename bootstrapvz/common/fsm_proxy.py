@@ -49,12 +49,20 @@ class FSMProxy(object):
             if callable(value) or key == 'fsm':
                 continue
             state[key] = value
+        state['fsm_state'] = self.fsm.current
         state['__class__'] = self.__module__ + '.' + self.__class__.__name__
         return state
 
     def __setstate__(self, state):
+        fsm_state = None
         for key in state:
+            if key == 'fsm_state':
+                fsm_state = state[key]
+                continue
             self.__dict__[key] = state[key]
+        if fsm_state is not None:
+            # The volume, partition map and partition classes recreate their state machine configuration
+            FSMProxy.__init__(self, self._get_fsm_cfg(fsm_state))
 
 
 class FSMProxyError(Exception):
@@ -0,0 +1,178 @@
+"""The partitiontable module encodes GPT and MS-DOS partition tables and writes them
+into image files or onto block devices. The layout is computed by the partition maps,
+this module only deals with the on-disk format, so tables can be verified byte for byte.
+All positions and lengths are in sectors (LBA).
+"""
+import os
+import struct
+import zlib
+
+# The type GUIDs of the partitions in a GPT
+gpt_types = {'linux': '0FC63DAF-8483-4772-8E79-3D69D8477DE4',
+             'swap': '0657FD6D-A4AB-43C4-84E5-0933C84B4F4F',
+             'bios_grub': '21686148-6449-6E6F-744E-656564454649',
+             }
+# The attribute bits of the partitions in a GPT
+gpt_attributes = {'legacy_boot': 1 << 2,
+                  }
+# The partition types in an MS-DOS partition table
+msdos_types = {'linux': 0x83,
+               'swap': 0x82,
+               }
+# The status of a bootable partition in an MS-DOS partition table
+msdos_bootable = 0x80
+
+# The number of entries in a GPT and the size of each of them
+gpt_entry_count = 128
+gpt_entry_size = 128
+gpt_header_size = 92
+
+
+def get_chs(lba):
+    """Encodes a sector as a cylinder/head/sector address
+    The address is capped to the largest encodable one, which tells the reader to use the LBA instead.
+
+    :param int lba: The sector
+    :return: The three bytes of the address
+    :rtype: bytes
+    """
+    heads, sectors = 255, 63
+    cylinder = lba // (heads * sectors)
+    if cylinder > 1023:
+        return b'\xfe\xff\xff'
+    head = (lba // sectors) % heads
+    sector = lba % sectors + 1
+    return struct.pack('<BBB', head, ((cylinder >> 2) & 0xc0) | sector, cylinder & 0xff)
+
+
+def msdos_entry(status, type_id, start, length):
+    """Encodes a partition of an MS-DOS partition table
+
+    :param int status: The status of the partition, 0x80 for a bootable partition
+    :param int type_id: The type of the partition
+    :param int start: The first sector of the partition
+    :param int length: The number of sectors of the partition
+    :return: The 16 bytes of the entry
+    :rtype: bytes
+    """
+    return (struct.pack('<B', status) + get_chs(start) + struct.pack('<B', type_id) +
+            get_chs(start + length - 1) + struct.pack('<II', start, min(length, 0xffffffff)))
+
+
+def msdos(entries, signature, sector_size=512):
+    """Encodes the master boot record with an MS-DOS partition table
+
+    :param list entries: Up to four partitions encoded with msdos_entry()
+    :param int signature: The disk signature
+    :param int sector_size: The size of a sector in bytes
+    :return: The first sector of the disk
+    :rtype: bytes
+    """
+    if len(entries) > 4:
+        raise ValueError('An MS-DOS partition table holds at most four primary partitions')
+    entries = b''.join(entries).ljust(4 * 16, b'\0')
+    record = bytes(440) + struct.pack('<IH', signature, 0) + entries + b'\x55\xaa'
+    return record.ljust(sector_size, b'\0')
+
+
+def gpt_entry(type_guid, guid, first, last, attributes=0, name=''):
+    """Encodes a partition of a GPT
+
+    :param str type_guid: The type of the partition
+    :param str guid: The GUID of the partition
+    :param int first: The first sector of the partition
+    :param int last: The last sector of the partition, inclusive
+    :param int attributes: The attribute bits of the partition
+    :param str name: The name of the partition, at most 36 characters
+    :return: The 128 bytes of the entry
+    :rtype: bytes
+    """
+    import uuid
+    encoded_name = name.encode('utf-16-le')
+    if len(encoded_name) > 72:
+        raise ValueError('The partition name `{name}\' is longer than 36 characters'.format(name=name))
+    return (uuid.UUID(type_guid).bytes_le + uuid.UUID(guid).bytes_le +
+            struct.pack('<QQQ', first, last, attributes) + encoded_name.ljust(72, b'\0'))
+
+
+def gpt_header(current, backup, first_usable, last_usable, disk_guid, entries_lba, entries_crc):
+    """Encodes a GPT header
+
+    :param int current: The sector of the header
+    :param int backup: The sector of the other header
+    :param int first_usable: The first sector partitions can start at
+    :param int last_usable: The last sector partitions can end at
+    :param str disk_guid: The GUID of the disk
+    :param int entries_lba: The first sector of the partition entries
+    :param int entries_crc: The CRC32 of the partition entries
+    :return: The 92 bytes of the header
+    :rtype: bytes
+    """
+    import uuid
+
+    def pack(crc):
+        return struct.pack('<8sIIIIQQQQ16sQIII', b'EFI PART', 0x00010000, gpt_header_size, crc, 0,
+                           current, backup, first_usable, last_usable, uuid.UUID(disk_guid).bytes_le,
+                           entries_lba, gpt_entry_count, gpt_entry_size, entries_crc)
+    return pack(zlib.crc32(pack(0)) & 0xffffffff)
+
+
+def gpt(entries, disk_sectors, disk_guid, sector_size=512):
+    """Encodes a GPT together with its protective MBR and its backup
+
+    :param list entries: Up to 128 partitions encoded with gpt_entry()
+    :param int disk_sectors: The number of sectors of the disk
+    :param str disk_guid: The GUID of the disk
+    :param int sector_size: The size of a sector in bytes
+    :return: A list of (offset, data) tuples, the offsets are in bytes
+    :rtype: list
+    """
+    if len(entries) > gpt_entry_count:
+        raise ValueError('A GPT holds at most {count} partitions'.format(count=gpt_entry_count))
+    entries = b''.join(entries).ljust(gpt_entry_count * gpt_entry_size, b'\0')
+    entries_crc = zlib.crc32(entries) & 0xffffffff
+    entries_sectors = len(entries) // sector_size
+    first_usable = 2 + entries_sectors
+    last_usable = disk_sectors - 2 - entries_sectors
+    last_lba = disk_sectors - 1
+
+    # The protective MBR covers the whole disk with a single partition of the type 0xEE
+    protective = msdos_entry(0, 0xee, 1, disk_sectors - 1)
+    primary_header = gpt_header(1, last_lba, first_usable, last_usable, disk_guid, 2, entries_crc)
+    backup_header = gpt_header(last_lba, 1, first_usable, last_usable, disk_guid,
+                               last_lba - entries_sectors, entries_crc)
+    primary = (msdos([protective], 0, sector_size) +
+               primary_header.ljust(sector_size, b'\0') +
+               entries)
+    backup = entries + backup_header.ljust(sector_size, b'\0')
+    return [(0, primary),
+            ((last_lba - entries_sectors) * sector_size, backup)]
+
+
+def write(path, table):
+    """Writes a partition table into an image file or onto a block device
+
+    :param str path: Path to the image file or the block device
+    :param list table: A list of (offset, data) tuples, the offsets are in bytes
+    """
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        for offset, data in table:
+            os.pwrite(fd, data, offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def get_size(path):
+    """Returns the size of an image file or a block device
+
+    :param str path: Path to the image file or the block device
+    :return: The size in bytes
+    :rtype: int
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
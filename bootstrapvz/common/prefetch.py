@@ -0,0 +1,160 @@
+"""The prefetch module downloads the packages that apt is about to install ahead of time.
+apt resolves the packages and prints their URIs, the packages are then downloaded concurrently
+in the background and verified against the checksums apt printed. Packages that fail to download
+are left to apt, so prefetching never fails a build.
+"""
+import logging
+import os
+import re
+import threading
+log = logging.getLogger(__name__)
+
+# The prefetches that are running, keyed by the directory they download into
+prefetches = {}
+# Guards prefetches, builds may run concurrently
+lock = threading.Lock()
+
+# The names apt gives the hash algorithms, mapped to the names hashlib knows them by
+algorithms = {'SHA512': 'sha512',
+              'SHA256': 'sha256',
+              'SHA1': 'sha1',
+              'MD5Sum': 'md5',
+              }
+
+# A line printed by apt-get --print-uris, e.g.
+# 'http://deb.debian.org/debian/pool/main/a/acl/acl_2.2.52-3_amd64.deb' acl_2.2.52-3_amd64.deb 61112 SHA256:fd4c0d...
+uri_pattern = re.compile(r"^'(?P<url>[^']+)' (?P<name>\S+) (?P<size>\d+)( (?P<algorithm>\w+):(?P<checksum>[0-9a-f]+))?$")
+
+
+def get_uris(lines):
+    """Returns the packages in the output of apt-get --print-uris that can be downloaded over HTTP(S)
+
+    :param list lines: The lines apt-get printed
+    :return: A list of dicts with the url, name, size, algorithm and checksum of every package
+    :rtype: list
+    """
+    uris = []
+    for line in lines:
+        match = uri_pattern.match(line.strip())
+        if match is None or not match.group('name').endswith('.deb'):
+            continue
+        if not match.group('url').startswith(('http://', 'https://')):
+            continue
+        uris.append({'url': match.group('url'),
+                     'name': match.group('name'),
+                     'size': int(match.group('size')),
+                     'algorithm': algorithms.get(match.group('algorithm')),
+                     'checksum': match.group('checksum'),
+                     })
+    return uris
+
+
+def start(path, uris, connections, proxy=None):
+    """Starts downloading packages in the background
+
+    :param str path: The directory the packages are downloaded into
+    :param list uris: The packages to download (see get_uris())
+    :param int connections: The number of packages that are downloaded at the same time
+    :param str proxy: URL of the HTTP proxy to download through
+    :rtype: Prefetch
+    """
+    prefetch = Prefetch(path, uris, connections, proxy)
+    with lock:
+        prefetches[path] = prefetch
+    prefetch.start()
+    return prefetch
+
+
+def finish(path):
+    """Waits for the packages that are downloaded into a directory
+
+    :param str path: The directory the packages are downloaded into
+    :return: The names of the packages that were downloaded, an empty list if nothing was prefetched
+    :rtype: list
+    """
+    with lock:
+        prefetch = prefetches.pop(path, None)
+    if prefetch is None:
+        return []
+    return prefetch.wait()
+
+
+class Prefetch(object):
+    """Downloads packages with a bounded number of connections
+    """
+
+    def __init__(self, path, uris, connections, proxy=None):
+        """
+        :param str path: The directory the packages are downloaded into
+        :param list uris: The packages to download (see get_uris())
+        :param int connections: The number of packages that are downloaded at the same time
+        :param str proxy: URL of the HTTP proxy to download through
+        """
+        import urllib.request
+        self.path = path
+        self.uris = uris
+        self.connections = connections
+        handler = urllib.request.ProxyHandler({'http': proxy} if proxy else {})
+        self.opener = urllib.request.build_opener(handler)
+        self.downloaded = []
+        self.thread = None
+
+    def start(self):
+        """Starts the downloads in a background thread
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.thread = threading.Thread(target=self.run, name='prefetch', daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        """Waits for all downloads to finish
+
+        :return: The names of the packages that were downloaded and verified
+        :rtype: list
+        """
+        self.thread.join()
+        return self.downloaded
+
+    def run(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            for uri, downloaded in zip(self.uris, executor.map(self.download, self.uris)):
+                if downloaded:
+                    self.downloaded.append(uri['name'])
+
+    def download(self, uri):
+        """Downloads a package to a temporary file and moves it into place once it has been verified
+
+        :param dict uri: The package to download
+        :return: Whether the package was downloaded
+        :rtype: bool
+        """
+        import hashlib
+        import tempfile
+        destination = os.path.join(self.path, uri['name'])
+        if os.path.exists(destination):
+            return True
+        checksum = hashlib.new(uri['algorithm']) if uri['algorithm'] else None
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.prefetch.')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                response = self.opener.open(uri['url'], timeout=60)
+                for chunk in iter(lambda: response.read(64 * 1024), b''):
+                    stream.write(chunk)
+                    size += len(chunk)
+                    if checksum is not None:
+                        checksum.update(chunk)
+            if size != uri['size'] or checksum is not None and checksum.hexdigest() != uri['checksum']:
+                log.warn('The package {name} does not match its checksum, apt will download it again'
+                         .format(name=uri['name']))
+                os.remove(tmp_path)
+                return False
+            os.rename(tmp_path, destination)
+            return True
+        except Exception as e:  # pylint: disable=broad-except
+            log.debug('Unable to prefetch {url}: {error}'.format(url=uri['url'], error=e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
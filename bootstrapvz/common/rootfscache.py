@@ -0,0 +1,112 @@
+"""The rootfscache module stores the root filesystem right after debootstrap has installed it.
+Builds with the same debootstrap options copy that root filesystem into their volume instead of
+running debootstrap, the copy shares the data blocks with the cache where the filesystem supports reflinks.
+Staleness, locking and eviction work just like they do for tarballs (see bootstrapvz.common.tarballcache).
+"""
+import logging
+import os
+from .tarballcache import TarballCache
+log = logging.getLogger(__name__)
+
+
+def from_manifest(manifest):
+    """Creates the root filesystem cache configured in the bootstrapper section of the manifest
+
+    :param Manifest manifest: The manifest
+    :return: The root filesystem cache or None if it is not enabled
+    :rtype: RootfsCache
+    """
+    if 'rootfs_cache' not in manifest.bootstrapper:
+        return None
+    from bootstrapvz.common.bytes import Bytes
+    settings = manifest.bootstrapper['rootfs_cache']
+    max_size = settings.get('max_size', None)
+    return RootfsCache(settings.get('path', os.path.join(manifest.bootstrapper['workspace'], 'rootfs')),
+                       None if max_size is None else Bytes(max_size),
+                       settings.get('check_release', True))
+
+
+class RootfsCache(TarballCache):
+    """The RootfsCache stores bootstrapped root filesystems keyed by the debootstrap options.
+    """
+
+    prefix = 'rootfs-'
+    extension = ''
+
+    def verify(self, rootfs, metadata):
+        """Checks whether a root filesystem still has the files and the size it was published with.
+        Root filesystems are published with a rename, so they are never partial,
+        but files may have been removed or changed in the cache since.
+
+        :param str rootfs: Path to the root filesystem
+        :param dict metadata: The metadata of the root filesystem
+        :rtype: bool
+        """
+        if not os.path.isdir(rootfs):
+            return False
+        files, content_size, _ = get_tree_stats(rootfs)
+        return files == metadata.get('files') and content_size == metadata.get('content_size')
+
+    def get_metadata(self, tmp_path):
+        """Returns the metadata of a newly copied root filesystem
+
+        :param str tmp_path: Path to the root filesystem
+        :rtype: dict
+        """
+        files, content_size, size = get_tree_stats(tmp_path)
+        return {'files': files, 'content_size': content_size, 'size': size}
+
+    def store(self, key, root, release_url):
+        """Copies a root filesystem into the cache, the exclusive lock of the root filesystem must be held.
+
+        :param str key: The key of the root filesystem
+        :param str root: Path to the root filesystem
+        :param str release_url: URL to the Release file of the release that was bootstrapped
+        """
+        import shutil
+        import tempfile
+        from .filecopy import copy_dir
+        tmp_path = tempfile.mkdtemp(dir=self.path, prefix='.rootfs.')
+        try:
+            copy_dir(root, tmp_path)
+            rootfs = self.get_entry_path(key)
+            if os.path.isdir(rootfs):
+                # Replace the stale root filesystem, a directory cannot be renamed over it
+                os.remove(rootfs + '.json')
+                self.remove(rootfs)
+            self.publish(key, tmp_path, release_url)
+        finally:
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+
+    def remove(self, rootfs):
+        """Removes a root filesystem from the cache.
+        It is moved out of the way first, so that it is never used partially removed.
+
+        :param str rootfs: Path to the root filesystem
+        """
+        import shutil
+        import tempfile
+        tmp_path = tempfile.mkdtemp(dir=self.path, prefix='.evicted.')
+        os.rename(rootfs, os.path.join(tmp_path, 'rootfs'))
+        shutil.rmtree(tmp_path)
+
+
+def get_tree_stats(path):
+    """Walks a root filesystem once and sums up its contents
+
+    :param str path: Path to the root filesystem
+    :return: The number of entries, the apparent size of the regular files
+             and the space the files occupy on disk (in bytes)
+    :rtype: tuple
+    """
+    import stat
+    files, content_size, size = 0, 0, 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        files += len(dirnames) + len(filenames)
+        for filename in filenames:
+            file_stat = os.lstat(os.path.join(dirpath, filename))
+            if stat.S_ISREG(file_stat.st_mode):
+                content_size += file_stat.st_size
+            size += file_stat.st_blocks * 512
+    return files, content_size, size
@@ -0,0 +1,271 @@
+"""The tarballcache module stores the tarballs created by debootstrap (see bootstrap.MakeTarball).
+Every tarball is published together with its checksum and a fingerprint of the Release file of the mirror
+it was downloaded from. Tarballs are only reused when their checksum matches and the mirror has not
+published a new Release file since, the least recently used tarballs are evicted when the cache grows too large.
+"""
+import logging
+import os
+import threading
+log = logging.getLogger(__name__)
+
+# Increment this when the layout of the metadata changes, tarballs with older metadata will then be recreated
+CACHE_VERSION = 1
+
+# The fingerprints of the Release files that have been fetched, keyed by their URL
+releases = {}
+# The tarballs whose checksum has been verified, mapped to their modification time and size
+verified = {}
+# Guards releases and verified, builds may run concurrently
+lock = threading.Lock()
+
+
+def from_manifest(manifest):
+    """Creates the tarball cache configured in the bootstrapper section of the manifest
+
+    :param Manifest manifest: The manifest
+    :rtype: TarballCache
+    """
+    from bootstrapvz.common.bytes import Bytes
+    settings = manifest.bootstrapper.get('tarball_cache', {})
+    max_size = settings.get('max_size', None)
+    return TarballCache(settings.get('path', manifest.bootstrapper['workspace']),
+                        None if max_size is None else Bytes(max_size),
+                        settings.get('check_release', True))
+
+
+class TarballCache(object):
+    """The TarballCache stores debootstrap tarballs keyed by the debootstrap options.
+    Builds hold a lock on a tarball while creating or unpacking it, so that concurrent builds
+    wait for the tarball to be created once and tarballs that are in use are never evicted.
+    """
+
+    # The names of the entries in the cache directory are made up of the prefix, the key and the extension
+    prefix = 'debootstrap-'
+    extension = '.tar'
+
+    def __init__(self, path, max_size=None, check_release=True):
+        """
+        :param str path: The directory the tarballs are stored in
+        :param Bytes max_size: The maximum size of the cache, no tarballs are evicted if None
+        :param bool check_release: Whether tarballs are considered stale when the Release file of the mirror changes
+        """
+        self.path = path
+        self.max_size = max_size
+        self.check_release = check_release
+
+    def get_entry_path(self, key):
+        """Returns the path to the tarball with the given key
+
+        :param str key: The key of the tarball
+        :rtype: str
+        """
+        return os.path.join(self.path, self.prefix + key + self.extension)
+
+    def lock(self, key, shared=False):
+        """Returns a context manager that locks the tarball with the given key.
+        Creating a tarball requires an exclusive lock, a shared lock is enough for unpacking it.
+
+        :param str key: The key of the tarball
+        :param bool shared: Whether to hold a shared lock
+        """
+        from .tools import file_lock
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        return file_lock(self.get_entry_path(key) + '.lock', shared=shared)
+
+    def lookup(self, key, release_url):
+        """Returns the path to a tarball that is intact and not stale, the lock of the tarball must be held.
+
+        :param str key: The key of the tarball
+        :param str release_url: URL to the Release file of the release the tarball contains
+        :return: The path to the tarball or None if there is no usable tarball
+        :rtype: str
+        """
+        import json
+        tarball = self.get_entry_path(key)
+        if not os.path.exists(tarball):
+            return None
+        try:
+            with open(tarball + '.json') as stream:
+                metadata = json.load(stream)
+        except (IOError, OSError, ValueError):
+            metadata = {}
+        if metadata.get('version') != CACHE_VERSION:
+            log.info('The tarball {path} has no metadata, it is not used'.format(path=tarball))
+            return None
+        if not self.verify(tarball, metadata):
+            log.warn('The tarball {path} is corrupt, it is not used'.format(path=tarball))
+            return None
+        if self.check_release:
+            release = get_release(release_url)
+            if release is None:
+                log.warn('Unable to fetch {url}, the tarball {path} may be outdated'
+                         .format(url=release_url, path=tarball))
+            elif release['sha256'] != metadata['release']['sha256']:
+                log.info('The mirror has published a new Release file (dated {date}), '
+                         'the tarball {path} is outdated'.format(date=release['date'], path=tarball))
+                return None
+        # Mark the tarball as recently used
+        os.utime(tarball + '.json', None)
+        return tarball
+
+    def verify(self, tarball, metadata):
+        """Checks whether a tarball is intact
+
+        :param str tarball: Path to the tarball
+        :param dict metadata: The metadata of the tarball
+        :rtype: bool
+        """
+        return verify(tarball, metadata)
+
+    def get_metadata(self, tmp_path):
+        """Returns the metadata that a newly created tarball is verified with later on
+
+        :param str tmp_path: Path to the tarball
+        :return: The metadata, it contains at least the size of the tarball
+        :rtype: dict
+        """
+        return {'sha256': get_checksum(tmp_path), 'size': os.path.getsize(tmp_path)}
+
+    def publish(self, key, tmp_path, release_url):
+        """Moves a newly created tarball into the cache, the exclusive lock of the tarball must be held.
+
+        :param str key: The key of the tarball
+        :param str tmp_path: Path to the tarball, it must be in the cache directory
+        :param str release_url: URL to the Release file of the release the tarball contains
+        """
+        import json
+        import tempfile
+        tarball = self.get_entry_path(key)
+        metadata = self.get_metadata(tmp_path)
+        release = get_release(release_url) if self.check_release else None
+        metadata.update({'version': CACHE_VERSION,
+                         'release': release or {'sha256': None, 'date': None},
+                         })
+        fd, tmp_metadata = tempfile.mkstemp(dir=self.path, prefix='.metadata.')
+        try:
+            with os.fdopen(fd, 'w') as stream:
+                json.dump(metadata, stream)
+            # The metadata is published first, a tarball is never used without it
+            os.rename(tmp_metadata, tarball + '.json')
+        except BaseException:
+            os.remove(tmp_metadata)
+            raise
+        os.rename(tmp_path, tarball)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used tarballs until the cache fits within its size limit.
+        Tarballs that are locked by other builds are skipped.
+        """
+        if self.max_size is None:
+            return
+        import json
+        from .tools import file_lock
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.startswith(self.prefix) or not name.endswith(self.extension + '.json'):
+                continue
+            tarball = os.path.join(self.path, name[:-len('.json')])
+            if not os.path.exists(tarball):
+                continue
+            try:
+                with open(tarball + '.json') as stream:
+                    size = json.load(stream)['size']
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+            entries.append((os.path.getmtime(tarball + '.json'), size, tarball))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, tarball in entries:
+            if total <= self.max_size.get_qty_in('B'):
+                break
+            try:
+                with file_lock(tarball + '.lock', blocking=False):
+                    log.info('Evicting the tarball ' + tarball)
+                    os.remove(tarball + '.json')
+                    self.remove(tarball)
+                total -= size
+            except (IOError, OSError):
+                log.debug('The tarball {path} is in use, it is not evicted'.format(path=tarball))
+
+    def remove(self, tarball):
+        """Removes a tarball from the cache
+
+        :param str tarball: Path to the tarball
+        """
+        os.remove(tarball)
+
+
+def get_release_url(mirror, release):
+    """Returns the URL to the Release file of a release
+
+    :param str mirror: The URL of the mirror
+    :param str release: The codename of the release
+    :rtype: str
+    """
+    return '{mirror}/dists/{release}/Release'.format(mirror=mirror.rstrip('/'), release=release)
+
+
+def get_release(url):
+    """Fetches a Release file, it is only fetched once per process
+
+    :param str url: URL to the Release file
+    :return: The sha256 checksum and the date of the Release file, None if it could not be fetched
+    :rtype: dict
+    """
+    with lock:
+        if url in releases:
+            return releases[url]
+    import hashlib
+    import urllib.error
+    import urllib.request
+    try:
+        content = urllib.request.urlopen(url, timeout=30).read()
+    except (urllib.error.URLError, IOError, OSError) as e:
+        log.debug('Unable to fetch {url}: {error}'.format(url=url, error=e))
+        return None
+    date = None
+    for line in content.decode('utf-8', 'replace').splitlines():
+        if line.startswith('Date:'):
+            date = line[len('Date:'):].strip()
+            break
+    release = {'sha256': hashlib.sha256(content).hexdigest(), 'date': date}
+    with lock:
+        releases[url] = release
+    return release
+
+
+def get_checksum(path):
+    """Returns the sha256 checksum of a file
+
+    :param str path: Path to the file
+    :rtype: str
+    """
+    import hashlib
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def verify(tarball, metadata):
+    """Checks a tarball against the size and checksum in its metadata.
+    Tarballs are only checksummed once per process unless they change.
+
+    :param str tarball: Path to the tarball
+    :param dict metadata: The metadata of the tarball
+    :rtype: bool
+    """
+    stat = os.stat(tarball)
+    if stat.st_size != metadata['size']:
+        return False
+    with lock:
+        if verified.get(tarball) == (stat.st_mtime, stat.st_size, metadata['sha256']):
+            return True
+    if get_checksum(tarball) != metadata['sha256']:
+        return False
+    with lock:
+        verified[tarball] = (stat.st_mtime, stat.st_size, metadata['sha256'])
+    return True
@@ -17,19 +17,25 @@ from .tasks import initd
 from .tasks import ssh
 from .tasks import kernel
 from .tasks import folder
+from .tasks import fastio
+from .tasks import triggers
+from .tasks import offline
 
 
 def get_standard_groups(manifest):
     group = []
     group.extend(get_base_group(manifest))
-    group.extend(volume_group)
-    if manifest.volume['partitions']['type'] != 'none':
-        group.extend(partitioning_group)
-    if 'boot' in manifest.volume['partitions']:
-        group.extend(boot_partition_group)
-    group.extend(mounting_group)
+    if manifest.volume.get('assembly', 'devices') == 'offline':
+        group.extend(offline_group)
+    else:
+        group.extend(volume_group)
+        if manifest.volume['partitions']['type'] != 'none':
+            group.extend(partitioning_group)
+        if 'boot' in manifest.volume['partitions']:
+            group.extend(boot_partition_group)
+        group.extend(mounting_group)
+        group.extend(get_fs_specific_group(manifest))
     group.extend(kernel_group)
-    group.extend(get_fs_specific_group(manifest))
     group.extend(get_network_group(manifest))
     group.extend(get_apt_group(manifest))
     group.extend(security_group)
@@ -52,6 +58,14 @@ def get_base_group(manifest):
         group.append(bootstrap.IncludePackagesInBootstrap)
     if manifest.bootstrapper.get('exclude_packages', False):
         group.append(bootstrap.ExcludePackagesInBootstrap)
+    if manifest.bootstrapper.get('fast_io', False):
+        group.extend([fastio.DisableDpkgSync,
+                      fastio.IncludeEatmydata,
+                      fastio.PreloadEatmydata,
+                      fastio.RemoveFastIoConfiguration,
+                      fastio.RemoveEatmydata,
+                      fastio.SyncVolume,
+                      ])
     return group
 
 
@@ -83,6 +97,14 @@ mounting_group = [filesystem.CreateMountDir,
                   filesystem.DeleteMountDir,
                   ]
 
+offline_group = [offline.AddRequiredCommands,
+                 offline.CreateTree,
+                 filesystem.ChmodMountDirs,
+                 filesystem.FStab,
+                 offline.Assemble,
+                 offline.DeleteTree,
+                 ]
+
 kernel_group = [kernel.DetermineKernelVersion,
                 kernel.UpdateInitramfs,
                 ]
@@ -133,10 +155,23 @@ def get_apt_group(manifest):
         group.append(apt.WritePreferences)
     if 'apt.conf.d' in manifest.packages:
         group.append(apt.WriteConfiguration)
+    if 'archive_cache' in manifest.bootstrapper:
+        group.extend([apt.PrepareArchiveCache,
+                      apt.MountArchiveCache,
+                      apt.UnmountArchiveCache,
+                      ])
     if 'install' in manifest.packages:
         group.append(packages.AddManifestPackages)
     if manifest.packages.get('install_standard', False):
         group.append(packages.AddTaskselStandardPackages)
+    if manifest.packages.get('defer_triggers', False):
+        group.extend([triggers.DeferTriggers,
+                      triggers.RunDeferredTriggers,
+                      ])
+    if 'prefetch' in manifest.packages:
+        group.extend([packages.StartPrefetch,
+                      packages.FinishPrefetch,
+                      ])
     return group
 
 
@@ -221,6 +256,8 @@ rollback_map = {workspace.CreateWorkspace:  workspace.DeleteWorkspace,
                 filesystem.CreateMountDir:  filesystem.DeleteMountDir,
                 filesystem.MountRoot:       filesystem.UnmountRoot,
                 folder.Create:              folder.Delete,
+                offline.CreateTree:         offline.DeleteTree,
+                apt.MountArchiveCache:      apt.UnmountArchiveCache,
                 }
 
 
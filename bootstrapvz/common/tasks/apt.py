@@ -2,6 +2,7 @@ from bootstrapvz.base import Task
 from bootstrapvz.common import phases
 from bootstrapvz.common.tools import log_check_call
 from bootstrapvz.common.tools import rel_path
+from . import bootstrap
 from . import locale
 import logging
 import os
@@ -13,30 +14,41 @@ class ValidateTrustedKeys(Task):
 
     @classmethod
     def run(cls, info):
+        from bootstrapvz.common.exceptions import ManifestError, raise_errors
         from bootstrapvz.common.tools import log_call
 
-        for i, rel_key_path in enumerate(info.manifest.packages.get('trusted-keys', {})):
-            key_path = rel_path(info.manifest.path, rel_key_path)
-            if not os.path.isfile(key_path):
-                info.manifest.validation_error('File not found: {}'.format(key_path),
-                                               ['packages', 'trusted-keys', i])
-
-            from tempfile import mkdtemp
-            from shutil import rmtree
-            tempdir = mkdtemp()
-
-            status, _, _ = log_call(
-                ['gpg', '--quiet',
-                 '--homedir', tempdir,
-                 '--keyring', key_path,
-                 '-k']
-            )
+        trusted_keys = info.manifest.packages.get('trusted-keys', [])
+        if not trusted_keys:
+            return
 
+        # All keyrings are checked with the same GPG home directory, every invalid keyring is reported
+        from tempfile import mkdtemp
+        from shutil import rmtree
+        tempdir = mkdtemp()
+        errors = []
+        try:
+            for i, rel_key_path in enumerate(trusted_keys):
+                key_path = rel_path(info.manifest.path, rel_key_path)
+                data_path = ['packages', 'trusted-keys', i]
+                if not os.path.isfile(key_path):
+                    errors.append(ManifestError('File not found: {}'.format(key_path),
+                                                info.manifest.path, data_path))
+                    continue
+
+                status, _, _ = log_call(
+                    ['gpg', '--quiet',
+                     '--homedir', tempdir,
+                     '--keyring', key_path,
+                     '-k']
+                )
+
+                if status != 0:
+                    errors.append(ManifestError('Invalid GPG keyring: {}'.format(key_path),
+                                                info.manifest.path, data_path))
+        finally:
             rmtree(tempdir)
-
-            if status != 0:
-                info.manifest.validation_error('Invalid GPG keyring: {}'.format(key_path),
-                                               ['packages', 'trusted-keys', i])
+        if errors:
+            raise_errors(errors)
 
 
 class AddManifestSources(Task):
@@ -260,6 +272,57 @@ class AptClean(Task):
                 os.remove(list_file)
 
 
+class PrepareArchiveCache(Task):
+    description = 'Filling the package archive of the build from the package cache'
+    phase = phases.os_installation
+    successors = [bootstrap.MakeTarball, bootstrap.Bootstrap]
+
+    @classmethod
+    def run(cls, info):
+        from ..archivecache import from_manifest
+        archive = os.path.join(info.workspace, 'apt_archives')
+        os.mkdir(archive)
+        from_manifest(info.manifest).seed(archive)
+
+
+class MountArchiveCache(Task):
+    description = 'Mounting the package archive of the build'
+    phase = phases.os_installation
+    predecessors = [bootstrap.Bootstrap]
+
+    @classmethod
+    def run(cls, info):
+        archive = os.path.join(info.workspace, 'apt_archives')
+        os.chmod(archive, os.stat(os.path.join(info.root, 'var/cache/apt/archives')).st_mode)
+        root = info.volume.partition_map.root
+        if root.fsm.current == 'mounted':
+            root.add_mount(archive, 'var/cache/apt/archives', ['--bind'])
+        else:
+            # Folder volumes and offline images are never mounted, the package archive is bound to the tree directly
+            from bootstrapvz.base.fs.partitions.mount import Mount
+            info.archive_mount = Mount(archive, 'var/cache/apt/archives', ['--bind'])
+            info.archive_mount.mount(info.root)
+
+
+class UnmountArchiveCache(Task):
+    description = 'Adding the downloaded packages to the package cache'
+    phase = phases.system_cleaning
+    successors = [AptClean]
+
+    @classmethod
+    def run(cls, info):
+        import shutil
+        from ..archivecache import from_manifest
+        archive = os.path.join(info.workspace, 'apt_archives')
+        if hasattr(info, 'archive_mount'):
+            info.archive_mount.unmount()
+            del info.archive_mount
+        else:
+            info.volume.partition_map.root.remove_mount('var/cache/apt/archives')
+        from_manifest(info.manifest).collect(archive)
+        shutil.rmtree(archive)
+
+
 class EnableDaemonAutostart(Task):
     description = 'Re-enabling daemon autostart after installation'
     phase = phases.system_cleaning
@@ -37,14 +37,15 @@ class DisableGetTTYs(Task):
         # Forward compatible check for jessie
         from bootstrapvz.common.releases import jessie
         if info.manifest.release < jessie:
-            from ..tools import sed_i
+            from ..tools import edit_file
             inittab_path = os.path.join(info.root, 'etc/inittab')
             tty1 = '1:2345:respawn:/sbin/getty 38400 tty1'
-            sed_i(inittab_path, '^' + tty1, '#' + tty1)
+            substitutions = [('^' + tty1, '#' + tty1)]
             ttyx = ':23:respawn:/sbin/getty 38400 tty'
             for i in range(2, 7):
                 i = str(i)
-                sed_i(inittab_path, '^' + i + ttyx + i, '#' + i + ttyx + i)
+                substitutions.append(('^' + i + ttyx + i, '#' + i + ttyx + i))
+            edit_file(inittab_path, substitutions)
         else:
             from shutil import copy
             logind_asset_path = os.path.join(assets, 'systemd/logind.conf')
@@ -14,10 +14,17 @@ class AddRequiredCommands(Task):
 
     @classmethod
     def run(cls, info):
-        info.host_dependencies['debootstrap'] = 'debootstrap'
+        backend = get_backend(info.manifest)
+        info.host_dependencies[backend] = backend
+
+
+def get_backend(manifest):
+    return manifest.bootstrapper.get('backend', 'debootstrap')
 
 
 def get_bootstrap_args(info):
+    if get_backend(info.manifest) == 'mmdebstrap':
+        return get_mmdebstrap_args(info)
     executable = ['debootstrap']
     arch = info.manifest.system.get('userspace_architecture', info.manifest.system.get('architecture'))
     options = ['--arch=' + arch]
@@ -35,23 +42,112 @@ def get_bootstrap_args(info):
             from bootstrapvz.common.exceptions import ManifestError
             raise ManifestError('force-check-gpg is only support in Stretch and newer releases')
     if info.include_packages:
-        options.append('--include=' + ','.join(info.include_packages))
+        options.append('--include=' + ','.join(sorted(info.include_packages)))
     if info.exclude_packages:
-        options.append('--exclude=' + ','.join(info.exclude_packages))
+        options.append('--exclude=' + ','.join(sorted(info.exclude_packages)))
     options.append('--no-merged-usr')
     mirror = info.manifest.bootstrapper.get('mirror', info.apt_mirror)
     arguments = [info.manifest.system['release'], info.root, mirror]
     return executable, options, arguments
 
 
-def get_tarball_filename(info):
+def get_mmdebstrap_args(info):
+    executable = ['mmdebstrap']
+    arch = info.manifest.system.get('userspace_architecture', info.manifest.system.get('architecture'))
+    options = ['--arch=' + arch]
+    if 'variant' in info.manifest.bootstrapper:
+        options.append('--variant=' + info.manifest.bootstrapper['variant'])
+    if info.manifest.bootstrapper.get('keyring', ''):
+        options.append('--keyring=' + info.manifest.bootstrapper['keyring'])
+    if info.manifest.bootstrapper.get('no-check-gpg', False) is True:
+        options.extend(['--aptopt=Acquire::AllowInsecureRepositories "true"',
+                        '--aptopt=APT::Get::AllowUnauthenticated "true"'])
+    # mmdebstrap always checks the signatures, so force-check-gpg needs no option
+    if info.include_packages:
+        options.append('--include=' + ','.join(sorted(info.include_packages)))
+    # dpkg settings that tasks placed in the root are applied while bootstrapping (e.g. path filters)
+    dpkgcfg_path = os.path.join(info.root, 'etc/dpkg/dpkg.cfg.d')
+    if os.path.isdir(dpkgcfg_path):
+        options.extend(['--dpkgopt=' + os.path.join(dpkgcfg_path, name) for name in sorted(os.listdir(dpkgcfg_path))])
+    for hook, command in info.bootstrap_hooks:
+        options.append('--{hook}-hook={command}'.format(hook=hook, command=command))
+    if info.exclude_packages:
+        # mmdebstrap lets apt resolve the package set, so excluded packages are removed afterwards.
+        # debootstrap --exclude also drops essential packages, apt only does so when told to
+        options.append('--customize-hook=chroot "$1" apt-get --yes --allow-remove-essential purge ' +
+                       ' '.join(sorted(info.exclude_packages)))
+    no_merged_usr = '/usr/share/mmdebstrap/hooks/no-merged-usr'
+    if os.path.isdir(no_merged_usr):
+        options.append('--hook-dir=' + no_merged_usr)
+    mirror = info.manifest.bootstrapper.get('mirror', info.apt_mirror)
+    arguments = [info.manifest.system['release'], info.root, mirror]
+    return executable, options, arguments
+
+
+def get_archive_options(info):
+    # The package archive of the build is kept out of the bootstrap arguments, its path is different for every build
+    if 'archive_cache' not in info.manifest.bootstrapper:
+        return []
+    archive = os.path.join(info.workspace, 'apt_archives')
+    if get_backend(info.manifest) == 'debootstrap':
+        return ['--cache-dir=' + archive]
+    return ['--skip=download/empty',
+            '--skip=essential/unlink',
+            '--setup-hook=mkdir -p "$1"/var/cache/apt/archives/',
+            '--setup-hook=sync-in {archive} /var/cache/apt/archives/'.format(archive=archive),
+            '--customize-hook=sync-out /var/cache/apt/archives {archive}'.format(archive=archive),
+            ]
+
+
+def get_bootstrap_env(info):
+    if not info.bootstrap_env:
+        return None
+    env = dict(os.environ)
+    env.update(info.bootstrap_env)
+    return env
+
+
+def get_tarball_key(info):
     from hashlib import sha1
     executable, options, arguments = get_bootstrap_args(info)
     # Filter info.root which points at /target/volume-id, we won't ever hit anything with that in there.
     hash_args = [arg for arg in arguments if arg != info.root]
-    tarball_id = sha1(repr(frozenset(options + hash_args)).encode("utf-8")).hexdigest()[0:8]
-    tarball_filename = 'debootstrap-' + tarball_id + '.tar'
-    return os.path.join(info.manifest.bootstrapper['workspace'], tarball_filename)
+    if get_backend(info.manifest) == 'debootstrap':
+        return sha1(repr(frozenset(options + hash_args)).encode("utf-8")).hexdigest()[0:8]
+    # mmdebstrap tarballs contain the whole root, so they also depend on the contents of the files in the options
+    options = [option.replace(info.root, '') for option in options]
+    key = sha1(repr(executable + sorted(options) + hash_args).encode("utf-8"))
+    key.update(get_root_digest(info))
+    return key.hexdigest()[0:8]
+
+
+def get_rootfs_key(info):
+    from hashlib import sha1
+    key = sha1(get_tarball_key(info).encode('utf-8'))
+    # Tasks that run before debootstrap may seed the root, e.g. with dpkg settings
+    key.update(get_root_digest(info))
+    return key.hexdigest()[0:8]
+
+
+def get_root_digest(info):
+    from hashlib import sha1
+    digest = sha1()
+    for dirpath, dirnames, filenames in os.walk(info.root):
+        dirnames[:] = sorted(name for name in dirnames if name != 'lost+found')
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(path, info.root).encode('utf-8') + b'\0')
+            if os.path.isfile(path) and not os.path.islink(path):
+                with open(path, 'rb') as stream:
+                    digest.update(sha1(stream.read()).digest())
+    return digest.digest()
+
+
+def get_release_url(info):
+    from ..tarballcache import get_release_url
+    executable, options, arguments = get_bootstrap_args(info)
+    release, root, mirror = arguments
+    return get_release_url(mirror, release)
 
 
 class MakeTarball(Task):
@@ -60,16 +156,43 @@ class MakeTarball(Task):
 
     @classmethod
     def run(cls, info):
+        from .. import tarballcache
         executable, options, arguments = get_bootstrap_args(info)
-        tarball = get_tarball_filename(info)
+        cache = tarballcache.from_manifest(info.manifest)
+        key = get_tarball_key(info)
+        # Concurrent builds with the same tarball wait for the first one to create it
+        with cache.lock(key):
+            if cache.lookup(key, get_release_url(info)) is not None:
+                log.debug('Found matching tarball, skipping creation')
+            else:
+                # Create the tarball under a temporary name, so that a failed run does not leave a partial tarball
+                tmp_tarball = '{tarball}.{id}.tar'.format(tarball=cache.get_entry_path(key), id=info.run_id)
+                if get_backend(info.manifest) == 'mmdebstrap':
+                    make_mmdebstrap_tarball(info, tmp_tarball)
+                else:
+                    from ..tools import log_call
+                    status, out, err = log_call(executable + options + get_archive_options(info) +
+                                                ['--make-tarball=' + tmp_tarball] + arguments,
+                                                env=get_bootstrap_env(info))
+                    if status not in [0, 1]:  # variant=minbase exits with 0
+                        msg = 'debootstrap exited with status {status}, it should exit with status 0 or 1'.format(status=status)
+                        if os.path.isfile(tmp_tarball):
+                            os.remove(tmp_tarball)
+                        raise TaskError(msg)
+                cache.publish(key, tmp_tarball, get_release_url(info))
+
+
+def make_mmdebstrap_tarball(info, tarball):
+    from ..tools import log_check_call
+    executable, options, arguments = get_bootstrap_args(info)
+    release, root, mirror = arguments
+    try:
+        log_check_call(executable + options + get_archive_options(info) + [release, tarball, mirror],
+                       env=get_bootstrap_env(info))
+    except BaseException:
         if os.path.isfile(tarball):
-            log.debug('Found matching tarball, skipping creation')
-        else:
-            from ..tools import log_call
-            status, out, err = log_call(executable + options + ['--make-tarball=' + tarball] + arguments)
-            if status not in [0, 1]:  # variant=minbase exits with 0
-                msg = 'debootstrap exited with status {status}, it should exit with status 0 or 1'.format(status=status)
-                raise TaskError(msg)
+            os.remove(tarball)
+        raise
 
 
 class Bootstrap(Task):
@@ -79,21 +202,76 @@ class Bootstrap(Task):
 
     @classmethod
     def run(cls, info):
-        executable, options, arguments = get_bootstrap_args(info)
-        tarball = get_tarball_filename(info)
-        if os.path.isfile(tarball):
+        from .. import rootfscache
+        from ..filecopy import copy_dir
+        if info.bootstrap_script is not None and get_backend(info.manifest) == 'mmdebstrap':
+            raise TaskError('Bootstrapping scripts are only supported by debootstrap, '
+                            'mmdebstrap can be customized with info.bootstrap_hooks instead')
+        cache = rootfscache.from_manifest(info.manifest)
+        if cache is None or info.bootstrap_script is not None:
+            # The bootstrapping script may change anytime, so its results are never cached
+            install(info)
+            return
+        key = get_rootfs_key(info)
+        release_url = get_release_url(info)
+        with cache.lock(key, shared=True):
+            rootfs = cache.lookup(key, release_url)
+            if rootfs is not None:
+                log.info('Copying the cached root filesystem into the volume')
+                copy_dir(rootfs, info.root)
+                return
+        # Concurrent builds with the same root filesystem wait for the first one to bootstrap it
+        with cache.lock(key):
+            rootfs = cache.lookup(key, release_url)
+            if rootfs is not None:
+                log.info('Copying the cached root filesystem into the volume')
+                copy_dir(rootfs, info.root)
+            else:
+                install(info)
+                log.info('Storing the root filesystem in the cache')
+                cache.store(key, info.root, release_url)
+
+
+def install(info):
+    from .. import tarballcache
+    executable, options, arguments = get_bootstrap_args(info)
+    cache = tarballcache.from_manifest(info.manifest)
+    key = get_tarball_key(info)
+    if info.bootstrap_script is not None:
+        # Optional bootstrapping script to modify the bootstrapping process
+        arguments.append(info.bootstrap_script)
+
+    from contextlib import ExitStack
+    with ExitStack() as stack:
+        # The shared lock keeps the tarball from being evicted or recreated while it is unpacked
+        stack.enter_context(cache.lock(key, shared=True))
+        tarball = cache.lookup(key, get_release_url(info))
+        if tarball is not None:
             if not info.manifest.bootstrapper.get('tarball', False):
                 # Only shows this message if it hasn't tried to create the tarball
                 log.debug('Found matching tarball, skipping download')
-            options.extend(['--unpack-tarball=' + tarball])
+        else:
+            # Other builds may create the tarball while this build downloads everything itself
+            stack.close()
 
-        if info.bootstrap_script is not None:
-            # Optional bootstrapping script to modify the bootstrapping process
-            arguments.append(info.bootstrap_script)
+        if get_backend(info.manifest) == 'mmdebstrap':
+            if tarball is None:
+                # mmdebstrap needs an empty target directory, so the root is written to a tarball first
+                tarball = os.path.join(info.workspace, 'mmdebstrap.tar')
+                make_mmdebstrap_tarball(info, tarball)
+                stack.callback(os.remove, tarball)
+            from ..tools import log_check_call
+            log_check_call(['tar', '--extract', '--preserve-permissions', '--numeric-owner',
+                            '--xattrs', '--xattrs-include=*',
+                            '--file=' + tarball, '--directory=' + info.root])
+            return
+        if tarball is not None:
+            options.extend(['--unpack-tarball=' + tarball])
 
         try:
             from ..tools import log_check_call
-            log_check_call(executable + options + arguments)
+            log_check_call(executable + options + get_archive_options(info) + arguments,
+                           env=get_bootstrap_env(info))
         except KeyboardInterrupt:
             # Sometimes ../root/sys and ../root/proc are still mounted when
             # quitting debootstrap prematurely. This break the cleanup process,
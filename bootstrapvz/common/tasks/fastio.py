@@ -0,0 +1,155 @@
+from bootstrapvz.base import Task
+from .. import phases
+from . import apt
+from . import bootstrap
+from . import filesystem
+import logging
+import os
+log = logging.getLogger(__name__)
+
+# The dpkg configuration that stops dpkg from calling fsync() on every file it unpacks
+dpkg_cfg = 'etc/dpkg/dpkg.cfg.d/bootstrap-vz-unsafe-io'
+# The file mmdebstrap stores the dpkg options it was given in
+mmdebstrap_dpkg_cfg = 'etc/dpkg/dpkg.cfg.d/99mmdebstrap'
+# The places the libeatmydata package of the bootstrapped system installs the library to
+eatmydata_globs = ['usr/lib/*/libeatmydata.so*',
+                   'usr/lib/libeatmydata/libeatmydata.so*',
+                   ]
+
+
+def get_eatmydata_package(release):
+    """Returns the package that contains libeatmydata in a release
+
+    :param _Release release: The release
+    :rtype: str
+    """
+    from ..releases import stretch
+    # Before stretch the library was part of the eatmydata package
+    return 'libeatmydata1' if release >= stretch else 'eatmydata'
+
+
+class DisableDpkgSync(Task):
+    description = 'Disabling fsync() calls of dpkg'
+    phase = phases.os_installation
+    successors = [bootstrap.MakeTarball, bootstrap.Bootstrap]
+
+    @classmethod
+    def run(cls, info):
+        # The configuration is placed in the root before bootstrapping, so that debootstrap uses it as well
+        # and mmdebstrap passes it on to dpkg (see bootstrap.get_mmdebstrap_args())
+        dpkgcfg_path = os.path.join(info.root, os.path.dirname(dpkg_cfg))
+        if not os.path.exists(dpkgcfg_path):
+            os.makedirs(dpkgcfg_path)
+        with open(os.path.join(info.root, dpkg_cfg), 'w') as dpkg_cfg_handle:
+            dpkg_cfg_handle.write('force-unsafe-io\n')
+
+
+class IncludeEatmydata(Task):
+    description = 'Adding libeatmydata to the bootstrap installation'
+    phase = phases.preparation
+
+    @classmethod
+    def run(cls, info):
+        # The library is loaded by the binaries of the bootstrapped system,
+        # so it is taken from the release that is bootstrapped rather than from the host
+        info.include_packages.add(get_eatmydata_package(info.manifest.release))
+
+
+class PreloadEatmydata(Task):
+    description = 'Preloading libeatmydata for all commands in the chroot'
+    phase = phases.os_installation
+    predecessors = [bootstrap.Bootstrap]
+
+    @classmethod
+    def run(cls, info):
+        import glob
+        from ..tools import log_call
+        libraries = [path for pattern in eatmydata_globs
+                     for path in sorted(glob.glob(os.path.join(info.root, pattern)))
+                     if os.path.isfile(path)]
+        if not libraries:
+            log.warn('libeatmydata was not installed, only dpkg is kept from calling fsync()')
+            return
+        preload_path = os.path.join(info.root, 'etc/ld.so.preload')
+        preload_existed = os.path.exists(preload_path)
+        with open(preload_path, 'a') as preload:
+            preload.write('/' + os.path.relpath(libraries[0], info.root) + '\n')
+        # A library that cannot be preloaded only produces a warning from every command, so check for that as well
+        status, _, stderr = log_call(['chroot', info.root, 'true'])
+        if status == 0 and not stderr:
+            return
+        log.warn('Commands in the chroot fail with libeatmydata preloaded, only dpkg is kept from calling fsync()')
+        remove_preload(info.root)
+        if not preload_existed and os.path.isfile(preload_path):
+            os.remove(preload_path)
+
+
+class RemoveFastIoConfiguration(Task):
+    description = 'Re-enabling fsync() calls in the chroot'
+    phase = phases.system_cleaning
+    successors = [apt.PurgeUnusedPackages]
+
+    @classmethod
+    def run(cls, info):
+        preload_path = os.path.join(info.root, 'etc/ld.so.preload')
+        if os.path.isfile(preload_path):
+            remove_preload(info.root)
+            with open(preload_path) as preload:
+                if not preload.read().strip():
+                    os.remove(preload_path)
+
+        os.remove(os.path.join(info.root, dpkg_cfg))
+        mmdebstrap_dpkg_cfg_path = os.path.join(info.root, mmdebstrap_dpkg_cfg)
+        if os.path.isfile(mmdebstrap_dpkg_cfg_path):
+            with open(mmdebstrap_dpkg_cfg_path) as dpkg_cfg_handle:
+                options = [line for line in dpkg_cfg_handle if line.strip() != 'force-unsafe-io']
+            if any(line.strip() for line in options):
+                with open(mmdebstrap_dpkg_cfg_path, 'w') as dpkg_cfg_handle:
+                    dpkg_cfg_handle.write(''.join(options))
+            else:
+                os.remove(mmdebstrap_dpkg_cfg_path)
+
+
+class RemoveEatmydata(Task):
+    description = 'Marking libeatmydata for removal'
+    phase = phases.system_cleaning
+    predecessors = [RemoveFastIoConfiguration]
+    successors = [apt.PurgeUnusedPackages]
+
+    @classmethod
+    def run(cls, info):
+        from ..tools import log_check_call
+        package = get_eatmydata_package(info.manifest.release)
+        wanted = set(info.manifest.bootstrapper.get('include_packages', []))
+        wanted.update(pkg.name for pkg in info.packages.remote())
+        if package in wanted:
+            return
+        # The package is installed like any package of the bootstrap, marking it as automatically
+        # installed lets PurgeUnusedPackages remove it unless a package that was installed depends on it
+        log_check_call(['chroot', info.root, 'apt-mark', 'auto', package])
+
+
+class SyncVolume(Task):
+    description = 'Writing the contents of the volume to disk'
+    phase = phases.volume_unmounting
+    predecessors = [filesystem.RemoveMountTable]
+    successors = [filesystem.UnmountRoot]
+
+    @classmethod
+    def run(cls, info):
+        from ..tools import log_check_call
+        # Nothing in the chroot synced its writes, a single syncfs() writes them all out at once
+        log_check_call(['sync', '--file-system', info.root])
+
+
+def remove_preload(root):
+    """Removes libeatmydata from the libraries that are preloaded in the chroot
+
+    :param str root: Path to the root of the chroot
+    """
+    preload_path = os.path.join(root, 'etc/ld.so.preload')
+    with open(preload_path) as preload:
+        libraries = [line for line in preload
+                     if not os.path.basename(line.strip()).startswith('libeatmydata.so')]
+    with open(preload_path, 'w') as preload:
+        preload.write(''.join(libraries))
@@ -13,9 +13,11 @@ class MoveImage(Task):
 
         import os.path
         destination = os.path.join(info.manifest.bootstrapper['workspace'], filename)
-        import shutil
-        shutil.move(info.volume.image_path, destination)
+        from bootstrapvz.common.filecopy import move_file
+        transferred = move_file(info.volume.image_path, destination)
         info.volume.image_path = destination
         import logging
         log = logging.getLogger(__name__)
         log.info('The volume image has been moved to ' + destination)
+        if transferred:
+            log.debug('{size} bytes of the volume image were copied'.format(size=transferred))
@@ -1,6 +1,5 @@
 from bootstrapvz.base import Task
 from .. import phases
-from ..tools import log_check_call
 from . import assets
 import os.path
 
@@ -17,20 +16,22 @@ class InstallInitScripts(Task):
                      stat.S_IRGRP                | stat.S_IXGRP |
                      stat.S_IROTH                | stat.S_IXOTH)
         from shutil import copy
+        commands = []
         for name, src in info.initd['install'].items():
             dst = os.path.join(info.root, 'etc/init.d', name)
             copy(src, dst)
             os.chmod(dst, rwxr_xr_x)
             if info.manifest.release > jessie:
-                log_check_call(['chroot', info.root, 'systemctl', 'enable', name])
+                commands.append(['systemctl', 'enable', name])
             else:
-                log_check_call(['chroot', info.root, 'insserv', '--default', name])
+                commands.append(['insserv', '--default', name])
 
         for name in info.initd['disable']:
             if info.manifest.release > jessie:
-                log_check_call(['chroot', info.root, 'systemctl', 'mask', name])
+                commands.append(['systemctl', 'mask', name])
             else:
-                log_check_call(['chroot', info.root, 'insserv', '--remove', name])
+                commands.append(['insserv', '--remove', name])
+        info.chroot.run_many(commands)
 
 
 class AddExpandRoot(Task):
@@ -61,15 +62,15 @@ class AdjustExpandRootScript(Task):
 
     @classmethod
     def run(cls, info):
-        from ..tools import sed_i
+        from ..tools import edit_file
         script = os.path.join(info.root, 'etc/init.d/expand-root')
 
         root_idx = info.volume.partition_map.root.get_index()
         root_index_line = 'root_index="{idx}"'.format(idx=root_idx)
-        sed_i(script, '^root_index="0"$', root_index_line)
 
         root_device_path = 'root_device_path="{device}"'.format(device=info.volume.device_path)
-        sed_i(script, '^root_device_path="/dev/xvda"$', root_device_path)
+        edit_file(script, [('^root_index="0"$', root_index_line),
+                           ('^root_device_path="/dev/xvda"$', root_device_path)])
 
 
 class AdjustGrowpartWorkaround(Task):
@@ -0,0 +1,63 @@
+from bootstrapvz.base import Task
+from .. import phases
+from . import filesystem
+from . import host
+import os
+
+
+class AddRequiredCommands(Task):
+    description = 'Adding commands required for assembling the image'
+    phase = phases.validation
+    successors = [host.CheckExternalCommands]
+
+    @classmethod
+    def run(cls, info):
+        info.host_dependencies['truncate'] = 'coreutils'
+        filesystems = set(partition.filesystem for partition in info.volume.partition_map.partitions)
+        if filesystems & set(['ext2', 'ext3', 'ext4']):
+            info.host_dependencies['mkfs.ext4'] = 'e2fsprogs'
+            info.host_dependencies['tune2fs'] = 'e2fsprogs'
+        if 'btrfs' in filesystems:
+            info.host_dependencies['mkfs.btrfs'] = 'btrfs-progs'
+        if 'swap' in filesystems:
+            info.host_dependencies['mkswap'] = 'util-linux'
+
+
+class CreateTree(Task):
+    description = 'Creating the directory the system is bootstrapped into'
+    phase = phases.volume_mounting
+
+    @classmethod
+    def run(cls, info):
+        from bootstrapvz.base.fs.partitions.single import SinglePartition
+        info.root = os.path.join(info.workspace, 'root')
+        os.makedirs(info.root)
+        # Create the mountpoints of the other partitions, their contents are moved out when the image is assembled
+        for partition in info.volume.partition_map.partitions:
+            if isinstance(partition, SinglePartition) or partition.filesystem in (None, 'swap'):
+                continue
+            mountpoint = os.path.join(info.root, partition.name)
+            if partition is not info.volume.partition_map.root and not os.path.isdir(mountpoint):
+                os.makedirs(mountpoint)
+
+
+class Assemble(Task):
+    description = 'Assembling the volume image'
+    phase = phases.volume_unmounting
+    predecessors = [filesystem.RemoveMountTable]
+
+    @classmethod
+    def run(cls, info):
+        info.volume.assemble(root=info.root)
+
+
+class DeleteTree(Task):
+    description = 'Deleting the directory the system was bootstrapped into'
+    phase = phases.volume_unmounting
+    predecessors = [Assemble]
+
+    @classmethod
+    def run(cls, info):
+        import shutil
+        shutil.rmtree(info.root)
+        del info.root
@@ -2,6 +2,8 @@ from bootstrapvz.base import Task
 from .. import phases
 from . import apt
 from ..tools import log_check_call
+import logging
+log = logging.getLogger(__name__)
 
 
 class AddManifestPackages(Task):
@@ -21,10 +23,63 @@ class AddManifestPackages(Task):
                 info.packages.add_local(package)
 
 
+class StartPrefetch(Task):
+    description = 'Downloading the packages to install in the background'
+    phase = phases.package_installation
+    predecessors = [apt.AptUpdate]
+    successors = [apt.AptUpgrade]
+
+    @classmethod
+    def run(cls, info):
+        import os
+        import re
+        from .. import prefetch
+        remote_packages = info.packages.remote()
+        if not remote_packages:
+            return
+        # Let apt resolve the dependencies, the URIs are printed for the packages that are not in its archive yet
+        output = log_check_call(['chroot', info.root,
+                                 'apt-get', 'install',
+                                            '--print-uris',
+                                            '--no-install-recommends',
+                                            '--assume-yes',
+                                            '--quiet=2'] +
+                                list(map(str, remote_packages)))
+        uris = prefetch.get_uris(output)
+        # Download through the same proxy apt is configured to use
+        proxy_config = log_check_call(['chroot', info.root,
+                                       'apt-config', 'shell', 'PROXY', 'Acquire::http::Proxy'])
+        match = re.match("^PROXY='(?P<proxy>.+)'$", ''.join(proxy_config).strip())
+        proxy = match.group('proxy') if match is not None else None
+        prefetch.start(os.path.join(info.workspace, 'prefetch'), uris,
+                       info.manifest.packages['prefetch'], proxy)
+
+
+class FinishPrefetch(Task):
+    description = 'Adding the downloaded packages to the package archive'
+    phase = phases.package_installation
+    predecessors = [apt.AptUpgrade]
+
+    @classmethod
+    def run(cls, info):
+        import os
+        import shutil
+        from .. import prefetch
+        path = os.path.join(info.workspace, 'prefetch')
+        downloaded = prefetch.finish(path)
+        archive = os.path.join(info.root, 'var/cache/apt/archives')
+        for name in downloaded:
+            if not os.path.exists(os.path.join(archive, name)):
+                shutil.move(os.path.join(path, name), os.path.join(archive, name))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        log.debug('Prefetched {count} packages'.format(count=len(downloaded)))
+
+
 class InstallPackages(Task):
     description = 'Installing packages'
     phase = phases.package_installation
-    predecessors = [apt.AptUpgrade]
+    predecessors = [apt.AptUpgrade, FinishPrefetch]
 
     @classmethod
     def run(cls, info):
@@ -52,7 +107,6 @@ class InstallPackages(Task):
                            list(map(str, remote_packages)),
                            env=env)
         except CalledProcessError as e:
-            import logging
             disk_stat = os.statvfs(info.root)
             root_free_mb = disk_stat.f_bsize * disk_stat.f_bavail / 1024 / 1024
             disk_stat = os.statvfs(os.path.join(info.root, 'boot'))
@@ -62,13 +116,13 @@ class InstallPackages(Task):
                 msg = ('apt exited with a non-zero status, '
                        'this may be because\nthe image volume is '
                        'running out of disk space ({free}MB left)').format(free=free_mb)
-                logging.getLogger(__name__).warn(msg)
+                log.warn(msg)
             else:
                 if e.returncode == 100:
                     msg = ('apt exited with status code 100. '
                            'This can sometimes occur when package retrieval times out or a package extraction failed. '
                            'apt might succeed if you try bootstrapping again.')
-                    logging.getLogger(__name__).warn(msg)
+                    log.warn(msg)
             raise
 
     @classmethod
@@ -101,10 +155,9 @@ class AddTaskselStandardPackages(Task):
     description = 'Adding standard packages from tasksel'
     phase = phases.package_installation
     predecessors = [apt.AptUpdate]
-    successors = [InstallPackages]
+    successors = [StartPrefetch, InstallPackages]
 
     @classmethod
     def run(cls, info):
         tasksel_packages = log_check_call(['chroot', info.root, 'tasksel', '--task-packages', 'standard'])
-        for pkg in tasksel_packages:
-            info.packages.add(pkg)
+        info.packages.add_many(tasksel_packages)
@@ -14,7 +14,6 @@ class AddRequiredCommands(Task):
     def run(cls, info):
         from bootstrapvz.base.fs.partitionmaps.none import NoPartitions
         if not isinstance(info.volume.partition_map, NoPartitions):
-            info.host_dependencies['parted'] = 'parted'
             info.host_dependencies['kpartx'] = 'kpartx'
 
 
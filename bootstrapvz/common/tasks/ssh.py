@@ -63,6 +63,7 @@ class AddSSHKeyGeneration(Task):
 class DisableSSHPasswordAuthentication(Task):
     description = 'Disabling SSH password authentication'
     phase = phases.system_modification
+    edits = ['etc/ssh/sshd_config']
 
     @classmethod
     def run(cls, info):
@@ -74,6 +75,7 @@ class DisableSSHPasswordAuthentication(Task):
 class EnableRootLogin(Task):
     description = 'Enabling SSH login for root'
     phase = phases.system_modification
+    edits = ['etc/ssh/sshd_config']
 
     @classmethod
     def run(cls, info):
@@ -90,6 +92,7 @@ class EnableRootLogin(Task):
 class DisableRootLogin(Task):
     description = 'Disabling SSH login for root'
     phase = phases.system_modification
+    edits = ['etc/ssh/sshd_config']
 
     @classmethod
     def run(cls, info):
@@ -106,12 +109,13 @@ class DisableRootLogin(Task):
 class DisableSSHDNSLookup(Task):
     description = 'Disabling sshd remote host name lookup'
     phase = phases.system_modification
+    edits = ['etc/ssh/sshd_config']
 
     @classmethod
     def run(cls, info):
+        from ..tools import append_file
         sshd_config_path = os.path.join(info.root, 'etc/ssh/sshd_config')
-        with open(sshd_config_path, 'a') as sshd_config:
-            sshd_config.write('UseDNS no')
+        append_file(sshd_config_path, 'UseDNS no')
 
 
 class ShredHostkeys(Task):
@@ -0,0 +1,124 @@
+from bootstrapvz.base import Task
+from .. import phases
+from ..tools import log_check_call
+from . import apt
+from . import packages
+import logging
+import os
+log = logging.getLogger(__name__)
+
+# The apt configuration that keeps dpkg from processing triggers after every package
+apt_conf = 'etc/apt/apt.conf.d/00bootstrap-vz-defer-triggers'
+# The commands that are replaced with a stub, which only records that they were called
+deferred_commands = ['usr/sbin/update-initramfs', 'usr/sbin/update-grub']
+# The file the stubs record their invocations in
+calls_log = 'var/lib/bootstrap-vz/deferred-calls'
+
+
+class DeferTriggers(Task):
+    description = 'Deferring dpkg triggers and initramfs and grub updates'
+    phase = phases.package_installation
+    predecessors = [apt.WriteConfiguration]
+    successors = [apt.AptUpdate, apt.AptUpgrade]
+
+    @classmethod
+    def run(cls, info):
+        # Packages are configured without running the triggers they activate,
+        # the triggers stay pending until they are processed in RunDeferredTriggers
+        with open(os.path.join(info.root, apt_conf), 'w') as conf:
+            conf.write('DPkg::NoTriggers "true";\n'
+                       'DPkg::ConfigurePending "false";\n'
+                       'DPkg::TriggersPending "false";\n')
+        # man-db rebuilds its database whenever a package is installed, not just when its trigger runs
+        log_check_call(['chroot', info.root, 'debconf-set-selections'],
+                       stdin='man-db man-db/auto-update boolean false')
+        auto_update = os.path.join(info.root, 'var/lib/man-db/auto-update')
+        if os.path.exists(auto_update):
+            os.remove(auto_update)
+
+        os.makedirs(os.path.join(info.root, os.path.dirname(calls_log)))
+        for command in deferred_commands:
+            # The command is moved out of the way, including when it is installed later on
+            log_check_call(['chroot', info.root,
+                            'dpkg-divert', '--local', '--rename', '--add', '/' + command])
+            stub_path = os.path.join(info.root, command)
+            with open(stub_path, 'w') as stub:
+                stub.write('#!/bin/sh\n'
+                           'echo {name} "$@" >> /{calls_log}\n'
+                           'exit 0\n'.format(name=os.path.basename(command), calls_log=calls_log))
+            os.chmod(stub_path, 0o755)
+
+
+class RunDeferredTriggers(Task):
+    description = 'Running the deferred dpkg triggers and initramfs and grub updates'
+    # The initramfs is updated (kernel.UpdateInitramfs) and the grub configuration generated
+    # when the system is modified, only the initramfs of new kernels is created here
+    phase = phases.package_installation
+    predecessors = [packages.InstallPackages]
+
+    @classmethod
+    def run(cls, info):
+        calls = get_calls(os.path.join(info.root, calls_log))
+        os.remove(os.path.join(info.root, apt_conf))
+        log_check_call(['chroot', info.root, 'debconf-set-selections'],
+                       stdin='man-db man-db/auto-update boolean true')
+        if os.path.isdir(os.path.join(info.root, 'var/lib/man-db')):
+            open(os.path.join(info.root, 'var/lib/man-db/auto-update'), 'w').close()
+        for command in deferred_commands:
+            os.remove(os.path.join(info.root, command))
+            log_check_call(['chroot', info.root,
+                            'dpkg-divert', '--local', '--rename', '--remove', '/' + command])
+        os.remove(os.path.join(info.root, calls_log))
+        os.rmdir(os.path.join(info.root, os.path.dirname(calls_log)))
+
+        # Every package with pending triggers would have processed them after each apt run
+        pending = [line.split()[1] for line in
+                   log_check_call(['chroot', info.root,
+                                   'dpkg-query', '--show', '--showformat', '${db:Status-Abbrev} ${Package}\\n'])
+                   if line[1:2] in ('t', 'W')]
+        log_check_call(['chroot', info.root, 'dpkg', '--configure', '--pending'])
+
+        runs = {}
+        if calls.get('update-initramfs', 0):
+            # `update-initramfs -u -k all' only updates the initramfs of kernels that already have one
+            versions = get_kernels_without_initramfs(info.root)
+            for version in versions:
+                log_check_call(['chroot', info.root, 'update-initramfs', '-c', '-k', version])
+            runs['update-initramfs'] = len(versions)
+
+        log.info('Processed the triggers of {count} packages once'.format(count=len(pending)))
+        for name, count in sorted(calls.items()):
+            log.info('{name} ran {runs} times instead of {count}, {saved} runs were saved'
+                     .format(name=name, runs=runs.get(name, 0), count=count, saved=count - runs.get(name, 0)))
+
+
+def get_calls(path):
+    """Counts how often the deferred commands were called
+
+    :param str path: Path to the file the stubs record their invocations in
+    :return: The number of invocations of every command that was called
+    :rtype: dict
+    """
+    calls = {}
+    if not os.path.exists(path):
+        return calls
+    with open(path) as stream:
+        for line in stream:
+            if line.strip():
+                name = line.split()[0]
+                calls[name] = calls.get(name, 0) + 1
+    return calls
+
+
+def get_kernels_without_initramfs(root):
+    """Returns the versions of the kernels installed in /boot that have no initramfs
+
+    :param str root: Path to the root filesystem
+    :rtype: list
+    """
+    boot = os.path.join(root, 'boot')
+    if not os.path.isdir(boot):
+        return []
+    names = os.listdir(boot)
+    return sorted(name[len('vmlinuz-'):] for name in names
+                  if name.startswith('vmlinuz-') and 'initrd.img-' + name[len('vmlinuz-'):] not in names)
@@ -1,9 +1,11 @@
 
+from contextlib import contextmanager
 import os
+import threading
 
 
-def log_check_call(command, stdin=None, env=None, shell=False, cwd=None):
-    status, stdout, stderr = log_call(command, stdin, env, shell, cwd)
+def log_check_call(command, stdin=None, env=None, shell=False, cwd=None, max_lines=None, output_handler=None):
+    status, stdout, stderr = log_call(command, stdin, env, shell, cwd, max_lines, output_handler)
     from subprocess import CalledProcessError
     if status != 0:
         e = CalledProcessError(status, ' '.join(command), '\n'.join(stderr))
@@ -15,10 +17,41 @@ def log_check_call(command, stdin=None, env=None, shell=False, cwd=None):
     return stdout
 
 
-def log_call(command, stdin=None, env=None, shell=False, cwd=None):
-    import subprocess
+def log_call(command, stdin=None, env=None, shell=False, cwd=None, max_lines=None, output_handler=None):
+    """Runs a command and logs its output, stdout is logged as debug output and stderr as errors.
+
+    :param list command: The command to run
+    :param str stdin: Input for the command
+    :param dict env: The environment to run the command in
+    :param bool shell: Whether to run the command through the shell
+    :param str cwd: The directory to run the command in
+    :param int max_lines: Only keep the last ``max_lines`` lines of stdout and stderr (all lines are still logged)
+    :param function output_handler: Called with the name of the stream (stdout or stderr) and the line
+                                    for every line of output, while the command is running
+    :return: The exit status, the lines written to stdout and the lines written to stderr
+    :rtype: tuple
+    """
+    from bootstrapvz.base import trace
+    if isinstance(command, list):
+        name = os.path.basename(command[0])
+        # Commands run inside the bootstrapped system are named after the command, not after chroot
+        if name == 'chroot' and len(command) > 2:
+            name += ' ' + os.path.basename(command[2])
+    else:
+        name = command.split(' ', 1)[0]
+    with trace.span('command', name, argv=command) as args:
+        status, stdout, stderr, output_bytes = _log_call(command, stdin, env, shell, cwd, max_lines, output_handler)
+        args['status'] = status
+        args['stdout_bytes'] = output_bytes['stdout']
+        args['stderr_bytes'] = output_bytes['stderr']
+    return status, stdout, stderr
+
+
+def _log_call(command, stdin, env, shell, cwd, max_lines, output_handler):
+    import collections
     import logging
-    from multiprocessing.dummy import Pool as ThreadPool
+    import selectors
+    import subprocess
     from os.path import realpath
 
     command_log = realpath(command[0]).replace('/', '.')
@@ -33,60 +66,190 @@ def log_call(command, stdin=None, env=None, shell=False, cwd=None):
                                stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE)
 
+    # A single selector multiplexes the input and both outputs of the command,
+    # lines are logged in the order they are written.
+    selector = selectors.DefaultSelector()
     if stdin is not None:
         log.debug('  stdin: ' + stdin)
-        process.stdin.write((stdin + "\n").encode("utf-8"))
-        process.stdin.flush()
-    process.stdin.close()
-
-    stdout = []
-    stderr = []
-
-    def handle_stdout(line):
-        log.debug(line)
-        stdout.append(line)
-
-    def handle_stderr(line):
-        log.error(line)
-        stderr.append(line)
+        pending_input = memoryview((stdin + "\n").encode("utf-8"))
+        os.set_blocking(process.stdin.fileno(), False)
+        selector.register(process.stdin, selectors.EVENT_WRITE)
+    else:
+        process.stdin.close()
 
-    handlers = {process.stdout: handle_stdout,
-                process.stderr: handle_stderr}
+    output = {'stdout': collections.deque(maxlen=max_lines),
+              'stderr': collections.deque(maxlen=max_lines)}
+    output_bytes = {'stdout': 0, 'stderr': 0}
+    log_fns = {'stdout': log.debug,
+               'stderr': log.error}
+    partial_lines = {'stdout': b'', 'stderr': b''}
+    selector.register(process.stdout, selectors.EVENT_READ, 'stdout')
+    selector.register(process.stderr, selectors.EVENT_READ, 'stderr')
 
-    def stream_readline(stream):
-        for line in stream:
-            handlers[stream](line.decode("utf-8").strip())
+    def handle_line(stream, line):
+        line = line.decode("utf-8", "replace").strip()
+        log_fns[stream](line)
+        output[stream].append(line)
+        if output_handler is not None:
+            output_handler(stream, line)
 
-    pool = ThreadPool(2)
-    pool.map(stream_readline, [process.stdout, process.stderr])
-    pool.close()
-    pool.join()
+    while selector.get_map():
+        for key, _ in selector.select():
+            if key.fileobj is process.stdin:
+                try:
+                    written = os.write(key.fd, pending_input)
+                except BrokenPipeError:
+                    # The command does not read all of its input
+                    written = len(pending_input)
+                pending_input = pending_input[written:]
+                if not pending_input:
+                    selector.unregister(process.stdin)
+                    process.stdin.close()
+                continue
+            stream = key.data
+            data = os.read(key.fd, 65536)
+            if not data:
+                # End of file, flush the last line if it was not terminated
+                selector.unregister(key.fileobj)
+                if partial_lines[stream]:
+                    handle_line(stream, partial_lines[stream])
+                continue
+            output_bytes[stream] += len(data)
+            lines = (partial_lines[stream] + data).split(b'\n')
+            partial_lines[stream] = lines.pop()
+            for line in lines:
+                handle_line(stream, line)
+    selector.close()
+    process.stdout.close()
+    process.stderr.close()
     process.wait()
-    return process.returncode, stdout, stderr
+    return process.returncode, list(output['stdout']), list(output['stderr']), output_bytes
 
 
 def sed_i(file_path, pattern, subst, expected_replacements=1):
-    replacement_count = inline_replace(file_path, pattern, subst)
-    if replacement_count != expected_replacements:
-        from .exceptions import UnexpectedNumMatchesError
-        msg = ('There were {real} instead of {expected} matches for '
-               'the expression `{exp}\' in the file `{path}\''
-               .format(real=replacement_count, expected=expected_replacements,
-                       exp=pattern, path=file_path))
-        raise UnexpectedNumMatchesError(msg)
+    edit_file(file_path, [(pattern, subst, expected_replacements)])
 
 
 def inline_replace(file_path, pattern, subst):
-    import fileinput
-    import re
-    replacement_count = 0
-    for line in fileinput.input(files=file_path, inplace=True):
-        (replacement, count) = re.subn(pattern, subst, line)
-        replacement_count += count
-        print(replacement, end='')
+    [replacement_count] = edit_file(file_path, [(pattern, subst, None)])
     return replacement_count
 
 
+# The contents of the files that are edited inside batched_edits(), keyed by path.
+# None until a batched file has been read.
+edit_batch = {}
+# Guards the batch and the files that are edited, tasks may run concurrently
+edit_lock = threading.Lock()
+
+
+def edit_file(file_path, substitutions):
+    """Applies several substitutions to a file, the file is read and written only once.
+    Like sed, the patterns are matched against every line of the file.
+    The file is replaced atomically and only if every substitution made the expected number of replacements.
+
+    :param str file_path: Path to the file
+    :param list substitutions: Tuples of a pattern, its replacement and optionally the number
+                               of expected replacements (1 by default, None accepts any number)
+    :return: The number of replacements made by every substitution
+    :rtype: list
+    :raises UnexpectedNumMatchesError: When a substitution made an unexpected number of replacements
+    """
+    import re
+    with edit_lock:
+        lines = _read_lines(file_path)
+        replacement_counts = []
+        for substitution in substitutions:
+            pattern, subst = substitution[:2]
+            expected_replacements = substitution[2] if len(substitution) > 2 else 1
+            regex = re.compile(pattern)
+            replacement_count = 0
+            for i, line in enumerate(lines):
+                lines[i], count = regex.subn(subst, line)
+                replacement_count += count
+            if expected_replacements is not None and replacement_count != expected_replacements:
+                from .exceptions import UnexpectedNumMatchesError
+                msg = ('There were {real} instead of {expected} matches for '
+                       'the expression `{exp}\' in the file `{path}\''
+                       .format(real=replacement_count, expected=expected_replacements,
+                               exp=pattern, path=file_path))
+                raise UnexpectedNumMatchesError(msg)
+            replacement_counts.append(replacement_count)
+        _write_lines(file_path, lines)
+    return replacement_counts
+
+
+def append_file(file_path, content):
+    """Appends to a file, like edit_file() the file is replaced atomically
+
+    :param str file_path: Path to the file
+    :param str content: The text to append
+    """
+    with edit_lock:
+        lines = _read_lines(file_path)
+        lines.append(content)
+        _write_lines(file_path, lines)
+
+
+def _read_lines(file_path):
+    if edit_batch.get(file_path) is not None:
+        return list(edit_batch[file_path])
+    with open(file_path) as stream:
+        return stream.readlines()
+
+
+def _write_lines(file_path, lines):
+    if file_path in edit_batch:
+        edit_batch[file_path] = lines
+    else:
+        replace_file(file_path, ''.join(lines))
+
+
+@contextmanager
+def batched_edits(file_paths):
+    """Keeps the given files in memory while they are edited with edit_file(), sed_i(), inline_replace()
+    and append_file() in the body of the with statement, every edited file is written once afterwards.
+    The files must not be read or written by other means before the body has been left.
+    Other files are still written immediately, files that are already batched are written
+    when the enclosing with statement is left.
+
+    :param list file_paths: The paths of the files to batch, as they are passed to edit_file()
+    """
+    with edit_lock:
+        added = [path for path in file_paths if path not in edit_batch]
+        for path in added:
+            edit_batch[path] = None
+    try:
+        yield
+    finally:
+        with edit_lock:
+            edited = [(path, edit_batch.pop(path)) for path in added]
+            for path, lines in edited:
+                if lines is not None:
+                    replace_file(path, ''.join(lines))
+
+
+def replace_file(file_path, content):
+    """Atomically replaces the contents of a file, its permissions and ownership are preserved
+
+    :param str file_path: Path to the file
+    :param str content: The new contents
+    """
+    import tempfile
+    stat = os.stat(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path),
+                                    prefix='.' + os.path.basename(file_path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as stream:
+            stream.write(content)
+            # Change the owner first, it clears the setuid and setgid bits
+            os.fchown(stream.fileno(), stat.st_uid, stat.st_gid)
+            os.fchmod(stream.fileno(), stat.st_mode & 0o7777)
+        os.rename(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
 def load_json(path):
     import json5 as json
     with open(path) as stream:
@@ -119,7 +282,7 @@ def config_get(path, config_path):
 
 
 def copy_tree(from_path, to_path):
-    from shutil import copy
+    from .filecopy import copy_file
     for abs_prefix, dirs, files in os.walk(from_path):
         prefix = os.path.normpath(os.path.relpath(abs_prefix, from_path))
         for path in dirs:
@@ -131,9 +294,35 @@ def copy_tree(from_path, to_path):
                     os.remove(full_path)
             os.mkdir(full_path)
         for path in files:
-            copy(os.path.join(abs_prefix, path),
-                 os.path.join(to_path, prefix, path))
+            copy_file(os.path.join(abs_prefix, path),
+                      os.path.join(to_path, prefix, path))
 
 
 def rel_path(base, path):
     return os.path.normpath(os.path.join(os.path.dirname(base), path))
+
+
+def file_lock(path, shared=False, blocking=True):
+    """Returns a context manager that holds an exclusive lock on the given file,
+    the file is created if it does not exist.
+    The lock is shared by all processes on the host, so it can be used to coordinate concurrent builds.
+
+    :param str path: Path to the lock file
+    :param bool shared: Whether to hold a shared lock, which only excludes exclusive locks
+    :param bool blocking: Whether to wait for the lock, if False BlockingIOError is raised when it is held
+    """
+    from contextlib import contextmanager
+    import fcntl
+
+    @contextmanager
+    def lock():
+        with open(path, 'a') as lock_file:
+            operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            if not blocking:
+                operation |= fcntl.LOCK_NB
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return lock()
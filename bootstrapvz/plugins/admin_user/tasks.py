@@ -44,11 +44,9 @@ class CreateAdminUser(Task):
 
     @classmethod
     def run(cls, info):
-        from bootstrapvz.common.tools import log_check_call
-        log_check_call(['chroot', info.root,
-                        'useradd',
-                        '--create-home', '--shell', '/bin/bash',
-                        info.manifest.plugins['admin_user']['username']])
+        info.chroot.run(['useradd',
+                         '--create-home', '--shell', '/bin/bash',
+                         info.manifest.plugins['admin_user']['username']])
 
 
 class PasswordlessSudo(Task):
@@ -73,13 +71,12 @@ class AdminUserPassword(Task):
 
     @classmethod
     def run(cls, info):
-        from bootstrapvz.common.tools import log_check_call
         if info.manifest.plugins['admin_user']['password'] == '':
-            log_check_call(['chroot', info.root, 'passwd', '-d', info.manifest.plugins['admin_user']['username']])
+            info.chroot.run(['passwd', '-d', info.manifest.plugins['admin_user']['username']])
         else:
-            log_check_call(['chroot', info.root, 'chpasswd'],
-                           info.manifest.plugins['admin_user']['username'] +
-                           ':' + info.manifest.plugins['admin_user']['password'])
+            info.chroot.run(['chpasswd'],
+                            info.manifest.plugins['admin_user']['username'] +
+                            ':' + info.manifest.plugins['admin_user']['password'])
 
 
 class AdminUserPublicKey(Task):
@@ -125,9 +122,8 @@ class AdminUserPublicKey(Task):
 
         # Set the owner of the authorized keys file
         # (must be through chroot, the host system doesn't know about the user)
-        from bootstrapvz.common.tools import log_check_call
-        log_check_call(['chroot', info.root,
-                        'chown', '-R', (username + ':' + username), ssh_dir_rel])
+        from bootstrapvz.common.chroot import Chown
+        info.chroot.run_many([Chown(os.path.join('/', ssh_dir_rel), username, username, recursive=True)])
 
 
 class AdminUserPublicKeyEC2(Task):
@@ -92,7 +92,7 @@ class RemoveAnsibleSSHUserDir(Task):
         ssh_user = info.manifest.plugins['ansible']['extra_vars']['ansible_ssh_user']
         # os.path.expanduser does not work in a chroot,
         # so we use sh instead
-        [ssh_user_home] = log_check_call(['chroot', info.root, 'sh', '-c', 'echo ~' + ssh_user])
+        [ssh_user_home] = info.chroot.run(['sh', '-c', 'echo ~' + ssh_user])
         from shutil import rmtree
         # [1:] to remove the leading slash from e.g. /home/ansible
         ansible_dir_path = os.path.join(info.root, ssh_user_home[1:], '.ansible')
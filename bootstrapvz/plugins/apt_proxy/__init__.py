@@ -5,7 +5,39 @@ def validate_manifest(data, validator, error):
 
 def resolve_tasks(taskset, manifest):
     from . import tasks
-    taskset.add(tasks.CheckAptProxy)
     taskset.add(tasks.SetAptProxy)
+    if 'embedded' in manifest.plugins['apt_proxy']:
+        taskset.add(tasks.StartAptProxy)
+        taskset.add(tasks.StopAptProxy)
+        taskset.add(tasks.RemoveAptProxy)
+        return
+    taskset.add(tasks.CheckAptProxy)
     if not manifest.plugins['apt_proxy'].get('persistent', False):
         taskset.add(tasks.RemoveAptProxy)
+
+
+def resolve_rollback_tasks(taskset, manifest, completed, counter_task):
+    from . import tasks
+    counter_task(taskset, tasks.StartAptProxy, tasks.StopAptProxy)
+
+
+def start_batch(manifest):
+    """Starts the embedded proxy before the builds are forked, so that all builds share it
+    """
+    if 'embedded' in manifest.plugins['apt_proxy']:
+        from . import server, tasks
+        server.acquire(tasks.get_cache_dir(manifest), **tasks.get_cache_limits(manifest))
+
+
+def stop_batch(manifest):
+    if 'embedded' in manifest.plugins['apt_proxy']:
+        from . import server, tasks
+        server.release(tasks.get_cache_dir(manifest))
+
+
+def resume(info):
+    """Restarts the embedded proxy when a build is resumed or restored from a snapshot
+    """
+    if 'url' in info._apt_proxy:
+        from . import tasks
+        tasks.restart_proxy(info)
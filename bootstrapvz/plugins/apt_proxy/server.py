@@ -0,0 +1,420 @@
+"""The server module implements the embedded caching proxy that debootstrap and apt download packages through.
+Packages never change once they are in the pool of a mirror, so they are served from the cache without asking
+the mirror, their contents are stored by their sha256 checksum. The indices in dists/ are revalidated with
+a conditional request every time they are requested. Anything else is passed through without being cached.
+When the proxy is stopped, the cache is pruned by age and size like the package archive cache
+(see bootstrapvz.common.archivecache).
+"""
+import logging
+import os
+import threading
+log = logging.getLogger(__name__)
+
+# The proxies that are running, keyed by their cache directory
+proxies = {}
+# Guards proxies
+lock = threading.Lock()
+
+
+def acquire(cache_dir, port=None, max_size=None, max_age=None):
+    """Returns the URL of the proxy for a cache directory, the proxy is started if it is not running yet.
+    A proxy that was started by the parent of a (forked) build process is shared with that build.
+
+    :param str cache_dir: The directory the proxy stores the downloaded files in
+    :param int port: The port the proxy should listen on if it is started, any free port is used if it is taken
+    :param Bytes max_size: The maximum size of the cache, no files are evicted for their size if None
+    :param int max_age: The number of days after which unused files are removed, never if None
+    :return: The URL of the proxy
+    :rtype: str
+    """
+    with lock:
+        entry = proxies.get(cache_dir)
+        if entry is None:
+            proxy = CachingProxy(cache_dir, port=port or 0, max_size=max_size, max_age=max_age)
+            try:
+                proxy.start()
+            except OSError:
+                if not port:
+                    raise
+                log.debug('The port {port} is taken, the APT proxy listens on another port'.format(port=port))
+                proxy = CachingProxy(cache_dir, max_size=max_size, max_age=max_age)
+                proxy.start()
+            entry = proxies[cache_dir] = {'proxy': proxy, 'pid': os.getpid(), 'users': 0}
+        entry['users'] += 1
+        return entry['proxy'].url
+
+
+def release(cache_dir):
+    """Stops the proxy for a cache directory once it is no longer used by anyone in this process.
+    The statistics of the proxy are logged when it is stopped.
+
+    :param str cache_dir: The directory the proxy stores the downloaded files in
+    """
+    with lock:
+        entry = proxies.get(cache_dir)
+        if entry is None or entry['pid'] != os.getpid():
+            # The proxy is owned by the parent process
+            return
+        entry['users'] -= 1
+        if entry['users'] > 0:
+            return
+        del proxies[cache_dir]
+    entry['proxy'].stop()
+    log.info(entry['proxy'].get_summary())
+
+
+class CachingProxy(object):
+    """An HTTP proxy that caches packages and indices of Debian mirrors.
+    The proxy serves the requests in an asyncio event loop that runs in its own thread,
+    the files are downloaded in the default executor of that loop.
+    """
+
+    def __init__(self, cache_dir, address='127.0.0.1', port=0, max_size=None, max_age=None):
+        """
+        :param str cache_dir: The directory the downloaded files are stored in
+        :param str address: The address to listen on
+        :param int port: The port to listen on, a free port is chosen if 0
+        :param Bytes max_size: The maximum size of the cache, no files are evicted for their size if None
+        :param int max_age: The number of days after which unused files are removed, never if None
+        """
+        self.cache_dir = cache_dir
+        self.address = address
+        self.port = port
+        self.max_size = max_size
+        self.max_age = max_age
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'passed': 0, 'errors': 0,
+                      'bytes_cached': 0, 'bytes_downloaded': 0}
+        self.loop = None
+        self.server = None
+        self.thread = None
+        # Locks for the URLs that are being downloaded, so that concurrent requests only download a file once.
+        # Every lock is counted with the requests that use it and dropped with the last of them.
+        self.downloads = {}
+        self.downloads_lock = threading.Lock()
+        # Guards the statistics, files are fetched concurrently
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://{address}:{port}'.format(address=self.address, port=self.port)
+
+    def start(self):
+        """Starts serving requests in a new thread
+        """
+        import asyncio
+        for path in ['blobs', 'urls', 'tmp']:
+            if not os.path.isdir(os.path.join(self.cache_dir, path)):
+                os.makedirs(os.path.join(self.cache_dir, path))
+        started = threading.Event()
+        errors = []
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self.handle, self.address, self.port))
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                return
+            self.port = self.server.sockets[0].getsockname()[1]
+            started.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                self.server.close()
+                self.loop.run_until_complete(self.server.wait_closed())
+                self.loop.close()
+
+        self.thread = threading.Thread(target=serve, name='apt-proxy')
+        # The proxy must never keep a failed build from exiting
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        log.debug('The APT proxy is listening on ' + self.url)
+
+    def stop(self):
+        """Stops serving requests, waits for the thread to finish and prunes the cache
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.prune()
+
+    def prune(self):
+        """Removes the files that have not been served for longer than the maximum age and then
+        the least recently served files until the cache fits within its size limit.
+        The URLs of the removed files are forgotten as well.
+        """
+        if self.max_size is None and self.max_age is None:
+            return
+        import json
+        import time
+        blobs = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.cache_dir, 'blobs')):
+            for name in filenames:
+                stat = os.stat(os.path.join(dirpath, name))
+                blobs.append((stat.st_mtime, stat.st_size, os.path.join(dirpath, name)))
+        blobs.sort()
+        total = sum(size for _, size, _ in blobs)
+        removed = 0
+        for mtime, size, path in blobs:
+            expired = self.max_age is not None and mtime < time.time() - self.max_age * 24 * 60 * 60
+            oversized = self.max_size is not None and total > self.max_size.get_qty_in('B')
+            if not expired and not oversized:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        if not removed:
+            return
+        urls_path = os.path.join(self.cache_dir, 'urls')
+        for name in os.listdir(urls_path):
+            try:
+                with open(os.path.join(urls_path, name)) as stream:
+                    checksum = json.load(stream)['sha256']
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+            if not os.path.isfile(self.get_blob_path(checksum)):
+                os.remove(os.path.join(urls_path, name))
+        log.debug('Removed {count} files from the APT proxy cache'.format(count=removed))
+
+    def get_summary(self):
+        """Returns a summary of the statistics of the proxy
+
+        :rtype: str
+        """
+        from bootstrapvz.common.bytes import Bytes
+        return ('APT proxy: {hits} hits, {misses} misses, {revalidated} revalidated, {passed} passed through, '
+                '{errors} errors, {cached} served from the cache, {downloaded} downloaded'
+                .format(cached=Bytes(self.stats['bytes_cached']), downloaded=Bytes(self.stats['bytes_downloaded']),
+                        **self.stats))
+
+    async def handle(self, reader, writer):
+        """Serves the requests of a client connection, apt pipelines several requests on one connection
+
+        :param asyncio.StreamReader reader: Reads from the client
+        :param asyncio.StreamWriter writer: Writes to the client
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                method, url, version = request_line.decode('latin-1').split()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                if method not in ['GET', 'HEAD'] or not url.startswith('http://'):
+                    await self.respond(writer, 501, {}, None, keep_alive)
+                    continue
+                status, response_headers, body = await self.loop.run_in_executor(None, self.fetch, url)
+                if (status == 200 and 'if-modified-since' in headers and
+                        headers['if-modified-since'] == response_headers.get('Last-Modified')):
+                    status, body = 304, None
+                await self.respond(writer, status, response_headers, body, keep_alive, method == 'HEAD')
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError) as e:
+            log.debug('Dropping the connection to an APT proxy client: {error}'.format(error=e))
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, headers, body, keep_alive, head=False):
+        """Writes a response to the client
+
+        :param asyncio.StreamWriter writer: Writes to the client
+        :param int status: The HTTP status code
+        :param dict headers: Additional headers
+        :param body: The path to the file that is sent as the body, the body itself (bytes) or None
+        :param bool keep_alive: Whether the connection is kept open
+        :param bool head: Whether only the headers are sent
+        """
+        from http.client import responses
+        if body is None:
+            length = 0
+        elif isinstance(body, bytes):
+            length = len(body)
+        else:
+            length = os.path.getsize(body)
+        lines = ['HTTP/1.1 {status} {reason}'.format(status=status, reason=responses.get(status, 'Unknown')),
+                 'Content-Length: {length}'.format(length=length),
+                 'Connection: ' + ('keep-alive' if keep_alive else 'close'),
+                 ] + ['{name}: {value}'.format(name=name, value=value) for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if head or body is None:
+            pass
+        elif isinstance(body, bytes):
+            writer.write(body)
+        else:
+            with open(body, 'rb') as stream:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    writer.write(chunk)
+                    await writer.drain()
+        await writer.drain()
+
+    def fetch(self, url):
+        """Returns a file from the cache, downloading or revalidating it first when necessary
+
+        :param str url: The URL of the file
+        :return: The HTTP status, the headers to relay and the body (see respond())
+        :rtype: tuple
+        """
+        with self.downloads_lock:
+            download = self.downloads.get(url)
+            if download is None:
+                download = self.downloads[url] = {'lock': threading.Lock(), 'users': 0}
+            download['users'] += 1
+        try:
+            with download['lock']:
+                return self.fetch_locked(url)
+        except Exception as e:
+            log.warn('The APT proxy failed to fetch {url}: {error}'.format(url=url, error=e))
+            self.count('errors')
+            return 502, {}, None
+        finally:
+            with self.downloads_lock:
+                download['users'] -= 1
+                if download['users'] == 0:
+                    del self.downloads[url]
+
+    def fetch_locked(self, url):
+        import urllib.error
+        entry = self.get_entry(url)
+        if '/pool/' in url or '/by-hash/' in url:
+            # Packages and files addressed by their checksum never change
+            if entry is not None:
+                self.count('hits', entry['size'])
+                return 200, self.get_headers(entry), self.serve(entry)
+        elif '/dists/' not in url:
+            try:
+                response = self.open(url, {})
+            except urllib.error.HTTPError as e:
+                self.count('errors')
+                return e.code, {}, None
+            body = response.read()
+            self.count('passed', downloaded_bytes=len(body))
+            return 200, {}, body
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = self.open(url, headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                self.count('revalidated', entry['size'])
+                return 200, self.get_headers(entry), self.serve(entry)
+            self.count('errors')
+            return e.code, {}, None
+        except (urllib.error.URLError, IOError, OSError) as e:
+            if entry is not None:
+                log.warn('Unable to revalidate {url}, serving it from the cache: {error}'.format(url=url, error=e))
+                self.count('hits', entry['size'])
+                return 200, self.get_headers(entry), self.serve(entry)
+            raise
+        entry = self.store(url, response)
+        self.count('misses', downloaded_bytes=entry['size'])
+        return 200, self.get_headers(entry), self.get_blob_path(entry['sha256'])
+
+    def open(self, url, headers):
+        """Requests a file from the mirror, bypassing any proxy configured in the environment
+
+        :param str url: The URL of the file
+        :param dict headers: The request headers
+        :rtype: http.client.HTTPResponse
+        """
+        import urllib.request
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        return opener.open(urllib.request.Request(url, headers=headers), timeout=60)
+
+    def store(self, url, response):
+        """Stores a downloaded file in the cache
+
+        :param str url: The URL of the file
+        :param http.client.HTTPResponse response: The response of the mirror
+        :return: The cache entry of the file
+        :rtype: dict
+        """
+        import hashlib
+        import json
+        import tempfile
+        checksum = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.cache_dir, 'tmp'))
+        with os.fdopen(fd, 'wb') as stream:
+            for chunk in iter(lambda: response.read(1024 * 1024), b''):
+                checksum.update(chunk)
+                size += len(chunk)
+                stream.write(chunk)
+        entry = {'url': url,
+                 'sha256': checksum.hexdigest(),
+                 'size': size,
+                 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified'),
+                 }
+        blob_path = self.get_blob_path(entry['sha256'])
+        if not os.path.isdir(os.path.dirname(blob_path)):
+            os.makedirs(os.path.dirname(blob_path))
+        # Blobs are content-addressed, an existing blob with the same checksum has the same contents
+        os.rename(tmp_path, blob_path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.cache_dir, 'tmp'))
+        with os.fdopen(fd, 'w') as stream:
+            json.dump(entry, stream)
+        os.rename(tmp_path, self.get_entry_path(url))
+        return entry
+
+    def get_entry(self, url):
+        """Returns the cache entry of a URL
+
+        :param str url: The URL
+        :return: The entry or None if the URL has not been cached or its file is missing
+        :rtype: dict
+        """
+        import json
+        try:
+            with open(self.get_entry_path(url)) as stream:
+                entry = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return None
+        if not os.path.isfile(self.get_blob_path(entry['sha256'])):
+            return None
+        return entry
+
+    def serve(self, entry):
+        """Returns the path to the file of a cache entry and marks the file as recently used
+
+        :param dict entry: The cache entry
+        :rtype: str
+        """
+        blob_path = self.get_blob_path(entry['sha256'])
+        os.utime(blob_path, None)
+        return blob_path
+
+    def get_entry_path(self, url):
+        import hashlib
+        return os.path.join(self.cache_dir, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get_blob_path(self, checksum):
+        return os.path.join(self.cache_dir, 'blobs', checksum[:2], checksum)
+
+    def get_headers(self, entry):
+        if entry.get('last_modified'):
+            return {'Last-Modified': entry['last_modified']}
+        return {}
+
+    def count(self, kind, cached_bytes=0, downloaded_bytes=0):
+        with self.stats_lock:
+            self.stats[kind] += 1
+            self.stats['bytes_cached'] += cached_bytes
+            self.stats['bytes_downloaded'] += downloaded_bytes
@@ -27,6 +27,62 @@ class CheckAptProxy(Task):
                 log.warning('The APT proxy server couldn\'t be reached. `apt-get\' commands may fail.')
 
 
+def get_cache_dir(manifest):
+    embedded = manifest.plugins['apt_proxy']['embedded']
+    return embedded.get('cache_dir', os.path.join(manifest.bootstrapper['workspace'], 'apt_proxy'))
+
+
+def get_cache_limits(manifest):
+    from bootstrapvz.common.bytes import Bytes
+    embedded = manifest.plugins['apt_proxy']['embedded']
+    max_size = embedded.get('max_size', None)
+    return {'max_size': None if max_size is None else Bytes(max_size),
+            'max_age': embedded.get('max_age', None),
+            }
+
+
+class StartAptProxy(Task):
+    description = 'Starting the embedded APT proxy'
+    phase = phases.preparation
+
+    @classmethod
+    def run(cls, info):
+        from . import server
+        url = server.acquire(get_cache_dir(info.manifest), **get_cache_limits(info.manifest))
+        info._apt_proxy['url'] = url
+        # debootstrap downloads with wget, which picks up the proxy from the environment
+        info.bootstrap_env['http_proxy'] = url
+
+
+def restart_proxy(info):
+    from . import server
+    from urllib.parse import urlparse
+    # The proxy is started on the port it used before, the apt configuration then stays valid
+    url = server.acquire(get_cache_dir(info.manifest), urlparse(info._apt_proxy['url']).port,
+                         **get_cache_limits(info.manifest))
+    info._apt_proxy['url'] = url
+    info.bootstrap_env['http_proxy'] = url
+    proxy_path = os.path.join(info.root, 'etc/apt/apt.conf.d/02proxy')
+    if os.path.isfile(proxy_path):
+        write_proxy_config(proxy_path, url)
+
+
+def write_proxy_config(proxy_path, url):
+    with open(proxy_path, 'w') as proxy_file:
+        proxy_file.write('Acquire::http {{ Proxy "{url}"; }};\n'.format(url=url))
+
+
+class StopAptProxy(Task):
+    description = 'Stopping the embedded APT proxy'
+    phase = phases.cleaning
+
+    @classmethod
+    def run(cls, info):
+        from . import server
+        server.release(get_cache_dir(info.manifest))
+        del info.bootstrap_env['http_proxy']
+
+
 class SetAptProxy(Task):
     description = 'Setting proxy for APT'
     phase = phases.package_installation
@@ -35,6 +91,9 @@ class SetAptProxy(Task):
     @classmethod
     def run(cls, info):
         proxy_path = os.path.join(info.root, 'etc/apt/apt.conf.d/02proxy')
+        if 'embedded' in info.manifest.plugins['apt_proxy']:
+            write_proxy_config(proxy_path, info._apt_proxy['url'])
+            return
         proxy_username = info.manifest.plugins['apt_proxy'].get('username')
         proxy_password = info.manifest.plugins['apt_proxy'].get('password')
         proxy_address = info.manifest.plugins['apt_proxy']['address']
@@ -5,21 +5,18 @@ import os
 import shutil
 
 
-def modify_path(info, path, entry):
-    from bootstrapvz.common.tools import log_check_call
+def modify_path(path, entry):
+    """Returns the chroot operations that set the permissions and ownership of a path"""
+    from bootstrapvz.common.chroot import Chmod, Chown
+    operations = []
     if 'permissions' in entry:
         # We wrap the permissions string in str() in case
         #  the user specified a numeric bitmask
-        chmod_command = ['chroot', info.root, 'chmod', str(entry['permissions']), path]
-        log_check_call(chmod_command)
+        operations.append(Chmod(path, str(entry['permissions'])))
 
-    if 'owner' in entry:
-        chown_command = ['chroot', info.root, 'chown', entry['owner'], path]
-        log_check_call(chown_command)
-
-    if 'group' in entry:
-        chgrp_command = ['chroot', info.root, 'chgrp', entry['group'], path]
-        log_check_call(chgrp_command)
+    if 'owner' in entry or 'group' in entry:
+        operations.append(Chown(path, entry.get('owner'), entry.get('group')))
+    return operations
 
 
 class MkdirCommand(Task):
@@ -28,12 +25,13 @@ class MkdirCommand(Task):
 
     @classmethod
     def run(cls, info):
-        from bootstrapvz.common.tools import log_check_call
+        from bootstrapvz.common.chroot import Mkdir
 
+        operations = []
         for dir_entry in info.manifest.plugins['file_copy']['mkdirs']:
-            mkdir_command = ['chroot', info.root, 'mkdir', '-p', dir_entry['dir']]
-            log_check_call(mkdir_command)
-            modify_path(info, dir_entry['dir'], dir_entry)
+            operations.append(Mkdir(dir_entry['dir']))
+            operations.extend(modify_path(dir_entry['dir'], dir_entry))
+        info.chroot.run_many(operations)
 
 
 class ValidateFiles(Task):
@@ -42,12 +40,16 @@ class ValidateFiles(Task):
 
     @classmethod
     def run(cls, info):
+        from bootstrapvz.common.exceptions import ManifestError, raise_errors
         from bootstrapvz.common.tools import rel_path
 
+        errors = []
         for i, file_entry in enumerate(info.manifest.plugins['file_copy']['files']):
             if not os.path.exists(rel_path(info.manifest.path, file_entry['src'])):
                 msg = 'The source file %s does not exist.' % file_entry['src']
-                info.manifest.validation_error(msg, ['plugins', 'file_copy', 'files', i])
+                errors.append(ManifestError(msg, info.manifest.path, ['plugins', 'file_copy', 'files', i]))
+        if errors:
+            raise_errors(errors)
 
 
 class FileCopyCommand(Task):
@@ -57,16 +59,21 @@ class FileCopyCommand(Task):
 
     @classmethod
     def run(cls, info):
+        from bootstrapvz.common.filecopy import copy_file
         from bootstrapvz.common.tools import rel_path
 
+        operations = []
         for file_entry in info.manifest.plugins['file_copy']['files']:
             # note that we don't use os.path.join because it can't
             #  handle absolute paths, which 'dst' most likely is.
             final_destination = os.path.normpath("%s/%s" % (info.root, file_entry['dst']))
             src_path = rel_path(info.manifest.path, file_entry['src'])
             if os.path.isfile(src_path):
-                shutil.copy(src_path, final_destination)
+                if os.path.isdir(final_destination):
+                    final_destination = os.path.join(final_destination, os.path.basename(src_path))
+                copy_file(src_path, final_destination)
             else:
-                shutil.copytree(src_path, final_destination)
+                shutil.copytree(src_path, final_destination, copy_function=copy_file)
 
-            modify_path(info, file_entry['dst'], file_entry)
+            operations.extend(modify_path(file_entry['dst'], file_entry))
+        info.chroot.run_many(operations)
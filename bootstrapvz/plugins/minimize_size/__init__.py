@@ -54,9 +54,12 @@ def resolve_tasks(taskset, manifest):
     if 'dpkg' in manifest.plugins['minimize_size']:
         filter_tasks = [dpkg.CreateDpkgCfg,
                         dpkg.InitializeBootstrapFilterList,
-                        dpkg.CreateBootstrapFilterScripts,
-                        dpkg.DeleteBootstrapFilterScripts,
                         ]
+        if manifest.bootstrapper.get('backend', 'debootstrap') == 'debootstrap':
+            # mmdebstrap applies the dpkg filters while bootstrapping, debootstrap needs a script for that
+            filter_tasks.extend([dpkg.CreateBootstrapFilterScripts,
+                                 dpkg.DeleteBootstrapFilterScripts,
+                                 ])
         msdpkg = manifest.plugins['minimize_size']['dpkg']
         if 'locales' in msdpkg:
             taskset.update(filter_tasks)
@@ -1,7 +1,7 @@
 from bootstrapvz.base import Task
 from bootstrapvz.common import phases
 from bootstrapvz.common.tasks import bootstrap, workspace
-from bootstrapvz.common.tools import sed_i
+from bootstrapvz.common.tools import edit_file
 import os
 import shutil
 from . import assets
@@ -47,8 +47,8 @@ class CreateBootstrapFilterScripts(Task):
         shutil.copy(os.path.join(assets, 'bootstrap-script.sh'), bootstrap_script)
         shutil.copy(os.path.join(assets, 'bootstrap-files-filter.sh'), filter_script)
 
-        sed_i(bootstrap_script, r'DEBOOTSTRAP_EXCLUDES_PATH', excludes_file)
-        sed_i(bootstrap_script, r'BOOTSTRAP_FILES_FILTER_PATH', filter_script)
+        edit_file(bootstrap_script, [(r'DEBOOTSTRAP_EXCLUDES_PATH', excludes_file),
+                                     (r'BOOTSTRAP_FILES_FILTER_PATH', filter_script)])
 
         # We exclude with patterns but include with fixed strings
         # The pattern matching when excluding is needed in order to filter
@@ -56,8 +56,8 @@ class CreateBootstrapFilterScripts(Task):
         filter_lists = info._minimize_size['bootstrap_filter']
         exclude_list = r'\|'.join(['.' + p + r'.\+' for p in filter_lists['exclude']])
         include_list = '\n'.join(['.' + p for p in filter_lists['include']])
-        sed_i(filter_script, r'EXCLUDE_PATTERN', exclude_list)
-        sed_i(filter_script, r'INCLUDE_PATHS', include_list)
+        edit_file(filter_script, [(r'EXCLUDE_PATTERN', exclude_list),
+                                  (r'INCLUDE_PATHS', include_list)])
         os.chmod(filter_script, 0o755)
 
         info.bootstrap_script = bootstrap_script
@@ -68,7 +68,7 @@ class FilterLocales(Task):
     description = 'Configuring dpkg and debootstrap to only include specific locales/manpages when installing packages'
     phase = phases.os_installation
     predecessors = [CreateDpkgCfg]
-    successors = [CreateBootstrapFilterScripts]
+    successors = [CreateBootstrapFilterScripts, bootstrap.Bootstrap]
     # Snatched from:
     # https://github.com/docker/docker/blob/1d775a54cc67e27f755c7338c3ee938498e845d7/contrib/mkimage/debootstrap
     # and
@@ -122,7 +122,7 @@ class ExcludeDocs(Task):
     description = 'Configuring dpkg and debootstrap to not install additional documentation for packages'
     phase = phases.os_installation
     predecessors = [CreateDpkgCfg]
-    successors = [CreateBootstrapFilterScripts]
+    successors = [CreateBootstrapFilterScripts, bootstrap.Bootstrap]
 
     @classmethod
     def run(cls, info):
@@ -5,8 +5,7 @@ from bootstrapvz.common.tasks import packages
 from bootstrapvz.providers.virtualbox.tasks import guest_additions
 from bootstrapvz.providers.ec2.tasks import ebs
 from bootstrapvz.common.fs import unmounted
-from bootstrapvz.common.tools import log_check_call
-from shutil import copyfile
+from bootstrapvz.common.filecopy import copy_dir, copy_file
 import os.path
 import time
 import logging
@@ -57,7 +56,7 @@ class CopyImage(Task):
         destination = os.path.join(info.manifest.bootstrapper['workspace'], loopback_backup_name)
 
         with unmounted(info.volume):
-            copyfile(info.volume.image_path, destination)
+            copy_file(info.volume.image_path, destination)
         msg = 'A copy of the bootstrapped volume was created. Path: ' + destination
         log.info(msg)
 
@@ -71,7 +70,7 @@ class CreateFromImage(Task):
     def run(cls, info):
         info.volume.image_path = os.path.join(info.workspace, 'volume.' + info.volume.extension)
         loopback_backup_path = info.manifest.plugins['prebootstrapped']['image']
-        copyfile(loopback_backup_path, info.volume.image_path)
+        copy_file(loopback_backup_path, info.volume.image_path)
 
         set_fs_states(info.volume)
 
@@ -85,7 +84,7 @@ class CopyFolder(Task):
     def run(cls, info):
         folder_backup_name = '{id}.{ext}.backup'.format(id=info.run_id, ext=info.volume.extension)
         destination = os.path.join(info.manifest.bootstrapper['workspace'], folder_backup_name)
-        log_check_call(['cp', '-a', info.volume.path, destination])
+        copy_dir(info.volume.path, destination)
         msg = 'A copy of the bootstrapped volume was created. Path: ' + destination
         log.info(msg)
 
@@ -98,7 +97,7 @@ class CreateFromFolder(Task):
     @classmethod
     def run(cls, info):
         info.root = os.path.join(info.workspace, 'root')
-        log_check_call(['cp', '-a', info.manifest.plugins['prebootstrapped']['folder'], info.root])
+        copy_dir(info.manifest.plugins['prebootstrapped']['folder'], info.root)
         info.volume.path = info.root
         info.volume.fsm.current = 'attached'
 
@@ -54,11 +54,9 @@ class CreateVagrantUser(Task):
 
     @classmethod
     def run(cls, info):
-        from bootstrapvz.common.tools import log_check_call
-        log_check_call(['chroot', info.root,
-                        'useradd',
-                        '--create-home', '--shell', '/bin/bash',
-                        'vagrant'])
+        info.chroot.run(['useradd',
+                         '--create-home', '--shell', '/bin/bash',
+                         'vagrant'])
 
 
 class PasswordlessSudo(Task):
@@ -97,11 +95,10 @@ class AddInsecurePublicKey(Task):
         os.chmod(ssh_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
         os.chmod(authorized_keys_path, stat.S_IRUSR | stat.S_IWUSR)
 
-        # We can't do this directly with python, since getpwnam gets its info from the host
-        from bootstrapvz.common.tools import log_check_call
-        log_check_call(['chroot', info.root,
-                        'chown', 'vagrant:vagrant',
-                        '/home/vagrant/.ssh', '/home/vagrant/.ssh/authorized_keys'])
+        # This has to happen inside the chroot, since getpwnam gets its info from the host
+        from bootstrapvz.common.chroot import Chown
+        info.chroot.run_many([Chown('/home/vagrant/.ssh', 'vagrant', 'vagrant'),
+                              Chown('/home/vagrant/.ssh/authorized_keys', 'vagrant', 'vagrant')])
 
 
 class SetRootPassword(Task):
@@ -110,8 +107,7 @@ class SetRootPassword(Task):
 
     @classmethod
     def run(cls, info):
-        from bootstrapvz.common.tools import log_check_call
-        log_check_call(['chroot', info.root, 'chpasswd'], 'root:vagrant')
+        info.chroot.run(['chpasswd'], 'root:vagrant')
 
 
 class PackageBox(Task):
@@ -48,12 +48,12 @@ class CreatePVGrubCustomRule(Task):
 
         from bootstrapvz.base.fs.partitionmaps.none import NoPartitions
         if not isinstance(info.volume.partition_map, NoPartitions):
-            from bootstrapvz.common.tools import sed_i
+            from bootstrapvz.common.tools import edit_file
             root_idx = info.volume.partition_map.root.get_index()
             grub_device = 'GRUB_DEVICE=/dev/xvda' + str(root_idx)
-            sed_i(script_dst, '^GRUB_DEVICE=/dev/xvda$', grub_device)
             grub_root = '\troot (hd0,{idx})'.format(idx=root_idx - 1)
-            sed_i(script_dst, r'^\troot \(hd0\)$', grub_root)
+            edit_file(script_dst, [('^GRUB_DEVICE=/dev/xvda$', grub_device),
+                                   (r'^\troot \(hd0\)$', grub_root)])
 
         if info.manifest.volume['backing'] == 's3':
             from bootstrapvz.common.tools import sed_i
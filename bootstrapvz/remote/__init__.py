@@ -11,6 +11,7 @@ supported_classes = ['bootstrapvz.base.manifest.Manifest',
                      'bootstrapvz.common.fs.qemuvolume.QEMUVolume',
                      'bootstrapvz.common.fs.virtualdiskimage.VirtualDiskImage',
                      'bootstrapvz.common.fs.virtualmachinedisk.VirtualMachineDisk',
+                     'bootstrapvz.common.fs.offlineimage.OfflineImage',
                      'bootstrapvz.base.fs.partitionmaps.gpt.GPTPartitionMap',
                      'bootstrapvz.base.fs.partitionmaps.msdos.MSDOSPartitionMap',
                      'bootstrapvz.base.fs.partitionmaps.none.NoPartitions',
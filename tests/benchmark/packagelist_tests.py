@@ -0,0 +1,67 @@
+import time
+from bootstrapvz.base.bootstrapinfo import DictClass
+from bootstrapvz.base.pkg.packagelist import PackageList
+from bootstrapvz.base.pkg.sourceslist import SourceLists
+from .scaling import check_growth
+
+manifest_vars = {'system': DictClass(release='stretch'),
+                 'apt_mirror': 'http://deb.debian.org/debian',
+                 }
+
+
+def create_lists():
+    source_lists = SourceLists(manifest_vars)
+    source_lists.add('main', 'deb {apt_mirror} {system.release} main')
+    source_lists.add('backports', 'deb {apt_mirror} {system.release}-backports main')
+    return PackageList(manifest_vars, source_lists)
+
+
+def generate_names(num_packages):
+    return ['package{num}'.format(num=i) for i in range(num_packages)]
+
+
+def test_add():
+    def benchmark(num_packages):
+        packages = create_lists()
+        names = generate_names(num_packages)
+        start = time.perf_counter()
+        for name in names:
+            packages.add(name)
+        # Adding every package a second time must find the existing ones
+        for name in names:
+            packages.add(name, '{system.release}')
+        duration = time.perf_counter() - start
+        assert [pkg.name for pkg in packages.remote()] == names
+        return duration
+
+    check_growth('add()', benchmark, 'packages')
+
+
+def test_add_many():
+    def benchmark(num_packages):
+        packages = create_lists()
+        names = generate_names(num_packages)
+        start = time.perf_counter()
+        packages.add_many(names[::2])
+        packages.add_many(names[1::2], '{system.release}-backports')
+        # Adding the packages again with the default target must find the existing ones
+        packages.add_many(names[::2], '{system.release}')
+        duration = time.perf_counter() - start
+        assert len(packages.remote()) == num_packages
+        return duration
+
+    check_growth('add_many()', benchmark, 'packages')
+
+
+def test_target_exists():
+    def benchmark(num_sources):
+        source_lists = SourceLists(manifest_vars)
+        for i in range(num_sources):
+            source_lists.add('source{num}'.format(num=i), 'deb {apt_mirror} release%d main' % i)
+        start = time.perf_counter()
+        for i in range(num_sources):
+            assert source_lists.target_exists('release%d' % i)
+            assert not source_lists.target_exists('{system.release}')
+        return time.perf_counter() - start
+
+    check_growth('target_exists()', benchmark, 'sources')
@@ -0,0 +1,28 @@
+"""Checks that the duration of a benchmark grows linearly with its size.
+Wall-clock budgets depend on the machine, the growth of the duration does not.
+"""
+import logging
+log = logging.getLogger(__name__)
+
+# The benchmarks are timed with a small and a ten times larger size
+sizes = (1000, 10000)
+# How much longer the larger run may take. Linear code takes about ten times as long,
+# quadratic code takes a hundred times as long.
+max_growth = 30
+# Every size is timed this many times, the fastest run is the one least disturbed by other processes
+repeats = 3
+
+
+def check_growth(what, benchmark, unit):
+    """Checks that the duration of a benchmark grows linearly with its size
+
+    :param str what: What is being benchmarked
+    :param function benchmark: Runs the benchmark with a size and returns the duration in seconds
+    :param str unit: What the size counts, e.g. packages
+    """
+    small, large = [min(benchmark(size) for _ in range(repeats)) for size in sizes]
+    log.debug('{what}: {small:.4f}s with {small_num} and {large:.4f}s with {large_num} {unit}'
+              .format(what=what, small=small, small_num=sizes[0], large=large, large_num=sizes[1], unit=unit))
+    assert large < small * max_growth, \
+        ('{what} took {growth:.0f} times as long for {large_num} as for {small_num} {unit}'
+         .format(what=what, growth=large / small, large_num=sizes[1], small_num=sizes[0], unit=unit))
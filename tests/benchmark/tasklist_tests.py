@@ -0,0 +1,51 @@
+import random
+import time
+from bootstrapvz.base import Task
+from bootstrapvz.base.tasklist import create_list
+from bootstrapvz.common import phases
+from .scaling import check_growth
+
+
+def generate_tasks(num_tasks, seed=0):
+    """Generates a set of tasks spread over all phases,
+    each with up to three predecessors and successors in their own phase
+    """
+    rnd = random.Random(seed)
+    tasks = []
+    by_phase = [[] for _ in phases.order]
+    for i in range(num_tasks):
+        phase_idx = rnd.randrange(len(phases.order))
+        siblings = by_phase[phase_idx]
+        predecessors = rnd.sample(siblings, min(len(siblings), rnd.randrange(4)))
+        task = type('Task{num}'.format(num=i), (Task,), {'phase': phases.order[phase_idx],
+                                                         'predecessors': predecessors,
+                                                         'successors': []})
+        # Declare some of the ordering from the other end
+        if siblings and rnd.random() < 0.3:
+            rnd.choice(siblings).successors.append(task)
+        siblings.append(task)
+        tasks.append(task)
+    return tasks
+
+
+def test_create_list():
+    def benchmark(num_tasks):
+        all_tasks = generate_tasks(num_tasks)
+        # Run half of the tasks, so that the filtering is part of the measurement
+        taskset = set(all_tasks[::2])
+        start = time.perf_counter()
+        task_list = create_list(taskset, set(all_tasks))
+        duration = time.perf_counter() - start
+
+        positions = {task: i for i, task in enumerate(task_list)}
+        for task in task_list:
+            for predecessor in task.predecessors:
+                if predecessor in positions:
+                    assert positions[predecessor] < positions[task]
+            for successor in task.successors:
+                if successor in positions:
+                    assert positions[task] < positions[successor]
+        assert [task.phase.pos() for task in task_list] == sorted(task.phase.pos() for task in task_list)
+        return duration
+
+    check_growth('create_list()', benchmark, 'tasks')
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.plugins.apt_proxy.server import CachingProxy
+from .mirror import start_mirror
+from .mirror import stop_mirror
+
+tmp_dir = None
+mirror = None
+proxy = None
+
+
+def setup_proxy():
+    global tmp_dir, mirror, proxy
+    tmp_dir = tempfile.mkdtemp()
+    # The mirror stand-in serves a directory that is laid out like a Debian mirror
+    write_file('mirror/dists/stretch/InRelease', b'Date: Sat, 14 Jul 2018 10:21:30 UTC\n', 1000000000)
+    write_file('mirror/pool/main/a/a_1.0_amd64.deb', b'\0' * 1024, 1000000000)
+    mirror = start_mirror(os.path.join(tmp_dir, 'mirror'))
+    proxy = CachingProxy(os.path.join(tmp_dir, 'cache'))
+    proxy.start()
+
+
+def teardown_proxy():
+    proxy.stop()
+    stop_mirror(mirror)
+    shutil.rmtree(tmp_dir)
+
+
+def write_file(path, content, mtime):
+    path = os.path.join(tmp_dir, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as stream:
+        stream.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def get(path):
+    import urllib.request
+    url = 'http://127.0.0.1:{port}/{path}'.format(port=mirror.server_address[1], path=path)
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({'http': proxy.url}))
+    return opener.open(url, timeout=10).read()
+
+
+@with_setup(setup_proxy, teardown_proxy)
+def test_packages():
+    eq_(b'\0' * 1024, get('pool/main/a/a_1.0_amd64.deb'))
+    # Packages are served from the cache without asking the mirror
+    os.remove(os.path.join(tmp_dir, 'mirror/pool/main/a/a_1.0_amd64.deb'))
+    eq_(b'\0' * 1024, get('pool/main/a/a_1.0_amd64.deb'))
+    eq_((1, 1, 1024), (proxy.stats['misses'], proxy.stats['hits'], proxy.stats['bytes_cached']))
+
+
+@with_setup(setup_proxy, teardown_proxy)
+def test_indices():
+    eq_(b'Date: Sat, 14 Jul 2018 10:21:30 UTC\n', get('dists/stretch/InRelease'))
+    eq_(b'Date: Sat, 14 Jul 2018 10:21:30 UTC\n', get('dists/stretch/InRelease'))
+    eq_((1, 1), (proxy.stats['misses'], proxy.stats['revalidated']))
+    # A changed index is downloaded again
+    write_file('mirror/dists/stretch/InRelease', b'Date: Sat, 10 Nov 2018 10:14:31 UTC\n', 1100000000)
+    eq_(b'Date: Sat, 10 Nov 2018 10:14:31 UTC\n', get('dists/stretch/InRelease'))
+    eq_((2, 1), (proxy.stats['misses'], proxy.stats['revalidated']))
+
+
+@with_setup(setup_proxy, teardown_proxy)
+def test_pass_through_error():
+    import urllib.error
+    try:
+        get('missing')
+        assert False, 'The proxy served a missing file'
+    except urllib.error.HTTPError as e:
+        # The status of the mirror is relayed
+        eq_(404, e.code)
+    eq_({}, proxy.downloads)
+
+
+@with_setup(setup_proxy, teardown_proxy)
+def test_prune():
+    from bootstrapvz.common.bytes import Bytes
+    write_file('mirror/pool/main/b/b_1.0_amd64.deb', b'\1' * 1024, 1000000000)
+    get('pool/main/a/a_1.0_amd64.deb')
+    get('pool/main/b/b_1.0_amd64.deb')
+    url = 'http://127.0.0.1:{port}/pool/main/{{path}}'.format(port=mirror.server_address[1])
+    entry = proxy.get_entry(url.format(path='a/a_1.0_amd64.deb'))
+    os.utime(proxy.get_blob_path(entry['sha256']), (1000000000, 1000000000))
+    proxy.max_size = Bytes('1KiB')
+    proxy.prune()
+    # The least recently used package is removed together with its URL
+    eq_(None, proxy.get_entry(url.format(path='a/a_1.0_amd64.deb')))
+    assert proxy.get_entry(url.format(path='b/b_1.0_amd64.deb')) is not None
+    eq_(1, len(os.listdir(os.path.join(tmp_dir, 'cache/urls'))))
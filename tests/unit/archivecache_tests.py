@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common.archivecache import ArchiveCache
+from bootstrapvz.common.bytes import Bytes
+
+tmp_dir = None
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(tmp_dir, 'archive'))
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+def add_package(archive, name, mtime):
+    path = os.path.join(archive, name)
+    with open(path, 'wb') as stream:
+        stream.write(b'\0' * 1024)
+    os.utime(path, (mtime, mtime))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_seed_and_collect():
+    archive = os.path.join(tmp_dir, 'archive')
+    cache = ArchiveCache(os.path.join(tmp_dir, 'cache/amd64'))
+    add_package(archive, 'a_1.0_amd64.deb', 1)
+    add_package(archive, 'lock', 1)
+    cache.collect(archive)
+    eq_(['a_1.0_amd64.deb'], os.listdir(cache.path))
+
+    other_archive = os.path.join(tmp_dir, 'other_archive')
+    os.mkdir(other_archive)
+    cache.seed(other_archive)
+    eq_(['a_1.0_amd64.deb'], os.listdir(other_archive))
+    # Seeding marks the package as recently used
+    assert os.path.getmtime(os.path.join(cache.path, 'a_1.0_amd64.deb')) > 1
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_prune():
+    import time
+    archive = os.path.join(tmp_dir, 'archive')
+    cache = ArchiveCache(os.path.join(tmp_dir, 'cache/amd64'), Bytes('2KiB'), max_age=1)
+    now = time.time()
+    add_package(archive, 'a_1.0_amd64.deb', now - 2 * 24 * 60 * 60)
+    add_package(archive, 'b_1.0_amd64.deb', now - 60)
+    add_package(archive, 'c_1.0_amd64.deb', now - 30)
+    add_package(archive, 'd_1.0_amd64.deb', now)
+    cache.collect(archive)
+    # a has expired and b is the least recently used package that does not fit
+    eq_(['c_1.0_amd64.deb', 'd_1.0_amd64.deb'], sorted(os.listdir(cache.path)))
@@ -0,0 +1,32 @@
+import os.path
+from nose.tools import eq_
+from bootstrapvz.base import batch
+from bootstrapvz.base.manifest import Manifest
+
+examples = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../manifests/examples')
+
+
+def get_manifest(path):
+    return Manifest(path=os.path.join(examples, path))
+
+
+def test_get_requirements():
+    disk = batch.get_disk_resource('/target')
+    eq_({'loop': 1, disk: 1024 * 1024 * 1024}, batch.get_requirements(get_manifest('kvm/wheezy.yml')))
+    requirements = batch.get_requirements(get_manifest('kvm/jessie-qcow2.yml'))
+    eq_(1, requirements['nbd'])
+    assert 'loop' not in requirements
+
+
+def test_fits():
+    capacity = {'nbd': 2, 'disk:1': 10}
+    assert batch.fits({'nbd': 1, 'disk:1': 5}, {'nbd': 1, 'disk:1': 5}, capacity)
+    assert not batch.fits({'nbd': 1}, {'nbd': 2}, capacity)
+    assert not batch.fits({'disk:1': 6}, {'disk:1': 5}, capacity)
+    # Resources the host does not limit always fit
+    assert batch.fits({'loop': 100}, {'loop': 100}, capacity)
+
+
+def test_run():
+    manifests = [get_manifest('kvm/wheezy.yml'), get_manifest('docker/stretch.yml')]
+    eq_([], batch.run(manifests, jobs=2, dry_run=True))
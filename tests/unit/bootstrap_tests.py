@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common.tasks.bootstrap import get_bootstrap_args
+from bootstrapvz.common.tasks.bootstrap import get_tarball_key
+
+tmp_dir = None
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+class Manifest(object):
+
+    def __init__(self, backend):
+        self.system = {'release': 'bookworm', 'architecture': 'amd64'}
+        self.bootstrapper = {'backend': backend, 'variant': 'minbase'}
+
+
+class BootstrapInformation(object):
+
+    def __init__(self, backend='mmdebstrap', root='volume'):
+        self.manifest = Manifest(backend)
+        self.root = os.path.join(tmp_dir, root)
+        os.makedirs(os.path.join(self.root, 'etc/dpkg/dpkg.cfg.d'))
+        self.include_packages = set(['openssh-server', 'locales'])
+        self.exclude_packages = set()
+        self.bootstrap_hooks = []
+        self.apt_mirror = 'http://deb.debian.org/debian/'
+
+
+def add_dpkg_setting(info, name, content):
+    with open(os.path.join(info.root, 'etc/dpkg/dpkg.cfg.d', name), 'w') as stream:
+        stream.write(content)
+
+
+def get_options(info):
+    _, options, _ = get_bootstrap_args(info)
+    # The hooks of the host's mmdebstrap installation are not under test
+    return [option for option in options if not option.startswith('--hook-dir=')]
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_mmdebstrap_args():
+    info = BootstrapInformation()
+    add_dpkg_setting(info, '02_no_docs', 'path-exclude=/usr/share/doc/*\n')
+    add_dpkg_setting(info, '01_no_man', 'path-exclude=/usr/share/man/*\n')
+    info.bootstrap_hooks.append(('essential', 'echo essential'))
+    info.exclude_packages.update(['tzdata', 'e2fsprogs'])
+    executable, _, arguments = get_bootstrap_args(info)
+    eq_(['mmdebstrap'], executable)
+    eq_(['bookworm', info.root, 'http://deb.debian.org/debian/'], arguments)
+    dpkgcfg_path = os.path.join(info.root, 'etc/dpkg/dpkg.cfg.d')
+    eq_(['--arch=amd64',
+         '--variant=minbase',
+         '--include=locales,openssh-server',
+         '--dpkgopt=' + os.path.join(dpkgcfg_path, '01_no_man'),
+         '--dpkgopt=' + os.path.join(dpkgcfg_path, '02_no_docs'),
+         '--essential-hook=echo essential',
+         # Excluded packages may be essential, e.g. e2fsprogs before bookworm
+         '--customize-hook=chroot "$1" apt-get --yes --allow-remove-essential purge e2fsprogs tzdata',
+         ], get_options(info))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_mmdebstrap_tarball_key():
+    info = BootstrapInformation()
+    add_dpkg_setting(info, '01_no_docs', 'path-exclude=/usr/share/doc/*\n')
+    key = get_tarball_key(info)
+    # The key does not depend on where the root is
+    other_info = BootstrapInformation(root='other_volume')
+    add_dpkg_setting(other_info, '01_no_docs', 'path-exclude=/usr/share/doc/*\n')
+    eq_(key, get_tarball_key(other_info))
+    # The contents of the dpkg settings end up in the tarball
+    add_dpkg_setting(other_info, '01_no_docs', 'path-exclude=/usr/share/man/*\n')
+    assert key != get_tarball_key(other_info)
+    # The bootstrapper is part of the key
+    info.manifest.bootstrapper['backend'] = 'debootstrap'
+    assert key != get_tarball_key(info)
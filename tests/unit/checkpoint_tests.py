@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import threading
+from nose.tools import eq_
+from nose.tools import raises
+from bootstrapvz.base import checkpoint
+from bootstrapvz.base.bootstrapinfo import BootstrapInformation
+from bootstrapvz.base.fs import load_volume
+from bootstrapvz.common import phases
+from bootstrapvz.common.exceptions import CheckpointError
+from bootstrapvz.common.tasks import volume
+
+checkpoint_dir = None
+
+
+class Manifest(object):
+    data = {'name': 'checkpoint-test'}
+
+
+def get_info():
+    info = BootstrapInformation.__new__(BootstrapInformation)
+    info.manifest = Manifest()
+    info.workspace = '/target/workspace'
+    info.volume = load_volume({'backing': 'raw',
+                               'partitions': {'type': 'msdos',
+                                              'root': {'filesystem': 'ext4', 'size': '1GiB'}}},
+                              'grub')
+    # Fake the progress of the volume, so that we do not need to run any commands
+    info.volume.fsm.current = 'attached'
+    info.volume.partition_map.fsm.current = 'mapped'
+    info.volume.partition_map.root.fsm.current = 'mounted'
+    info.volume.partition_map.root.mount_dir = '/target/workspace/root'
+    # Locks cannot be pickled, this attribute should be left out of the checkpoint
+    info.lock = threading.Lock()
+    return info
+
+
+def setup_dir():
+    global checkpoint_dir
+    checkpoint_dir = tempfile.mkdtemp()
+
+
+def teardown_dir():
+    shutil.rmtree(checkpoint_dir)
+
+
+def test_restore_fsm():
+    import pickle
+    info = get_info()
+    restored = pickle.loads(pickle.dumps(info.volume))
+    eq_('attached', restored.fsm.current)
+    eq_('mapped', restored.partition_map.fsm.current)
+    eq_('mounted', restored.partition_map.root.fsm.current)
+    # The proxy methods are recreated as well
+    assert restored.fsm.can('detach')
+    assert callable(restored.detach)
+
+
+def test_save_load():
+    setup_dir()
+    try:
+        info = get_info()
+        checkpoint.save(checkpoint_dir, info, [volume.Attach], phases.volume_creation)
+        assert checkpoint.exists(checkpoint_dir, info.manifest)
+        open(checkpoint.get_checkpoint_path(checkpoint_dir, info.manifest) + '.suspended', 'w').close()
+
+        manifest = Manifest()
+        loaded, tasks_completed = checkpoint.load(checkpoint_dir, manifest)
+        eq_([volume.Attach], tasks_completed)
+        assert loaded.manifest is manifest
+        eq_('/target/workspace', loaded.workspace)
+        eq_('mounted', loaded.volume.partition_map.root.fsm.current)
+        assert not hasattr(loaded, 'lock')
+
+        checkpoint.remove(checkpoint_dir, manifest)
+        assert not checkpoint.exists(checkpoint_dir, manifest)
+    finally:
+        teardown_dir()
+
+
+@raises(CheckpointError)
+def test_load_not_suspended():
+    setup_dir()
+    try:
+        info = get_info()
+        checkpoint.save(checkpoint_dir, info, [], phases.volume_creation)
+        checkpoint.load(checkpoint_dir, info.manifest)
+    finally:
+        teardown_dir()
+
+
+@raises(CheckpointError)
+def test_load_missing():
+    setup_dir()
+    try:
+        checkpoint.load(os.path.join(checkpoint_dir, 'missing'), Manifest())
+    finally:
+        teardown_dir()
+
+
+def test_resume_linked():
+    info = get_info()
+    info.manifest.modules = {'plugins': []}
+    info.volume.fsm.current = 'linked'
+    info.volume.dm_node_name = 'vda'
+    info.volume.dm_node_args = {'logical_start_sector': 0, 'start_sector': 0, 'sectors': 2048}
+    calls = []
+    # Record the operations instead of running any commands
+    info.volume.attach = lambda: calls.append('attach')
+    info.volume.link_dm_node = lambda **kwargs: calls.append(('link_dm_node', kwargs))
+    info.volume.partition_map.map = lambda volume: calls.append('map')
+    info.volume.partition_map.root.mount = lambda destination: calls.append(('mount', destination))
+    checkpoint.resume(info)
+    eq_(['attach',
+         ('link_dm_node', {'logical_start_sector': 0, 'start_sector': 0, 'sectors': 2048}),
+         'map',
+         ('mount', '/target/workspace/root')], calls)
+    # The old node is forgotten, so that a free one is picked
+    assert not hasattr(info.volume, 'dm_node_name')
@@ -0,0 +1,87 @@
+import os
+import shutil
+import stat
+import tempfile
+from subprocess import CalledProcessError
+from nose.plugins.skip import SkipTest
+from nose.tools import eq_
+from nose.tools import raises
+from nose.tools import with_setup
+from bootstrapvz.common.chroot import Chmod
+from bootstrapvz.common.chroot import Chown
+from bootstrapvz.common.chroot import Chroot
+from bootstrapvz.common.chroot import Mkdir
+from bootstrapvz.common.chroot import SystemCall
+from bootstrapvz.common.chroot import get_id
+
+root = None
+
+
+def setup_root():
+    global root
+    root = tempfile.mkdtemp()
+    os.mkdir(os.path.join(root, 'etc'))
+    with open(os.path.join(root, 'etc/passwd'), 'w') as passwd:
+        passwd.write('root:x:0:0:root:/root:/bin/bash\n'
+                     'admin:x:1000:1000::/home/admin:/bin/bash\n')
+    with open(os.path.join(root, 'etc/group'), 'w') as group:
+        group.write('root:x:0:\n'
+                    'staff:x:50:admin\n')
+
+
+def teardown_root():
+    shutil.rmtree(root)
+
+
+def require_root():
+    if os.geteuid() != 0:
+        raise SkipTest('Changing the root directory requires root privileges')
+
+
+@with_setup(setup_root, teardown_root)
+def test_get_id():
+    eq_(1000, get_id(os.path.join(root, 'etc/passwd'), 'admin'))
+    eq_(50, get_id(os.path.join(root, 'etc/group'), 'staff'))
+    eq_(42, get_id(os.path.join(root, 'etc/group'), '42'))
+
+
+def test_chown_spec():
+    chown = Chown('/home/admin', 'admin:staff')
+    eq_(('admin', 'staff'), (chown.owner, chown.group))
+    eq_('chown admin:staff /home/admin', str(chown))
+
+
+@raises(TypeError)
+def test_abstract_call():
+    class Unlink(SystemCall):
+        pass
+    Unlink()
+
+
+@with_setup(setup_root, teardown_root)
+def test_run_many():
+    require_root()
+    results = Chroot(root).run_many([Mkdir('/home/admin/.ssh'),
+                                     Chmod('/home/admin/.ssh', '700'),
+                                     Chown('/home/admin', 'admin', 'staff', recursive=True),
+                                     ])
+    eq_([(0, [], [])] * 3, results)
+    ssh_dir = os.stat(os.path.join(root, 'home/admin/.ssh'))
+    eq_(0o700, stat.S_IMODE(ssh_dir.st_mode))
+    eq_((1000, 50), (ssh_dir.st_uid, ssh_dir.st_gid))
+    # Only the contents of the directory are changed recursively
+    eq_(0, os.stat(os.path.join(root, 'home')).st_uid)
+
+
+@with_setup(setup_root, teardown_root)
+def test_check():
+    require_root()
+    results = Chroot(root).run_many([Chown('/etc', 'nobody'), Mkdir('/srv')], check=False)
+    eq_([1, 0], [status for status, _, _ in results])
+
+
+@with_setup(setup_root, teardown_root)
+@raises(CalledProcessError)
+def test_failure():
+    require_root()
+    Chroot(root).run_many([Chown('/etc', 'nobody'), Mkdir('/srv')])
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common.tasks import fastio
+
+root = None
+
+
+class Info(object):
+    pass
+
+
+def setup_root():
+    global root
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, 'etc/dpkg/dpkg.cfg.d'))
+
+
+def teardown_root():
+    shutil.rmtree(root)
+
+
+@with_setup(setup_root, teardown_root)
+def test_remove_configuration():
+    info = Info()
+    info.root = root
+    fastio.DisableDpkgSync.run(info)
+    with open(os.path.join(root, 'etc/ld.so.preload'), 'w') as preload:
+        preload.write('/usr/lib/libother.so\n/usr/lib/x86_64-linux-gnu/libeatmydata.so.1\n')
+    with open(os.path.join(root, fastio.mmdebstrap_dpkg_cfg), 'w') as dpkg_cfg:
+        dpkg_cfg.write('path-exclude=/usr/share/locale/*\nforce-unsafe-io\n')
+
+    fastio.RemoveFastIoConfiguration.run(info)
+    with open(os.path.join(root, 'etc/ld.so.preload')) as preload:
+        eq_('/usr/lib/libother.so\n', preload.read())
+    with open(os.path.join(root, fastio.mmdebstrap_dpkg_cfg)) as dpkg_cfg:
+        eq_('path-exclude=/usr/share/locale/*\n', dpkg_cfg.read())
+    eq_(['99mmdebstrap'], os.listdir(os.path.join(root, 'etc/dpkg/dpkg.cfg.d')))
+
+
+@with_setup(setup_root, teardown_root)
+def test_remove_only_preload():
+    info = Info()
+    info.root = root
+    fastio.DisableDpkgSync.run(info)
+    with open(os.path.join(root, 'etc/ld.so.preload'), 'w') as preload:
+        preload.write('/usr/lib/libeatmydata/libeatmydata.so\n')
+    fastio.RemoveFastIoConfiguration.run(info)
+    eq_(['dpkg'], os.listdir(os.path.join(root, 'etc')))
+
+
+def test_get_eatmydata_package():
+    from bootstrapvz.common.releases import jessie, bookworm
+    eq_('eatmydata', fastio.get_eatmydata_package(jessie))
+    eq_('libeatmydata1', fastio.get_eatmydata_package(bookworm))
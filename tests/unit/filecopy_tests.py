@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common import filecopy
+
+tmp_dir = None
+size = 64 * 1024 * 1024
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+    # A sparse image with data at the start and in the middle
+    with open(os.path.join(tmp_dir, 'image.raw'), 'wb') as image:
+        image.truncate(size)
+        image.write(b'\xeb\x63\x90' * 1024)
+        image.seek(size // 2)
+        image.write(b'data' * 1024 * 1024)
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+def read(name):
+    with open(os.path.join(tmp_dir, name), 'rb') as stream:
+        return stream.read()
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_copy_file():
+    transferred = filecopy.copy_file(os.path.join(tmp_dir, 'image.raw'), os.path.join(tmp_dir, 'copy.raw'))
+    eq_(read('image.raw'), read('copy.raw'))
+    # The holes are not copied, unless the copy was reflinked nothing beyond the data is transferred
+    assert transferred < size // 4
+    assert os.stat(os.path.join(tmp_dir, 'copy.raw')).st_blocks * 512 < size // 4
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_copy_data():
+    with open(os.path.join(tmp_dir, 'image.raw'), 'rb') as src:
+        with open(os.path.join(tmp_dir, 'copy.raw'), 'wb') as dst:
+            regions = filecopy.get_data_regions(src.fileno(), size)
+            for offset, length in regions:
+                filecopy.write_data(dst.fileno(), os.pread(src.fileno(), length, offset), offset)
+            os.ftruncate(dst.fileno(), size)
+    eq_(read('image.raw'), read('copy.raw'))
+    assert os.stat(os.path.join(tmp_dir, 'copy.raw')).st_blocks * 512 < size // 4
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_move_file():
+    content = read('image.raw')
+    eq_(0, filecopy.move_file(os.path.join(tmp_dir, 'image.raw'), os.path.join(tmp_dir, 'moved.raw')))
+    eq_(['moved.raw'], os.listdir(tmp_dir))
+    eq_(content, read('moved.raw'))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_splice():
+    offset = 1024 * 1024
+    with open(os.path.join(tmp_dir, 'disk.raw'), 'wb') as disk:
+        disk.truncate(offset + size)
+    transferred = filecopy.splice(os.path.join(tmp_dir, 'image.raw'), os.path.join(tmp_dir, 'disk.raw'), offset)
+    eq_(bytes(offset) + read('image.raw'), read('disk.raw'))
+    assert transferred < size // 4
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import yaml
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.base import matrix
+from bootstrapvz.common.tools import load_data
+
+examples = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../manifests/examples')
+tmp_dir = None
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+def test_expand():
+    data = {'name': 'debian',
+            'system': {'release': 'wheezy'},
+            'matrix': {'system.release': ['jessie', 'stretch'],
+                       'plugins.root_password.password': ['a', 'b']},
+            }
+    combinations = matrix.expand(data)
+    eq_(4, len(combinations))
+    values, variant_data = combinations[-1]
+    eq_({'system.release': 'stretch', 'plugins.root_password.password': 'b'}, values)
+    eq_({'name': 'debian',
+         'system': {'release': 'stretch'},
+         'plugins': {'root_password': {'password': 'b'}},
+         }, variant_data)
+    # The original data is left untouched
+    eq_('wheezy', data['system']['release'])
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_load_and_plan():
+    data = load_data(os.path.join(examples, 'kvm/wheezy.yml'))
+    data['bootstrapper']['snapshot_cache'] = {'path': os.path.join(tmp_dir, 'snapshots')}
+    data['matrix'] = {'system.release': ['wheezy', 'jessie'],
+                      'plugins.root_password.password': ['a', 'b']}
+    path = os.path.join(tmp_dir, 'kvm.yml')
+    with open(path, 'w') as stream:
+        yaml.safe_dump(data, stream, sort_keys=False)
+
+    manifests = matrix.load(path)
+    eq_(4, len(manifests))
+    eq_(os.path.join(tmp_dir, 'kvm-jessie-b.yml'), matrix.get_variant_path(manifests[-1]))
+    # The root password is set after the package installation, so builds of the same release share that snapshot
+    eq_({manifests[1]: manifests[0], manifests[3]: manifests[2]}, matrix.plan(manifests))
+
+
+def test_load_without_matrix():
+    [manifest] = matrix.load(os.path.join(examples, 'kvm/wheezy.yml'))
+    eq_(None, manifest.matrix_values)
+    eq_(manifest.path, matrix.get_variant_path(manifest))
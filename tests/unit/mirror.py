@@ -0,0 +1,33 @@
+"""Serves a directory over HTTP, the directory is laid out like a Debian mirror by the tests that use it
+"""
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mirror(path):
+    """Starts serving a directory on a free port in a new thread
+
+    :param str path: Path to the directory
+    :return: The server, its port is in server_address
+    :rtype: ThreadingHTTPServer
+    """
+    mirror = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=path))
+    threading.Thread(target=mirror.serve_forever, daemon=True).start()
+    return mirror
+
+
+def stop_mirror(mirror):
+    """Stops serving a directory
+
+    :param ThreadingHTTPServer mirror: The server
+    """
+    mirror.shutdown()
+    mirror.server_close()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.base.fs import load_volume
+from bootstrapvz.common.tools import log_check_call
+
+tmp_dir = None
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp_dir, 'root/etc'))
+    with open(os.path.join(tmp_dir, 'root/etc/hostname'), 'w') as hostname:
+        hostname.write('offline\n')
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+def get_volume(partitions):
+    data = {'backing': 'raw',
+            'assembly': 'offline',
+            'partitions': partitions,
+            }
+    return load_volume(data, 'none')
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_assemble():
+    from nose.plugins.skip import SkipTest
+    if shutil.which('mkfs.ext4') is None or shutil.which('debugfs') is None:
+        raise SkipTest('e2fsprogs is not installed')
+    volume = get_volume({'type': 'none',
+                         'root': {'size': '16MiB', 'filesystem': 'ext4'},
+                         })
+    image_path = os.path.join(tmp_dir, 'volume.raw')
+    volume.create(image_path)
+    # The UUID is known before the filesystem exists
+    uuid = volume.partition_map.root.get_uuid()
+    volume.assemble(root=os.path.join(tmp_dir, 'root'))
+    eq_(16 * 1024 * 1024, os.path.getsize(image_path))
+    eq_(['offline'], log_check_call(['debugfs', '-R', 'cat /etc/hostname', image_path]))
+    stats = log_check_call(['debugfs', '-R', 'stats', image_path])
+    assert 'Filesystem UUID:          ' + uuid in stats
+    # Only the image remains next to the tree
+    eq_(['root', 'volume.raw'], sorted(os.listdir(tmp_dir)))
+    volume.delete()
+    eq_(['root'], os.listdir(tmp_dir))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_split_tree():
+    volume = get_volume({'type': 'gpt',
+                         'root': {'size': '16MiB', 'filesystem': 'ext4'},
+                         'var': {'size': '16MiB', 'filesystem': 'ext4'},
+                         'var/log': {'size': '16MiB', 'filesystem': 'ext4'},
+                         })
+    root = os.path.join(tmp_dir, 'root')
+    os.makedirs(os.path.join(root, 'var/log'))
+    os.makedirs(os.path.join(root, 'var/lib'))
+    open(os.path.join(root, 'var/log/syslog'), 'w').close()
+    os.chmod(os.path.join(root, 'var/log'), 0o750)
+    staging = os.path.join(tmp_dir, 'staging')
+    os.mkdir(staging)
+
+    trees = volume.split_tree(root, staging)
+    partitions = dict((partition.name, partition) for partition in volume.partition_map.partitions)
+    eq_(['syslog'], os.listdir(trees[partitions['var/log']]))
+    # The mountpoint of the nested partition stays in the partition it is nested in
+    eq_(['lib', 'log'], sorted(os.listdir(trees[partitions['var']])))
+    eq_([], os.listdir(os.path.join(trees[partitions['var']], 'log')))
+    eq_(0o750, os.stat(os.path.join(trees[partitions['var']], 'log')).st_mode & 0o777)
+    eq_(['etc', 'var'], sorted(os.listdir(root)))
+    eq_([], os.listdir(os.path.join(root, 'var')))
+    assert partitions['root'] not in trees
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_assemble_partitioned():
+    from nose.plugins.skip import SkipTest
+    if shutil.which('mkfs.ext4') is None or shutil.which('debugfs') is None:
+        raise SkipTest('e2fsprogs is not installed')
+    volume = get_volume({'type': 'gpt',
+                         'boot': {'size': '16MiB', 'filesystem': 'ext2'},
+                         'root': {'size': '16MiB', 'filesystem': 'ext4'},
+                         })
+    image_path = os.path.join(tmp_dir, 'volume.raw')
+    volume.create(image_path)
+    os.makedirs(os.path.join(tmp_dir, 'root/boot'))
+    with open(os.path.join(tmp_dir, 'root/boot/vmlinuz'), 'w') as kernel:
+        kernel.write('kernel\n')
+    volume.assemble(root=os.path.join(tmp_dir, 'root'))
+    eq_(volume.size.bytes.get_qty_in('B'), os.path.getsize(image_path))
+
+    def debugfs(partition, request):
+        # debugfs opens the filesystem at the offset of the partition
+        offset = (partition.get_start() + partition.pad_start).bytes.get_qty_in('B')
+        return log_check_call(['debugfs', '-R', request, '{path}?offset={offset}'.format(path=image_path, offset=offset)])
+    eq_(['kernel'], debugfs(volume.partition_map.boot, 'cat /vmlinuz'))
+    eq_(['offline'], debugfs(volume.partition_map.root, 'cat /etc/hostname'))
+    # The contents of the boot partition are not in the root partition
+    assert 'vmlinuz' not in ' '.join(debugfs(volume.partition_map.root, 'ls /boot'))
@@ -0,0 +1,155 @@
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from nose.tools import eq_
+from nose.tools import raises
+from nose.tools import with_setup
+from bootstrapvz.base.fs.exceptions import PartitionError
+from bootstrapvz.base.fs.partitionmaps.gpt import GPTPartitionMap
+from bootstrapvz.base.fs.partitionmaps.msdos import MSDOSPartitionMap
+from bootstrapvz.common import partitiontable
+from bootstrapvz.common.bytes import Bytes
+from bootstrapvz.common.tools import log_check_call
+
+sector_size = Bytes('512B')
+disk_guid = '01234567-89ab-cdef-0123-456789abcdef'
+tmp_dir = None
+
+partitions = {'boot': {'size': '64MiB', 'filesystem': 'ext2'},
+              'swap': {'size': '128MiB'},
+              'root': {'size': '1GiB', 'filesystem': 'ext4'},
+              }
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+def get_sectors(partition_map):
+    return partition_map.get_total_size().bytes.get_qty_in('B') // 512
+
+
+def get_guids(count):
+    return ['00000000-0000-0000-0000-{idx:012x}'.format(idx=idx + 1) for idx in range(count)]
+
+
+def read_table(table, size):
+    image = bytearray(size * 512)
+    for offset, data in table:
+        image[offset:offset + len(data)] = data
+    return bytes(image)
+
+
+def test_get_chs():
+    eq_(b'\x00\x02\x00', partitiontable.get_chs(1))
+    # Sector 4096 is on cylinder 0, head 65, sector 2
+    eq_(b'\x41\x02\x00', partitiontable.get_chs(4096))
+    # Cylinder 256 has its high bits in the sector byte
+    eq_(b'\x00\x41\x00', partitiontable.get_chs(256 * 255 * 63))
+    eq_(b'\xfe\xff\xff', partitiontable.get_chs(1024 * 255 * 63))
+
+
+def test_msdos_entry():
+    # The partition ends beyond the last cylinder that can be addressed
+    eq_(b'\x80\x41\x02\x00\x83\xfe\xff\xff\x00\x10\x00\x00\x00\x00\x00\x10',
+        partitiontable.msdos_entry(0x80, 0x83, 4096, 0x10000000))
+
+
+def test_gpt_entry():
+    entry = partitiontable.gpt_entry(partitiontable.gpt_types['linux'], disk_guid, 34, 2048, 4, 'root')
+    eq_(128, len(entry))
+    # GUIDs are stored with their first three fields in little endian
+    eq_(bytes.fromhex('af3dc60f838472478e793d69d8477de4'), entry[:16])
+    eq_(bytes.fromhex('67452301ab89efcd0123456789abcdef'), entry[16:32])
+    eq_((34, 2048, 4), struct.unpack('<QQQ', entry[32:56]))
+    eq_('root'.encode('utf-16-le').ljust(72, b'\0'), entry[56:])
+
+
+@raises(ValueError)
+def test_gpt_entry_name_too_long():
+    partitiontable.gpt_entry(partitiontable.gpt_types['linux'], disk_guid, 34, 2048, 0, 'x' * 37)
+
+
+def test_gpt():
+    partition_map = GPTPartitionMap(dict(partitions, type='gpt'), sector_size, 'grub')
+    size = get_sectors(partition_map)
+    image = read_table(partition_map.get_table(size, disk_guid, get_guids(4)), size)
+
+    # The protective MBR spans the whole disk
+    eq_(b'\x55\xaa', image[510:512])
+    eq_(0xee, image[450])
+    eq_((1, size - 1), struct.unpack('<II', image[454:462]))
+
+    entries = image[2 * 512:34 * 512]
+    for header_lba, backup_lba, entries_lba in [(1, size - 1, 2), (size - 1, 1, size - 33)]:
+        header = image[header_lba * 512:header_lba * 512 + 92]
+        fields = struct.unpack('<8sIIIIQQQQ16sQIII', header)
+        eq_(b'EFI PART', fields[0])
+        eq_(zlib.crc32(header[:16] + b'\0\0\0\0' + header[20:]), fields[3])
+        eq_((header_lba, backup_lba, 34, size - 34), fields[5:9])
+        eq_((entries_lba, 128, 128, zlib.crc32(entries)), fields[10:14])
+        eq_(entries, image[entries_lba * 512:(entries_lba + 32) * 512])
+
+    def get_entry(idx):
+        return entries[idx * 128:(idx + 1) * 128]
+    # The bios_grub partition fills the space up to the first MiB
+    eq_(partitiontable.gpt_entry(partitiontable.gpt_types['bios_grub'], get_guids(4)[0], 34, 2048, 0, ''),
+        get_entry(0))
+    eq_(partitiontable.gpt_entry(partitiontable.gpt_types['linux'], get_guids(4)[1], 2049, 131072, 0, 'boot'),
+        get_entry(1))
+    eq_(partitiontable.gpt_entry(partitiontable.gpt_types['swap'], get_guids(4)[2], 131073, 393216, 0, 'swap'),
+        get_entry(2))
+    eq_(partitiontable.gpt_entry(partitiontable.gpt_types['linux'], get_guids(4)[3], 393217, size - 34, 0, 'root'),
+        get_entry(3))
+    eq_(bytes(124 * 128), entries[4 * 128:])
+
+
+def test_gpt_legacy_boot():
+    partition_map = GPTPartitionMap({'type': 'gpt', 'root': partitions['root']}, sector_size, 'extlinux')
+    size = get_sectors(partition_map)
+    image = read_table(partition_map.get_table(size, disk_guid, get_guids(1)), size)
+    eq_((34, size - 34, 4), struct.unpack('<QQQ', image[1024 + 32:1024 + 56]))
+
+
+def test_msdos():
+    partition_map = MSDOSPartitionMap(dict(partitions, type='msdos'), sector_size, 'grub')
+    size = get_sectors(partition_map)
+    [(offset, mbr)] = partition_map.get_table(size, 0x12345678)
+    eq_(0, offset)
+    eq_(bytes(440) + b'\x78\x56\x34\x12\0\0', mbr[:446])
+    eq_(partitiontable.msdos_entry(0x80, 0x83, 4096, 131072 - 4096 + 1), mbr[446:462])
+    eq_(partitiontable.msdos_entry(0, 0x82, 131073, 262144), mbr[462:478])
+    eq_(partitiontable.msdos_entry(0, 0x83, 393217, size - 393217), mbr[478:494])
+    eq_(bytes(16) + b'\x55\xaa', mbr[494:])
+
+
+@raises(PartitionError)
+def test_msdos_unknown_flag():
+    partition_map = MSDOSPartitionMap({'type': 'msdos', 'root': partitions['root']}, sector_size, 'grub')
+    partition_map.root.flags.append('bios_grub')
+    partition_map.get_table(get_sectors(partition_map))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_write():
+    from nose.plugins.skip import SkipTest
+    if shutil.which('partx') is None:
+        raise SkipTest('partx is not installed')
+    partition_map = GPTPartitionMap(dict(partitions, type='gpt'), sector_size, 'grub')
+    size = get_sectors(partition_map)
+    path = os.path.join(tmp_dir, 'volume.raw')
+    with open(path, 'wb') as image:
+        image.truncate(size * 512)
+    partitiontable.write(path, partition_map.get_table(size))
+    eq_(size * 512, partitiontable.get_size(path))
+    # libblkid verifies the checksums before it lists the partitions
+    listing = log_check_call(['partx', '--show', '--noheadings', '--output', 'START,END,NAME', path])
+    eq_([['34', '2048'], ['2049', '131072', 'boot'], ['131073', '393216', 'swap'], ['393217', str(size - 34), 'root']],
+        [line.split() for line in listing])
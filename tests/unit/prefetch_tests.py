@@ -0,0 +1,61 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common import prefetch
+from .mirror import start_mirror
+from .mirror import stop_mirror
+
+tmp_dir = None
+mirror = None
+
+
+def setup_mirror():
+    global tmp_dir, mirror
+    tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp_dir, 'mirror/pool/main'))
+    for name in ['a', 'b', 'c']:
+        with open(os.path.join(tmp_dir, 'mirror/pool/main', name + '_1.0_amd64.deb'), 'wb') as stream:
+            stream.write(name.encode() * 1024)
+    mirror = start_mirror(os.path.join(tmp_dir, 'mirror'))
+
+
+def teardown_mirror():
+    stop_mirror(mirror)
+    shutil.rmtree(tmp_dir)
+
+
+def get_line(name, content):
+    url = 'http://127.0.0.1:{port}/pool/main/{name}'.format(port=mirror.server_address[1], name=name)
+    checksum = hashlib.sha256(content).hexdigest()
+    return "'{url}' {name} {size} SHA256:{checksum}".format(url=url, name=name, size=len(content), checksum=checksum)
+
+
+def test_get_uris():
+    lines = ['The following NEW packages will be installed:',
+             "'http://deb.debian.org/debian/pool/main/a/acl/acl_2.2.52-3_amd64.deb' acl_2.2.52-3_amd64.deb 61112 "
+             "SHA256:fd4c0d",
+             "'file:/srv/mirror/pool/main/b/b_1.0_amd64.deb' b_1.0_amd64.deb 10 SHA256:abc",
+             ]
+    eq_([{'url': 'http://deb.debian.org/debian/pool/main/a/acl/acl_2.2.52-3_amd64.deb',
+          'name': 'acl_2.2.52-3_amd64.deb',
+          'size': 61112,
+          'algorithm': 'sha256',
+          'checksum': 'fd4c0d',
+          }], prefetch.get_uris(lines))
+
+
+@with_setup(setup_mirror, teardown_mirror)
+def test_prefetch():
+    path = os.path.join(tmp_dir, 'prefetch')
+    lines = [get_line('a_1.0_amd64.deb', b'a' * 1024),
+             # The checksum of b does not match and d does not exist, both are left to apt
+             get_line('b_1.0_amd64.deb', b'x' * 1024),
+             get_line('d_1.0_amd64.deb', b'd' * 1024),
+             ]
+    prefetch.start(path, prefetch.get_uris(lines), 2)
+    eq_(['a_1.0_amd64.deb'], prefetch.finish(path))
+    eq_(['a_1.0_amd64.deb'], os.listdir(path))
+    eq_([], prefetch.finish(path))
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common.bytes import Bytes
+from bootstrapvz.common.filecopy import copy_dir
+from bootstrapvz.common.rootfscache import RootfsCache
+
+tmp_dir = None
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp_dir, 'root/etc'))
+    with open(os.path.join(tmp_dir, 'root/etc/hostname'), 'w') as stream:
+        stream.write('debian\n')
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_store_and_copy():
+    cache = RootfsCache(os.path.join(tmp_dir, 'cache'), Bytes('1GiB'), check_release=False)
+    with cache.lock('a'):
+        eq_(None, cache.lookup('a', None))
+        cache.store('a', os.path.join(tmp_dir, 'root'), None)
+    rootfs = cache.lookup('a', None)
+    eq_(cache.get_entry_path('a'), rootfs)
+
+    volume = os.path.join(tmp_dir, 'volume')
+    os.makedirs(os.path.join(volume, 'lost+found'))
+    copy_dir(rootfs, volume)
+    eq_(['etc', 'lost+found'], sorted(os.listdir(volume)))
+    with open(os.path.join(volume, 'etc/hostname')) as stream:
+        eq_('debian\n', stream.read())
+
+    # Storing the root filesystem again replaces it
+    with cache.lock('a'):
+        cache.store('a', os.path.join(volume, 'etc'), None)
+    eq_(['hostname'], os.listdir(cache.get_entry_path('a')))
+    eq_(['rootfs-a', 'rootfs-a.json', 'rootfs-a.lock'], sorted(os.listdir(cache.path)))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_verify():
+    cache = RootfsCache(os.path.join(tmp_dir, 'cache'), check_release=False)
+    os.makedirs(os.path.join(tmp_dir, 'root/etc/default'))
+    with cache.lock('a'):
+        cache.store('a', os.path.join(tmp_dir, 'root'), None)
+    rootfs = cache.lookup('a', None)
+    # A file that has been changed in the cache
+    with open(os.path.join(rootfs, 'etc/hostname'), 'w') as stream:
+        stream.write('debia\n')
+    eq_(None, cache.lookup('a', None))
+    with open(os.path.join(rootfs, 'etc/hostname'), 'w') as stream:
+        stream.write('debian\n')
+    eq_(rootfs, cache.lookup('a', None))
+    # A directory that has been removed from the cache
+    os.rmdir(os.path.join(rootfs, 'etc/default'))
+    eq_(None, cache.lookup('a', None))
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.base import schema
+
+tmp_dir = None
+
+schema_data = """---
+$schema: http://json-schema.org/draft-04/schema#
+title: Test schema
+type: object
+properties:
+  name:
+    type: string
+  size:
+    type: integer
+"""
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+    with open(os.path.join(tmp_dir, 'schema.yml'), 'w') as stream:
+        stream.write(schema_data)
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_get_validator():
+    schema_path = os.path.join(tmp_dir, 'schema.yml')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    validator = schema.get_validator(schema_path, cache_dir)
+    # The validator is only compiled once
+    assert validator is schema.get_validator(schema_path, cache_dir)
+    eq_(1, len(os.listdir(cache_dir)))
+    eq_(validator.schema, schema.load_schema(schema_path, cache_dir))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_get_errors():
+    validator = schema.get_validator(os.path.join(tmp_dir, 'schema.yml'))
+    eq_([], schema.get_errors(validator, {'name': 'debian', 'size': 1}))
+    errors = schema.get_errors(validator, {'name': 1, 'size': 'large'})
+    eq_([['name'], ['size']], sorted(list(error.path) for error in errors))
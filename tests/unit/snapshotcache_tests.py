@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.base import Task
+from bootstrapvz.base.bootstrapinfo import BootstrapInformation
+from bootstrapvz.base.fs import load_volume
+from bootstrapvz.base.snapshotcache import SnapshotCache
+from bootstrapvz.base.snapshotcache import get_keys
+from bootstrapvz.base.snapshotcache import relocate
+from bootstrapvz.common import phases
+from bootstrapvz.common.bytes import Bytes
+
+tmp_dir = None
+
+
+class InstallPackages(Task):
+    phase = phases.package_installation
+
+
+class Configure(Task):
+    phase = phases.system_modification
+
+
+class CopyFiles(Task):
+    phase = phases.user_modification
+
+
+class copy_files_plugin(object):
+    """Stands in for a plugin that only adds tasks to the user modification phase"""
+
+    @staticmethod
+    def resolve_tasks(taskset, manifest):
+        taskset.add(CopyFiles)
+
+
+class admin_user_plugin(object):
+    """Stands in for a plugin that adds tasks to the system modification phase"""
+
+    @staticmethod
+    def resolve_tasks(taskset, manifest):
+        taskset.add(Configure)
+
+
+class Manifest(object):
+
+    def __init__(self, name='debian', packages=['vim'], files=['a'], username='admin'):
+        self.data = {'name': name,
+                     'bootstrapper': {'workspace': '/target', 'snapshot_cache': {}},
+                     'packages': {'install': packages},
+                     'plugins': {'copy_files': {'files': files},
+                                 'admin_user': {'username': username}},
+                     }
+        self.bootstrapper = self.data['bootstrapper']
+        # The plugins are deliberately not listed in the order of the manifest
+        self.modules = {'plugins': [admin_user_plugin, copy_files_plugin],
+                        'plugins_by_name': {'admin_user': admin_user_plugin,
+                                            'copy_files': copy_files_plugin},
+                        }
+
+
+task_list = [InstallPackages, Configure, CopyFiles]
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+def get_key(manifest, tasks=task_list):
+    return get_keys(manifest, tasks, [phases.package_installation])[phases.package_installation]
+
+
+def test_get_keys():
+    key = get_key(Manifest())
+    eq_(key, get_key(Manifest(name='other')))
+    eq_(key, get_key(Manifest(files=['b'])))
+    assert key != get_key(Manifest(packages=['emacs']))
+    assert key != get_key(Manifest(), [Configure, CopyFiles])
+    # Tasks in later phases do not matter
+    eq_(key, get_key(Manifest(), [InstallPackages, CopyFiles]))
+    # Neither do the settings of plugins that only add tasks to later phases
+    eq_(key, get_key(Manifest(username='other')))
+    system_modification_key = get_keys(Manifest(), task_list, [phases.system_modification])
+    assert system_modification_key != get_keys(Manifest(username='other'), task_list, [phases.system_modification])
+    # The order tasks are listed in does not matter
+    eq_(system_modification_key, get_keys(Manifest(), [Configure, InstallPackages, CopyFiles], [phases.system_modification]))
+
+
+def test_relocate():
+    state = {'root': '/target/a/root',
+             'other': '/target/ab',
+             'paths': ['/target/a', ('/target/a/x', 1)],
+             'volume': Bytes('1MiB'),
+             }
+    state['volume'].path = '/target/a/volume.raw'
+    relocate(state, '/target/a', '/target/b')
+    eq_('/target/b/root', state['root'])
+    eq_('/target/ab', state['other'])
+    eq_(['/target/b', ('/target/b/x', 1)], state['paths'])
+    eq_('/target/b/volume.raw', state['volume'].path)
+
+
+def get_info(workspace):
+    info = BootstrapInformation.__new__(BootstrapInformation)
+    info.manifest = Manifest()
+    info.run_id = os.path.basename(workspace)
+    info.workspace = workspace
+    info.volume = load_volume({'backing': 'folder',
+                               'partitions': {'type': 'none',
+                                              'root': {'filesystem': 'ext4', 'size': '1GiB'}}},
+                              'extlinux')
+    return info
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_store_restore():
+    cache = SnapshotCache(os.path.join(tmp_dir, 'snapshots'), [phases.package_installation])
+    eq_([], cache.restore(get_info(os.path.join(tmp_dir, 'first')), task_list))
+
+    info = get_info(os.path.join(tmp_dir, 'first'))
+    os.mkdir(info.workspace)
+    info.root = os.path.join(info.workspace, 'root')
+    info.volume.create(path=info.root)
+    open(os.path.join(info.root, 'installed'), 'w').close()
+    # No snapshots are taken after other phases
+    cache.store(info, phases.system_modification)
+    assert not os.path.exists(cache.path)
+    cache.store(info, phases.package_installation)
+    eq_(1, len(os.listdir(cache.path)))
+
+    info = get_info(os.path.join(tmp_dir, 'second'))
+    eq_([InstallPackages], cache.restore(info, task_list))
+    eq_('second', info.run_id)
+    eq_(os.path.join(tmp_dir, 'second', 'root'), info.root)
+    eq_(info.root, info.volume.path)
+    eq_('attached', info.volume.fsm.current)
+    assert os.path.isfile(os.path.join(info.root, 'installed'))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_evict():
+    import json
+    cache = SnapshotCache(os.path.join(tmp_dir, 'snapshots'), [phases.package_installation])
+    keys = []
+    for name in ['first', 'second']:
+        info = get_info(os.path.join(tmp_dir, name))
+        info.manifest.data['packages']['install'] = [name]
+        cache.restore(info, task_list)
+        os.mkdir(info.workspace)
+        info.volume.create(path=os.path.join(info.workspace, 'root'))
+        cache.store(info, phases.package_installation)
+        keys.append(cache.keys[phases.package_installation])
+    eq_(set(keys), set(os.listdir(cache.path)))
+
+    # Make the first snapshot the least recently used one and only leave room for one snapshot
+    os.utime(os.path.join(cache.get_entry_path(keys[0]), 'snapshot.json'), (0, 0))
+    with open(os.path.join(cache.get_entry_path(keys[1]), 'snapshot.json')) as stream:
+        cache.max_size = Bytes(json.load(stream)['size'])
+    cache.evict()
+    eq_([keys[1]], os.listdir(cache.path))
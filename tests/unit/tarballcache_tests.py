@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common import tarballcache
+from bootstrapvz.common.bytes import Bytes
+from bootstrapvz.common.tarballcache import TarballCache
+
+tmp_dir = None
+release_url = None
+
+
+def setup_dir():
+    global tmp_dir, release_url
+    tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp_dir, 'mirror/dists/stretch'))
+    release_url = tarballcache.get_release_url('file://' + os.path.join(tmp_dir, 'mirror/'), 'stretch')
+    write_release('Date: Sat, 14 Jul 2018 10:21:30 UTC\n')
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+    tarballcache.releases.clear()
+
+
+def write_release(content):
+    with open(os.path.join(tmp_dir, 'mirror/dists/stretch/Release'), 'w') as stream:
+        stream.write(content)
+    tarballcache.releases.clear()
+
+
+def make_tarball(cache, key, size=1024):
+    tmp_path = os.path.join(cache.path, '.tarball-' + key)
+    with cache.lock(key):
+        with open(tmp_path, 'wb') as stream:
+            stream.write(b'\0' * size)
+        cache.publish(key, tmp_path, release_url)
+    return cache.get_entry_path(key)
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_lookup():
+    cache = TarballCache(os.path.join(tmp_dir, 'cache'))
+    eq_(None, cache.lookup('a', release_url))
+    tarball = make_tarball(cache, 'a')
+    eq_(tarball, cache.lookup('a', release_url))
+    # A new Release file makes the tarball stale
+    write_release('Date: Sat, 10 Nov 2018 10:14:31 UTC\n')
+    eq_(None, cache.lookup('a', release_url))
+    eq_(tarball, TarballCache(cache.path, check_release=False).lookup('a', release_url))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_corrupt():
+    cache = TarballCache(os.path.join(tmp_dir, 'cache'))
+    tarball = make_tarball(cache, 'a')
+    with open(tarball, 'r+b') as stream:
+        stream.write(b'\1')
+    eq_(None, cache.lookup('a', release_url))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_evict():
+    cache = TarballCache(os.path.join(tmp_dir, 'cache'), Bytes('2KiB'))
+    make_tarball(cache, 'a')
+    make_tarball(cache, 'b')
+    os.utime(cache.get_entry_path('a') + '.json', (1, 1))
+    os.utime(cache.get_entry_path('b') + '.json', (0, 0))
+    # b is in use, so the next least recently used tarball is evicted instead
+    with cache.lock('b', shared=True):
+        make_tarball(cache, 'c')
+    eq_([False, True, True], [os.path.isfile(cache.get_entry_path(key)) for key in 'abc'])
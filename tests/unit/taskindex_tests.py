@@ -0,0 +1,130 @@
+import os
+import shutil
+import sys
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.base.taskindex import TaskIndex
+from bootstrapvz.base.taskindex import TaskReference
+from bootstrapvz.common import phases
+
+package_dir = None
+index_path = None
+
+module_source = """
+from bootstrapvz.base import Task
+from bootstrapvz.common import phases
+from bootstrapvz.common.tasks import apt
+
+
+class Configure(Task):
+    phase = phases.system_modification
+    predecessors = [apt.AddDefaultSources]
+
+
+class Reconfigure(Task):
+    phase = phases.system_modification
+    predecessors = [Configure]
+"""
+
+
+def setup_package():
+    global package_dir, index_path
+    package_dir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(package_dir, 'indexed_plugin'))
+    open(os.path.join(package_dir, 'indexed_plugin', '__init__.py'), 'w').close()
+    with open(os.path.join(package_dir, 'indexed_plugin', 'tasks.py'), 'w') as module:
+        module.write(module_source)
+    index_path = os.path.join(package_dir, 'index', 'task-index.json')
+    sys.path.insert(0, package_dir)
+
+
+def teardown_package():
+    sys.path.remove(package_dir)
+    for name in ['indexed_plugin', 'indexed_plugin.tasks', 'indexed_plugin.base']:
+        sys.modules.pop(name, None)
+    shutil.rmtree(package_dir)
+
+
+def get_tasks():
+    index = TaskIndex(index_path)
+    tasks = index.get_tasks(set([(os.path.join(package_dir, 'indexed_plugin'), 'indexed_plugin.')]))
+    index.save()
+    return {task.__module__ + '.' + task.__name__: task for task in tasks}
+
+
+@with_setup(setup_package, teardown_package)
+def test_index_references():
+    tasks = get_tasks()
+    eq_(set(['indexed_plugin.tasks.Configure', 'indexed_plugin.tasks.Reconfigure']), set(tasks.keys()))
+    assert os.path.isfile(index_path)
+
+    # Forget about the module, the index should now be used instead of importing it
+    del sys.modules['indexed_plugin.tasks']
+    tasks = get_tasks()
+    assert 'indexed_plugin.tasks' not in sys.modules
+    configure = tasks['indexed_plugin.tasks.Configure']
+    reconfigure = tasks['indexed_plugin.tasks.Reconfigure']
+    assert isinstance(configure, TaskReference)
+    assert configure.phase is phases.system_modification
+    # Tasks in modules that are imported are resolved to their classes
+    from bootstrapvz.common.tasks import apt
+    eq_([apt.AddDefaultSources], configure.predecessors)
+    eq_([configure], reconfigure.predecessors)
+
+
+@with_setup(setup_package, teardown_package)
+def test_index_invalidation():
+    get_tasks()
+    del sys.modules['indexed_plugin.tasks']
+    with open(os.path.join(package_dir, 'indexed_plugin', 'tasks.py'), 'a') as module:
+        module.write("""
+
+class Cleanup(Task):
+    phase = phases.cleaning
+""")
+    tasks = get_tasks()
+    assert 'indexed_plugin.tasks' in sys.modules
+    assert 'indexed_plugin.tasks.Cleanup' in tasks
+
+
+@with_setup(setup_package, teardown_package)
+def test_index_base_class_invalidation():
+    with open(os.path.join(package_dir, 'indexed_plugin', 'base.py'), 'w') as module:
+        module.write("""
+from bootstrapvz.base import Task
+from bootstrapvz.common import phases
+
+
+class BaseTask(Task):
+    phase = phases.system_modification
+""")
+    with open(os.path.join(package_dir, 'indexed_plugin', 'tasks.py'), 'a') as module:
+        module.write("""
+from .base import BaseTask
+
+
+class Inherited(BaseTask):
+    pass
+""")
+    eq_(phases.system_modification, get_tasks()['indexed_plugin.tasks.Inherited'].phase)
+    for name in ['indexed_plugin.tasks', 'indexed_plugin.base']:
+        del sys.modules[name]
+    # Changing the base class in the other module invalidates the entry of the inheriting task
+    with open(os.path.join(package_dir, 'indexed_plugin', 'base.py'), 'a') as module:
+        module.write("""    phase = phases.cleaning
+""")
+    tasks = get_tasks()
+    assert 'indexed_plugin.tasks' in sys.modules
+    eq_(phases.cleaning, tasks['indexed_plugin.tasks.Inherited'].phase)
+
+
+@with_setup(setup_package, teardown_package)
+def test_index_import_error():
+    with open(os.path.join(package_dir, 'indexed_plugin', 'broken.py'), 'w') as module:
+        module.write('from bootstrapvz.common.tasks import nonexistent\n')
+    # Modules that cannot be imported are skipped, the first time and when the index is used
+    first = get_tasks()
+    del sys.modules['indexed_plugin.tasks']
+    eq_(sorted(first.keys()), sorted(get_tasks().keys()))
+    assert 'indexed_plugin.tasks' not in sys.modules
@@ -0,0 +1,214 @@
+import time
+from nose.tools import eq_
+from nose.tools import raises
+from bootstrapvz.base import Task
+from bootstrapvz.base.tasklist import TaskList
+from bootstrapvz.base.tasklist import create_list
+from bootstrapvz.base.tasklist import get_dependencies
+from bootstrapvz.base.tasklist import strongly_connected_components
+from bootstrapvz.common import phases
+from bootstrapvz.common.exceptions import TaskError
+from bootstrapvz.common.exceptions import TaskListError
+
+
+class Validate(Task):
+    phase = phases.validation
+
+    @classmethod
+    def run(cls, info):
+        info.append(cls)
+
+
+class Prepare(Task):
+    phase = phases.preparation
+
+    @classmethod
+    def run(cls, info):
+        time.sleep(0.05)
+        info.append(cls)
+
+
+class Configure(Task):
+    phase = phases.system_modification
+
+    @classmethod
+    def run(cls, info):
+        time.sleep(0.1)
+        info.append(cls)
+
+
+class ConfigureMore(Task):
+    phase = phases.system_modification
+
+    @classmethod
+    def run(cls, info):
+        info.append(cls)
+
+
+class Reconfigure(Task):
+    phase = phases.system_modification
+    predecessors = [Configure]
+
+    @classmethod
+    def run(cls, info):
+        info.append(cls)
+
+
+class Unused(Task):
+    phase = phases.system_modification
+    predecessors = [ConfigureMore]
+
+
+class Finalize(Task):
+    phase = phases.system_modification
+    predecessors = [Unused]
+
+    @classmethod
+    def run(cls, info):
+        info.append(cls)
+
+
+class Fail(Task):
+    phase = phases.system_modification
+    predecessors = [ConfigureMore]
+
+    @classmethod
+    def run(cls, info):
+        raise Exception('Task failed')
+
+
+class FailToo(Task):
+    phase = phases.system_modification
+
+    @classmethod
+    def run(cls, info):
+        raise Exception('Task failed too')
+
+
+class AfterFail(Task):
+    phase = phases.system_modification
+    predecessors = [Fail]
+
+    @classmethod
+    def run(cls, info):
+        info.append(cls)
+
+
+class Clean(Task):
+    phase = phases.cleaning
+
+    @classmethod
+    def run(cls, info):
+        info.append(cls)
+
+
+all_tasks = set([Validate, Prepare, Configure, ConfigureMore, Reconfigure, Unused, Finalize, Fail, FailToo, AfterFail, Clean])
+
+
+def test_dependencies():
+    taskset = set([Prepare, Configure, ConfigureMore, Reconfigure, Finalize, Clean])
+    dependencies = get_dependencies(create_list(taskset, all_tasks), all_tasks)
+    eq_(set(), dependencies[Prepare])
+    eq_(set([Configure]), dependencies[Reconfigure])
+    # Finalize depends on ConfigureMore through Unused, which is not in the tasklist
+    eq_(set([ConfigureMore]), dependencies[Finalize])
+    eq_(set(), dependencies[Clean])
+
+
+def test_run_concurrently():
+    taskset = set([Prepare, Configure, ConfigureMore, Reconfigure, Finalize, Clean])
+    task_list = create_list(taskset, all_tasks)
+    tasklist = TaskList(taskset)
+    run_order = []
+    tasklist.run_concurrently(task_list, all_tasks, run_order, jobs=4)
+    eq_(task_list, tasklist.tasks_completed)
+    eq_(Prepare, run_order[0])
+    eq_(Clean, run_order[-1])
+    assert run_order.index(Configure) < run_order.index(Reconfigure)
+    assert run_order.index(ConfigureMore) < run_order.index(Finalize)
+    # ConfigureMore does not have to wait for the slower Configure task
+    assert run_order.index(ConfigureMore) < run_order.index(Configure)
+
+
+def test_run_concurrently_failure():
+    taskset = set([Prepare, Configure, ConfigureMore, Fail, Clean])
+    task_list = create_list(taskset, all_tasks)
+    tasklist = TaskList(taskset)
+    run_order = []
+
+    @raises(Exception)
+    def run():
+        tasklist.run_concurrently(task_list, all_tasks, run_order, jobs=4)
+    run()
+    # Configure was already running when Fail raised its error, it is allowed to complete
+    eq_([task for task in task_list if task in (Prepare, Configure, ConfigureMore)], tasklist.tasks_completed)
+    assert Clean not in run_order
+
+
+def test_run_concurrently_keep_going():
+    taskset = set([Configure, ConfigureMore, Reconfigure, Fail, FailToo, AfterFail])
+    task_list = create_list(taskset, all_tasks)
+    tasklist = TaskList(taskset)
+    run_order = []
+    try:
+        tasklist.run_concurrently(task_list, all_tasks, run_order, jobs=4, keep_going=True)
+        raise AssertionError('The errors were not raised')
+    except TaskError as e:
+        eq_(['  Task failed', '  Task failed too'], sorted(str(e).split('\n')[1:]))
+    # Tasks that do not depend on the failed tasks are still run
+    eq_(set([Configure, ConfigureMore, Reconfigure]), set(run_order))
+    eq_(set(run_order), set(tasklist.tasks_completed))
+
+
+class Snapshots(object):
+    """Stands in for a snapshot cache that has a snapshot taken after the preparation phase"""
+
+    def __init__(self):
+        self.restored_after = None
+
+    def restore(self, info, task_list):
+        self.restored_after = list(info)
+        return [task for task in task_list if task.phase.pos() <= phases.preparation.pos()]
+
+
+def test_run_tasks_snapshot():
+    taskset = set([Validate, Prepare, Configure, Clean])
+    task_list = create_list(taskset, all_tasks)
+    tasklist = TaskList(taskset)
+    run_order = []
+    snapshots = Snapshots()
+    tasklist.run_tasks(task_list, all_tasks, run_order, snapshots=snapshots)
+    # The host is validated before the snapshot is restored, the tasks of the restored phases are skipped
+    eq_([Validate], snapshots.restored_after)
+    eq_([Validate, Configure, Clean], run_order)
+    eq_(task_list, tasklist.tasks_completed)
+
+
+def test_create_list_order():
+    taskset = set([Prepare, Configure, ConfigureMore, Reconfigure, Finalize, Clean])
+    task_list = create_list(taskset, all_tasks)
+    eq_(Prepare, task_list[0])
+    eq_(Clean, task_list[-1])
+    assert task_list.index(Configure) < task_list.index(Reconfigure)
+    assert task_list.index(ConfigureMore) < task_list.index(Finalize)
+
+
+@raises(TaskListError)
+def test_create_list_cycle():
+    class Cyclic(Task):
+        phase = phases.system_modification
+        predecessors = [Reconfigure]
+        successors = [Configure]
+    create_list(set([Cyclic]), all_tasks | set([Cyclic]))
+
+
+def test_strongly_connected_components_deep():
+    # A chain this long would exceed the recursion limit of a recursive implementation
+    length = 20000
+    graph = {i: [i + 1] for i in range(length)}
+    graph[length] = [0]
+    components = strongly_connected_components(graph)
+    eq_(1, len(components))
+    eq_(length + 1, len(components[0]))
+    graph[length] = []
+    eq_(length + 1, len(strongly_connected_components(graph)))
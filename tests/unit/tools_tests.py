@@ -1,6 +1,14 @@
 import os
+import shutil
+import tempfile
 from nose.tools import eq_
+from nose.tools import raises
+from bootstrapvz.common.exceptions import UnexpectedNumMatchesError
+from bootstrapvz.common.tools import append_file
+from bootstrapvz.common.tools import batched_edits
+from bootstrapvz.common.tools import edit_file
 from bootstrapvz.common.tools import log_call
+from bootstrapvz.common.tools import sed_i
 
 subprocess_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'subprocess.sh')
 
@@ -38,3 +46,106 @@ def test_log_call_output_order():
                       'three',
                       ]
     eq_(expected_order, logged.getvalue().split("\n")[8:-1])
+
+
+def test_log_call_max_lines():
+    status, stdout, stderr = log_call(['seq', '1', '1000'], max_lines=3)
+    eq_(status, 0)
+    eq_(['998', '999', '1000'], stdout)
+
+
+def test_log_call_output_handler():
+    lines = []
+    log_call(['sh', '-c', 'echo out; echo err >&2; printf unterminated'],
+             output_handler=lambda stream, line: lines.append((stream, line)))
+    eq_([('stderr', 'err'), ('stdout', 'out'), ('stdout', 'unterminated')], sorted(lines))
+
+
+def test_log_call_large_stdin():
+    data = '\n'.join(str(i) for i in range(100000))
+    status, stdout, _ = log_call(['wc', '-l'], stdin=data, max_lines=1)
+    eq_(['100000'], stdout)
+
+
+def make_file(content):
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, 'file')
+    with open(path, 'w') as stream:
+        stream.write(content)
+    os.chmod(path, 0o750)
+    return path
+
+
+def read_file(path):
+    with open(path) as stream:
+        return stream.read()
+
+
+def test_edit_file():
+    path = make_file('#PermitRootLogin yes\nPort 22\nPort 23\n')
+    try:
+        eq_([1, 2], edit_file(path, [('^#?PermitRootLogin .*', 'PermitRootLogin no'),
+                                     (r'^Port (\d+)$', r'Port 1\1', 2)]))
+        eq_('PermitRootLogin no\nPort 122\nPort 123\n', read_file(path))
+        eq_(0o750, os.stat(path).st_mode & 0o7777)
+        eq_(['file'], os.listdir(os.path.dirname(path)))
+    finally:
+        shutil.rmtree(os.path.dirname(path))
+
+
+@raises(UnexpectedNumMatchesError)
+def test_edit_file_unexpected_matches():
+    path = make_file('Port 22\n')
+    try:
+        edit_file(path, [('^Port', 'ListenPort'), ('^Protocol', 'Port')])
+    finally:
+        # Nothing is written when a substitution fails
+        eq_('Port 22\n', read_file(path))
+        shutil.rmtree(os.path.dirname(path))
+
+
+def test_edit_file_symlink():
+    # Absolute links inside the bootstrapped system point to files on the host when followed
+    host_path = make_file('a\n')
+    path = os.path.join(tempfile.mkdtemp(), 'link')
+    os.symlink(host_path, path)
+    try:
+        sed_i(path, 'a', 'b')
+        eq_('a\n', read_file(host_path))
+        eq_('b\n', read_file(path))
+        assert not os.path.islink(path)
+    finally:
+        shutil.rmtree(os.path.dirname(host_path))
+        shutil.rmtree(os.path.dirname(path))
+
+
+def test_batched_edits():
+    path = make_file('#PermitRootLogin yes\n#PasswordAuthentication yes\n')
+    other_path = make_file('a\n')
+    try:
+        with batched_edits([path]):
+            sed_i(path, '^#?PermitRootLogin .*', 'PermitRootLogin no')
+            sed_i(path, '^#PasswordAuthentication yes', 'PasswordAuthentication no')
+            append_file(path, 'UseDNS no')
+            sed_i(other_path, 'a', 'b')
+            # Only the batched file is kept in memory
+            eq_('#PermitRootLogin yes\n#PasswordAuthentication yes\n', read_file(path))
+            eq_('b\n', read_file(other_path))
+        eq_('PermitRootLogin no\nPasswordAuthentication no\nUseDNS no', read_file(path))
+        eq_(0o750, os.stat(path).st_mode & 0o7777)
+        eq_(['file'], os.listdir(os.path.dirname(path)))
+    finally:
+        shutil.rmtree(os.path.dirname(path))
+        shutil.rmtree(os.path.dirname(other_path))
+
+
+def test_batched_edits_concurrently():
+    from concurrent.futures import ThreadPoolExecutor
+    path = make_file(''.join('{i}\n'.format(i=i) for i in range(100)))
+    try:
+        with batched_edits([path]), ThreadPoolExecutor(max_workers=8) as executor:
+            for i in range(100):
+                executor.submit(sed_i, path, '^{i}$'.format(i=i), 'x')
+        eq_('x\n' * 100, read_file(path))
+    finally:
+        shutil.rmtree(os.path.dirname(path))
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from bootstrapvz.base import Task
+from bootstrapvz.base import trace
+from bootstrapvz.base.tasklist import run_task
+from bootstrapvz.common import phases
+from bootstrapvz.common.tools import log_call
+
+
+class Sleep(Task):
+    phase = phases.preparation
+
+    @classmethod
+    def run(cls, info):
+        log_call(['sh', '-c', 'echo sleeping; sleep 0.01'])
+
+
+def test_disabled():
+    with trace.span('task', 'nothing') as args:
+        args['status'] = 0
+    assert trace.events is None
+
+
+def test_export():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'traces', 'build.trace')
+        with trace.recording(path):
+            run_task(Sleep, None)
+        assert trace.events is None
+
+        with open(path + '.jsonl') as stream:
+            events = [json.loads(line) for line in stream]
+        eq_(['task', 'command'], [event['category'] for event in events])
+        task, command = events
+        eq_(__name__ + '.Sleep', task['name'])
+        eq_('sh', command['name'])
+        eq_({'argv': ['sh', '-c', 'echo sleeping; sleep 0.01'],
+             'status': 0,
+             'stdout_bytes': len('sleeping\n'),
+             'stderr_bytes': 0}, command['args'])
+        # The command runs inside the task
+        assert task['start'] <= command['start'] and command['end'] <= task['end']
+        assert command['duration'] >= 0.01
+
+        with open(path + '.json') as stream:
+            chrome_trace = json.load(stream)
+        eq_(['X', 'X', 'M'], [event['ph'] for event in chrome_trace['traceEvents']])
+    finally:
+        shutil.rmtree(tmp_dir)
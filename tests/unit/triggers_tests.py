@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from nose.tools import with_setup
+from bootstrapvz.common.tasks import triggers
+
+tmp_dir = None
+
+
+def setup_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp()
+
+
+def teardown_dir():
+    shutil.rmtree(tmp_dir)
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_get_calls():
+    path = os.path.join(tmp_dir, 'deferred-calls')
+    eq_({}, triggers.get_calls(path))
+    with open(path, 'w') as calls:
+        calls.write('update-initramfs -c -k 4.9.0-8-amd64\n'
+                    'update-grub\n'
+                    'update-initramfs -u\n'
+                    '\n'
+                    'update-initramfs -u -k all\n')
+    eq_({'update-initramfs': 3, 'update-grub': 1}, triggers.get_calls(path))
+
+
+@with_setup(setup_dir, teardown_dir)
+def test_get_kernels_without_initramfs():
+    eq_([], triggers.get_kernels_without_initramfs(tmp_dir))
+    os.mkdir(os.path.join(tmp_dir, 'boot'))
+    for name in ['vmlinuz-4.9.0-8-amd64', 'vmlinuz-4.19.0-1-amd64', 'initrd.img-4.9.0-8-amd64', 'grub']:
+        open(os.path.join(tmp_dir, 'boot', name), 'w').close()
+    eq_(['4.19.0-1-amd64'], triggers.get_kernels_without_initramfs(tmp_dir))